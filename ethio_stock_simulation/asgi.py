@@ -22,3 +22,9 @@ application = ProtocolTypeRouter({
         )
     ),
 })
+
+# Start the matching sequencer with the server, so orders left unmatched by a
+# previous process are recovered without waiting for the next order
+from stocks.sequencer import matching_sequencer  # noqa: E402
+
+matching_sequencer.start()
@@ -0,0 +1,193 @@
+# ethio_stock_simulation/mail.py
+
+import logging
+import os
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class MailDeliveryError(Exception):
+    """A transport could not deliver a message; `retryable` says whether trying again may help."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# ------------------ Transports -------------------
+class SendGridTransport:
+    """
+    Sends through the SendGrid v3 API over one pooled HTTP session, so
+    connections (and their TLS handshakes) are reused across messages and
+    threads instead of building a new API client per email.
+    """
+    API_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+    def __init__(self):
+        config = getattr(settings, 'MAIL_QUEUE', {})
+        self.from_email = settings.SENDGRID_FROM_EMAIL
+        self.timeout = config.get('timeout_seconds', 10)
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {settings.SENDGRID_API_KEY}'
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=config.get('workers', 4)))
+
+    def send(self, to_email, subject, body):
+        response = self.session.post(
+            self.API_URL,
+            json={
+                'personalizations': [{'to': [{'email': to_email}]}],
+                'from': {'email': self.from_email},
+                'subject': subject,
+                'content': [{'type': 'text/plain', 'value': body}],
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code >= 300:
+            # Throttling and server errors are worth another try; other client errors are not
+            retryable = response.status_code == 429 or response.status_code >= 500
+            raise MailDeliveryError(f"SendGrid returned {response.status_code}: {response.text[:200]}", retryable)
+
+
+class ConsoleTransport:
+    """Writes emails to stdout instead of sending them (local runs)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def send(self, to_email, subject, body):
+        with self._lock:
+            sys.stdout.write(f"To: {to_email}\nSubject: {subject}\n\n{body}\n{'-' * 79}\n")
+            sys.stdout.flush()
+
+
+class FileTransport:
+    """Appends emails to a daily file under MAIL_QUEUE['file_path'] (tests and local runs)."""
+
+    def __init__(self):
+        self.path = getattr(settings, 'MAIL_QUEUE', {}).get('file_path', 'sent_emails')
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def send(self, to_email, subject, body):
+        now = timezone.now()
+        with self._lock:
+            with open(os.path.join(self.path, f"{now:%Y%m%d}.log"), 'a', encoding='utf-8') as f:
+                f.write(f"Date: {now.isoformat()}\nTo: {to_email}\nSubject: {subject}\n\n{body}\n{'-' * 79}\n")
+
+
+class LocmemTransport:
+    """Keeps emails in memory instead of sending them (tests)."""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, to_email, subject, body):
+        self.outbox.append({'to_email': to_email, 'subject': subject, 'body': body})
+
+
+# ------------------ Queue -------------------
+class MailQueue:
+    """
+    Background delivery of transactional emails (OTP, KYC and account
+    notices), so request handlers only enqueue and return.
+
+    Jobs are sent by a small thread pool through the configured transport
+    (MAIL_QUEUE['transport']). A failed send is retried with exponential
+    backoff and jitter, up to `max_attempts`; transport errors marked as not
+    retryable are dropped right away. Jobs live in memory: a process that
+    exits drops what it has not sent yet, which for OTP mail the user
+    recovers from with ResendOTPView.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = None
+        self._transport = None
+        self._outstanding = 0
+
+    @staticmethod
+    def _config():
+        return getattr(settings, 'MAIL_QUEUE', {})
+
+    @property
+    def transport(self):
+        if self._transport is None:
+            self._transport = import_string(
+                self._config().get('transport', 'ethio_stock_simulation.mail.SendGridTransport')
+            )()
+        return self._transport
+
+    def enqueue(self, to_email, subject, body):
+        """Queue an email for background delivery."""
+        with self._lock:
+            self._outstanding += 1
+        self._submit({'to_email': to_email, 'subject': subject, 'body': body, 'attempts': 0})
+
+    def enqueue_on_commit(self, to_email, subject, body):
+        """Queue an email once the current transaction commits (right away outside one)."""
+        transaction.on_commit(lambda: self.enqueue(to_email, subject, body))
+
+    def send_now(self, to_email, subject, body):
+        """Deliver an email in the calling thread, through the same transport; returns True on success."""
+        try:
+            self.transport.send(to_email, subject, body)
+        except Exception as e:
+            logger.warning(f"Failed to send '{subject}' to {to_email}: {e}")
+            return False
+        logger.info(f"Sent '{subject}' to {to_email}.")
+        return True
+
+    def drain(self, timeout=None):
+        """Wait until every queued email (retries included) is sent or given up; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def _submit(self, job):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._config().get('workers', 4), thread_name_prefix='mail-queue'
+                )
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            self.transport.send(job['to_email'], job['subject'], job['body'])
+        except Exception as e:
+            job['attempts'] += 1
+            config = self._config()
+            retryable = getattr(e, 'retryable', True)
+            if retryable and job['attempts'] < config.get('max_attempts', 5):
+                delay = min(
+                    config.get('backoff_seconds', 2) * 2 ** (job['attempts'] - 1),
+                    config.get('max_backoff_seconds', 300),
+                ) * random.uniform(0.5, 1.0)
+                logger.warning(
+                    f"Sending '{job['subject']}' to {job['to_email']} failed (attempt {job['attempts']}), "
+                    f"retrying in {delay:.1f}s: {e}"
+                )
+                timer = threading.Timer(delay, self._submit, args=(job,))
+                timer.daemon = True
+                timer.start()
+                return
+            logger.error(f"Giving up on '{job['subject']}' to {job['to_email']} after {job['attempts']} attempts: {e}")
+        else:
+            logger.info(f"Sent '{job['subject']}' to {job['to_email']}.")
+        with self._idle:
+            self._outstanding -= 1
+            self._idle.notify_all()
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,49 @@
+# ethio_stock_simulation/pagination.py
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .projection import project, requested_fields
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opt-in cursor (keyset) pagination. Only requests passing `page_size` or
+    `cursor` are paginated; others still get the whole list, as before.
+
+    A page is read with a range condition on the ordering column rather
+    than an OFFSET, so the hundredth page costs what the first does. The
+    ordering is the view's `cursor_ordering` (or the constructor's), a
+    column with an index to back it.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        self.ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        return super().paginate_queryset(queryset, request, view)
+
+
+def list_response(request, queryset, serializer_class, ordering, **serializer_kwargs):
+    """
+    List response for APIViews and function views, with the same opt-in
+    keyset pagination and `?fields=` projection as the list viewsets.
+    """
+    fields = requested_fields(request, serializer_class)
+    if fields is not None:
+        queryset = project(queryset, serializer_class, fields, extra=[ordering.lstrip('-')])
+        serializer_kwargs['fields'] = fields
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_queryset(queryset, request)
+    if page is None:
+        return Response(serializer_class(queryset, many=True, **serializer_kwargs).data)
+    return paginator.get_paginated_response(serializer_class(page, many=True, **serializer_kwargs).data)
@@ -0,0 +1,86 @@
+# ethio_stock_simulation/projection.py
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class ProjectableSerializerMixin:
+    """
+    Serializer mixin taking a `fields` keyword: only the named fields are
+    serialized, e.g. OrdersSerializer(orders, many=True, fields=['id', 'status']).
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def requested_fields(request, serializer_class):
+    """
+    The fields named by `?fields=a,b` (None when the parameter is absent),
+    checked against what the serializer can output.
+    """
+    value = request.query_params.get('fields')
+    if value is None:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    available = serializer_class().fields
+    unknown = [name for name in fields if name not in available]
+    if not fields or unknown:
+        raise serializers.ValidationError(
+            {'fields': f"Choose from: {', '.join(available)}." + (f" Unknown: {', '.join(unknown)}." if unknown else '')}
+        )
+    return fields
+
+
+def project(queryset, serializer_class, fields, extra=()):
+    """
+    Restrict `queryset` to the columns the given serializer fields read (plus
+    the primary key and `extra`), so unrequested columns are not selected.
+    The queryset is returned as is when a field's columns cannot be told
+    apart, e.g. a method field or a property source.
+    """
+    if not fields or queryset.query.select_related:
+        return queryset
+    model = queryset.model
+    serializer = serializer_class(fields=fields)
+    columns = {model._meta.pk.name, *extra}
+    for name in fields:
+        source_attrs = serializer.fields[name].source_attrs
+        if not source_attrs:
+            return queryset
+        try:
+            model_field = model._meta.get_field(source_attrs[0])
+        except FieldDoesNotExist:
+            return queryset
+        if not model_field.concrete or model_field.many_to_many:
+            return queryset
+        columns.add(model_field.name)
+    return queryset.only(*columns)
+
+
+class ProjectionMixin:
+    """
+    List views of a ProjectableSerializerMixin serializer: `?fields=a,b`
+    selects and serializes only those fields.
+    """
+    projected_fields = None
+
+    def list(self, request, *args, **kwargs):
+        self.projected_fields = requested_fields(request, self.get_serializer_class())
+        return super().list(request, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.projected_fields is None:
+            return queryset
+        ordering = getattr(self, 'cursor_ordering', None)
+        extra = [ordering.lstrip('-')] if ordering else []
+        return project(queryset, self.get_serializer_class(), self.projected_fields, extra)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.projected_fields is not None:
+            kwargs['fields'] = self.projected_fields
+        return super().get_serializer(*args, **kwargs)
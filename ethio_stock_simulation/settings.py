@@ -115,6 +115,17 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# token_version/is_active checks of CustomJWTAuthentication (see users/token_cache.py):
+# a per-process LRU whose entries are trusted for local_ttl_seconds, so a re-login or a
+# deactivation reaches every worker within that time. Enable shared once CACHES points
+# at Redis/Memcached to also keep the versions there (ignored on the default LocMemCache).
+TOKEN_VERSION_CACHE = {
+    'shared': False,
+    'max_entries': 10000,
+    'local_ttl_seconds': 5,
+    'shared_ttl_seconds': 3600,
+}
+
 
 ROOT_URLCONF = 'ethio_stock_simulation.urls'
 
@@ -213,6 +224,92 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='Ethiopian Stock Marke
 COMPANY_EMAIL = config('COMPANY_EMAIL', default=None)  # Set to None if not required
 
 
+# Order matching: when enabled, new orders from the API are acknowledged immediately
+# and matched by one worker per stock shard (see stocks/sequencer.py). Queued orders
+# are lost with their process, so with recover_on_start each worker first recrosses
+# the open orders of its stocks when the server starts
+MATCHING_SEQUENCER = {
+    'enabled': True,
+    'workers': 4,
+    'recover_on_start': True,
+}
+
+# In-memory order books (see stocks/order_book.py): each match also re-reads open orders
+# created in the last lag_seconds (late commits), and a book older than reload_seconds
+# is rebuilt from the DB to drop orders cancelled, filled or expired by other processes
+ORDER_BOOK = {
+    'lag_seconds': 30,
+    'reload_seconds': 60,
+}
+
+# Call auctions at the session boundaries (see stocks/auction.py): orders placed in the
+# pre-open window before WorkingHours.start_time (and, if pre_close_minutes > 0, in the
+# last minutes before end_time) are collected and uncrossed at a single price
+CALL_AUCTION = {
+    'enabled': True,
+    'pre_open_minutes': 15,
+    'pre_close_minutes': 0,
+}
+
+# Transactional emails (OTP, KYC, account notices) are queued and sent by a small
+# thread pool with retries (see ethio_stock_simulation/mail.py). transport is one of
+# SendGridTransport (pooled HTTP session), ConsoleTransport, FileTransport (writes
+# under file_path) or LocmemTransport in that module.
+MAIL_QUEUE = {
+    'transport': 'ethio_stock_simulation.mail.SendGridTransport',
+    'workers': 4,
+    'max_attempts': 5,
+    'backoff_seconds': 2,
+    'max_backoff_seconds': 300,
+    'timeout_seconds': 10,
+    'file_path': os.path.join(BASE_DIR, 'sent_emails'),
+}
+
+# Trade notifications are written to an outbox inside the trade transaction and
+# delivered after commit by a small thread pool (see stocks/notifications.py).
+# Use 'stocks.notifications.LocmemTransport' to keep emails in memory.
+NOTIFICATION_OUTBOX = {
+    'workers': 2,
+    'batch_size': 200,
+    'max_attempts': 5,
+    'claim_timeout_seconds': 300,
+    'email_transport': 'stocks.notifications.SendGridTransport',
+}
+
+# Regulation values and working hours are cached per process and dropped on change.
+# Other workers see a change within local_ttl_seconds; enable shared_version when
+# CACHES points at a shared backend (Redis/Memcached) to have them notice it within
+# version_check_seconds instead.
+REGULATION_CACHE = {
+    'shared_version': False,
+    'version_check_seconds': 2,
+    'local_ttl_seconds': 5,
+}
+
+# Server-side dividend declarations run in the background (see stocks/dividend_jobs.py)
+DIVIDEND_JOBS = {
+    'workers': 1,
+    'chunk_size': 1000,
+    'stale_seconds': 6 * 3600,  # a job 'Running' this long is presumed dead and may be re-run
+}
+
+# Websocket market data (ws/market/, see stocks/market_data.py): updates are coalesced
+# per stock and kind, latest value wins, and pushed once per interval_seconds; book
+# depth is kept and streamed as sequenced deltas for the top depth_levels price levels
+MARKET_DATA = {
+    'enabled': True,
+    'interval_seconds': 0.25,
+    'max_subscriptions': 50,
+    'depth_levels': 10,
+}
+
+# Precomputed extended-dashboard documents (see stocks/market_summary.py).
+# refresh_delay_seconds: debounce after a trade/dividend; None to refresh only on read or by command
+MARKET_SUMMARY = {
+    'refresh_delay_seconds': 2.0,
+    'max_age_seconds': 60,
+}
+
 SUSPICIOUS_TRADE_THRESHOLDS = {
     'unusual_volume_ratio': 0.1,  # 10% of float
     'price_deviation': 0.2,      # ±20% from average price
@@ -220,6 +317,23 @@ SUSPICIOUS_TRADE_THRESHOLDS = {
     'trade_frequency_minutes': 10,
 }
 
+# The surveillance engine keeps running per-stock aggregates in memory; it picks
+# up trades from other processes every sync interval and persists its state
+# every checkpoint interval (see stocks/surveillance.py)
+SURVEILLANCE_ENGINE = {
+    'sync_interval_seconds': 5,
+    'checkpoint_interval_seconds': 60,
+}
+
+# Trades are evaluated by surveillance workers after commit, in micro-batches of
+# up to batch_size trades, each waiting at most max_lag_seconds
+SURVEILLANCE_PIPELINE = {
+    'enabled': True,
+    'workers': 2,
+    'batch_size': 500,
+    'max_lag_seconds': 1.0,
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
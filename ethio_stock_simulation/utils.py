@@ -1,12 +1,6 @@
-import sendgrid
-from sendgrid.helpers.mail import Mail
 import random
-from decouple import config
 
-from ethio_stock_simulation.settings import SENDGRID_API_KEY, SENDGRID_FROM_EMAIL
-
-SENDGRID_API_KEY = config('SENDGRID_API_KEY', default=SENDGRID_API_KEY)
-SENDGRID_FROM_EMAIL = config('SENDGRID_FROM_EMAIL', default=SENDGRID_FROM_EMAIL)
+from ethio_stock_simulation.mail import mail_queue
 
 
 def generate_otp():
@@ -14,11 +8,8 @@ def generate_otp():
     return str(random.randint(100000, 999999))
 
 
-def send_verification_email(to_email, username, otp, role, company_name=None):
-    """
-    Send OTP to user's email via SendGrid, including user role and company name (if applicable).
-    """
-    sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
+def verification_email(username, otp, role, company_name=None):
+    """Subject and body of the OTP email, including user role and company name (if applicable)."""
     subject = "Your Account Verification Code"
 
     if role == 'company_admin' and company_name:
@@ -52,24 +43,16 @@ Best regards,
 Ethiopian Stock Market Simulation Team
 """
 
-    message = Mail(
-        from_email=SENDGRID_FROM_EMAIL,
-        to_emails=to_email,
-        subject=subject,
-        plain_text_content=content
-    )
-    try:
-        response = sg.send(message)
-        print(f"Email sent to {to_email}. Status Code: {response.status_code}")
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+    return subject, content
 
 
-def send_kyc_approved_email(to_email, username):
-    """Notify user that their KYC has been approved."""
-    sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
+def send_verification_email(to_email, username, otp, role, company_name=None):
+    """Send the OTP email now; request handlers queue it with mail_queue instead."""
+    return mail_queue.send_now(to_email, *verification_email(username, otp, role, company_name))
+
+
+def kyc_approved_email(username):
+    """Subject and body of the KYC approval notice."""
     subject = "KYC Approval Notification"
     content = f"""
 Hello {username},
@@ -84,24 +67,16 @@ Best regards,
 
 Ethiopian Stock Market Simulation Team
 """
-    message = Mail(
-        from_email=SENDGRID_FROM_EMAIL,
-        to_emails=to_email,
-        subject=subject,
-        plain_text_content=content
-    )
-    try:
-        response = sg.send(message)
-        print(f"KYC approval email sent to {to_email}. Status Code: {response.status_code}")
-        return True
-    except Exception as e:
-        print(f"Failed to send KYC approval email: {e}")
-        return False
+    return subject, content
 
 
-def send_kyc_rejected_email(to_email, username):
-    """Notify user that their KYC has been rejected."""
-    sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
+def send_kyc_approved_email(to_email, username):
+    """Notify user that their KYC has been approved."""
+    return mail_queue.send_now(to_email, *kyc_approved_email(username))
+
+
+def kyc_rejected_email(username):
+    """Subject and body of the KYC rejection notice."""
     subject = "KYC Rejection Notification"
     content = f"""
 Hello {username},
@@ -115,24 +90,30 @@ Best regards,
 
 Ethiopian Stock Market Simulation Team
 """
-    message = Mail(
-        from_email=SENDGRID_FROM_EMAIL,
-        to_emails=to_email,
-        subject=subject,
-        plain_text_content=content
-    )
-    try:
-        response = sg.send(message)
-        print(f"KYC rejection email sent to {to_email}. Status Code: {response.status_code}")
-        return True
-    except Exception as e:
-        print(f"Failed to send KYC rejection email: {e}")
-        return False
+    return subject, content
+
+
+def send_kyc_rejected_email(to_email, username):
+    """Notify user that their KYC has been rejected."""
+    return mail_queue.send_now(to_email, *kyc_rejected_email(username))
+
+
+def account_deactivated_email(username):
+    """Subject and body of the notice sent when a regulator deactivates an account."""
+    subject = "Account Deactivated"
+    content = f"""
+    Dear {username},
+
+    Your account has been deactivated by an administrator. 
+    You will no longer be able to log in to the system.
+
+    If you believe this is a mistake, please contact support.
+    """
+    return subject, content
 
 
 def send_account_kyc_verified_email(to_email, username):
     """Notify user that both their account and KYC have been verified."""
-    sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
     subject = "Account and KYC Verification Successful"
     content = f"""
 Hello {username},
@@ -148,26 +129,13 @@ Best regards,
 
 Ethiopian Stock Market Simulation Team
 """
-    message = Mail(
-        from_email=SENDGRID_FROM_EMAIL,
-        to_emails=to_email,
-        subject=subject,
-        plain_text_content=content
-    )
-    try:
-        response = sg.send(message)
-        print(f"Account and KYC verified email sent to {to_email}. Status Code: {response.status_code}")
-        return True
-    except Exception as e:
-        print(f"Failed to send account and KYC verified email: {e}")
-        return False
+    return mail_queue.send_now(to_email, subject, content)
 
 
 def send_order_notification(to_email, username, action, stock_symbol, quantity, price, new_balance=None):
     """
     Send an order execution notification.
     """
-    sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
     subject = "Order Execution Notification"
     content = f"""
 Hello {username},
@@ -189,16 +157,36 @@ Best regards,
 Ethiopian Stock Market Simulation Team
 """
 
-    message = Mail(
-        from_email=SENDGRID_FROM_EMAIL,
-        to_emails=to_email,
-        subject=subject,
-        plain_text_content=content
-    )
-    try:
-        response = sg.send(message)
-        print(f"Order execution email sent to {to_email}. Status Code: {response.status_code}")
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+    return mail_queue.send_now(to_email, subject, content)
+
+
+def send_order_digest_notification(to_email, username, executions):
+    """
+    Send a single notification covering several order executions.
+    Each execution is a dict with action, stock_symbol, quantity, price and
+    (optionally) new_balance, in execution order.
+    """
+    subject = "Order Execution Notification"
+    content = f"""
+Hello {username},
+
+We are pleased to inform you that the following orders have been executed successfully:
+
+"""
+    for execution in executions:
+        content += (
+            f"    {execution['action']} {execution['quantity']} {execution['stock_symbol']}"
+            f" at {float(execution['price']):,.2f}\n"
+        )
+
+    new_balance = executions[-1].get('new_balance')
+    if new_balance is not None:
+        content += f"\nYour updated account balance is now: {float(new_balance):,.2f}\n\n"
+
+    content += """Thank you for trading with the Ethiopian Stock Market Simulation Platform.
+
+Best regards,
+Ethiopian Stock Market Simulation Team
+"""
+
+    return mail_queue.send_now(to_email, subject, content)
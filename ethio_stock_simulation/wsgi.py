@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ethio_stock_simulation.settings')
 
 application = get_wsgi_application()
+
+# Start the matching sequencer with the server, so orders left unmatched by a
+# previous process are recovered without waiting for the next order
+from stocks.sequencer import matching_sequencer  # noqa: E402
+
+matching_sequencer.start()
@@ -5,3 +5,5 @@ class RegulationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'regulations'
 
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the regulation cache invalidation)
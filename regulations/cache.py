@@ -0,0 +1,102 @@
+# regulations/cache.py
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'regulations:snapshot_version'
+
+
+class RegulationCache:
+    """
+    Process-local snapshot of the static rule data order validation reads:
+    Regulation values by name and WorkingHours windows by day of week.
+
+    The snapshot is loaded with two small queries and dropped whenever a
+    Regulation or WorkingHours row is saved or deleted in this process (see
+    regulations/signals.py). With REGULATION_CACHE['shared_version'] enabled,
+    each change also bumps a version counter in the Django cache, and other
+    workers reload their snapshot once they notice the new version (checked
+    at most every `version_check_seconds`). Without it, a snapshot is only
+    trusted for `local_ttl_seconds`, so changes made by other workers are
+    seen within that time. Writes that bypass model signals, such as
+    queryset.update(), need an explicit invalidate().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regulations = None
+        self._working_hours = None
+        self._version = None
+        self._version_checked_at = 0.0
+        self._loaded_at = 0.0
+
+    @staticmethod
+    def _config():
+        config = getattr(settings, 'REGULATION_CACHE', {})
+        return (
+            config.get('shared_version', False),
+            config.get('version_check_seconds', 2),
+            config.get('local_ttl_seconds', 5),
+        )
+
+    def _snapshot(self):
+        shared, check_every, local_ttl = self._config()
+        with self._lock:
+            if self._regulations is not None:
+                now = time.monotonic()
+                if not shared:
+                    if now - self._loaded_at >= local_ttl:
+                        self._regulations = None
+                elif now - self._version_checked_at >= check_every:
+                    self._version_checked_at = now
+                    if cache.get(VERSION_KEY, 0) != self._version:
+                        self._regulations = None
+            if self._regulations is None:
+                self._load(shared)
+            return self._regulations, self._working_hours
+
+    def _load(self, shared):
+        from .models import Regulation, WorkingHours  # Inline import to avoid circular dependency
+
+        if shared:
+            self._version = cache.get_or_set(VERSION_KEY, 0)
+            self._version_checked_at = time.monotonic()
+        self._regulations = dict(Regulation.objects.values_list('name', 'value'))
+        self._working_hours = {
+            day: (start, end)
+            for day, start, end in WorkingHours.objects.values_list('day_of_week', 'start_time', 'end_time')
+        }
+        self._loaded_at = time.monotonic()
+        logger.debug(
+            f"Regulation snapshot loaded: {len(self._regulations)} regulations, "
+            f"{len(self._working_hours)} working days."
+        )
+
+    def regulation(self, name):
+        regulations, _ = self._snapshot()
+        return regulations.get(name)
+
+    def working_hours(self, day_of_week):
+        """(start_time, end_time) for the given day, or None if not defined."""
+        _, working_hours = self._snapshot()
+        return working_hours.get(day_of_week)
+
+    def invalidate(self):
+        with self._lock:
+            self._regulations = None
+            self._working_hours = None
+        shared, _, _ = self._config()
+        if shared:
+            try:
+                cache.incr(VERSION_KEY)
+            except ValueError:
+                cache.set(VERSION_KEY, 1, None)
+
+
+regulation_cache = RegulationCache()
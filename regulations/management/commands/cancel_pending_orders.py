@@ -2,12 +2,13 @@
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from stocks.models import Orders
-from regulations.models import WorkingHours
-from decimal import Decimal
+
+from stocks.expiry import end_of_trading_day, expire_open_orders
+from stocks.market_data import market_data
+
 
 class Command(BaseCommand):
-    help = 'Cancels pending orders after working hours.'
+    help = 'Cancels pending orders after working hours (same engine as the stocks command).'
 
     def handle(self, *args, **kwargs):
         current_time = timezone.localtime()
@@ -15,19 +16,16 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Executing cancel_pending_orders at {current_time} on {current_day}")
 
-        # Retrieve today's working hours
-        try:
-            working_hours = WorkingHours.objects.get(day_of_week=current_day)
-        except WorkingHours.DoesNotExist:
+        end_of_day = end_of_trading_day(current_time)
+        if end_of_day is None:
             self.stdout.write(self.style.ERROR(f"No working hours defined for {current_day}. Exiting."))
             return
 
-        end_time = working_hours.end_time
-
         # Check if current time is past end_time
-        if current_time.time() > end_time:
-            pending_orders = Orders.objects.filter(status='Pending')
-            updated_count = pending_orders.update(status='Cancelled')
+        if current_time > end_of_day:
+            updated_count = expire_open_orders()
+            # This process exits before the publisher's next push: send the depth changes now
+            market_data.flush()
             self.stdout.write(self.style.SUCCESS(f"Cancelled {updated_count} pending orders."))
         else:
             self.stdout.write(self.style.WARNING("Current time is before the end of working hours. No action taken."))
@@ -0,0 +1,15 @@
+# regulations/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import regulation_cache
+from .models import Regulation, WorkingHours
+
+
+@receiver([post_save, post_delete], sender=Regulation)
+@receiver([post_save, post_delete], sender=WorkingHours)
+def invalidate_regulation_cache(sender, **kwargs):
+    # Drop the snapshot once the change is visible to other connections
+    transaction.on_commit(regulation_cache.invalidate)
@@ -1,3 +1,50 @@
+import datetime
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from .cache import regulation_cache
+from .models import Regulation, WorkingHours
+from .utils import get_regulation_value
+
+
+class RegulationCacheTests(TestCase):
+
+    def setUp(self):
+        regulation_cache.invalidate()
+
+    def test_saved_regulation_is_served_once_committed(self):
+        self.assertIsNone(get_regulation_value("Daily Trade Limit"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            regulation = Regulation.objects.create(name="Daily Trade Limit", value="3")
+        self.assertEqual(get_regulation_value("Daily Trade Limit"), "3")
+
+        regulation.value = "5"
+        with self.captureOnCommitCallbacks(execute=True):
+            regulation.save()
+        self.assertEqual(get_regulation_value("Daily Trade Limit"), "5")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            regulation.delete()
+        self.assertIsNone(get_regulation_value("Daily Trade Limit"))
+
+    def test_working_hours(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkingHours.objects.create(
+                day_of_week='Monday', start_time=datetime.time(9, 0), end_time=datetime.time(17, 0)
+            )
+        self.assertEqual(regulation_cache.working_hours('Monday'), (datetime.time(9, 0), datetime.time(17, 0)))
+        self.assertIsNone(regulation_cache.working_hours('Sunday'))
+
+    def test_changes_from_other_workers_are_seen_after_the_local_ttl(self):
+        Regulation.objects.create(name="Daily Trade Limit", value="3")
+        with mock.patch('regulations.cache.time.monotonic', return_value=1000.0):
+            self.assertEqual(get_regulation_value("Daily Trade Limit"), "3")
+        # Another worker's change: no signal reaches this process
+        Regulation.objects.filter(name="Daily Trade Limit").update(value="7")
+
+        with mock.patch('regulations.cache.time.monotonic', return_value=1004.0):
+            self.assertEqual(get_regulation_value("Daily Trade Limit"), "3")
+        with mock.patch('regulations.cache.time.monotonic', return_value=1005.0):
+            self.assertEqual(get_regulation_value("Daily Trade Limit"), "7")
@@ -1,8 +1,6 @@
-from .models import Regulation
+from .cache import regulation_cache
 
 def get_regulation_value(name):
-    try:
-        regulation = Regulation.objects.get(name=name)
-        return regulation.value
-    except Regulation.DoesNotExist:
-        return None
+    # Served from the process-local snapshot (see regulations/cache.py);
+    # returns None when no regulation with that name exists.
+    return regulation_cache.regulation(name)
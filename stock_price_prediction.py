@@ -13,16 +13,14 @@ def fetch_data():
     query = """
     SELECT 
         stock_id,
-        MIN(price) AS opening_price,
-        MAX(price) AS closing_price,
-        MAX(price) AS high_price,
-        MIN(price) AS low_price,
-        SUM(quantity) AS total_volume,
-        AVG(price) AS average_price,
+        open AS opening_price,
+        close AS closing_price,
+        high AS high_price,
+        low AS low_price,
+        volume AS total_volume,
         CURRENT_DATE AS date
-    FROM stocks_trade
-    WHERE trade_time >= CURRENT_DATE AND trade_time < CURRENT_DATE + INTERVAL '1 day'
-    GROUP BY stock_id;
+    FROM stocks_candle
+    WHERE resolution = '1d' AND start >= CURRENT_DATE AND start < CURRENT_DATE + INTERVAL '1 day';
     """
     df = pd.read_sql_query(query, engine)
 
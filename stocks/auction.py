@@ -0,0 +1,166 @@
+# stocks/auction.py
+
+import datetime
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from regulations.cache import regulation_cache
+
+logger = logging.getLogger(__name__)
+
+PRE_OPEN = 'pre_open'
+CONTINUOUS = 'continuous'
+PRE_CLOSE = 'pre_close'
+CLOSED = 'closed'
+
+
+class AuctionResult:
+    """Uncrossing price of a book and what trades at it."""
+    __slots__ = ('price', 'volume', 'imbalance')
+
+    def __init__(self, price, volume, imbalance):
+        self.price = price
+        self.volume = volume
+        self.imbalance = imbalance
+
+
+def uncrossing_price(bids, asks, reference_price=None):
+    """
+    Single price at which a call auction executes, from the collected orders
+    as (price, quantity) pairs (price None for Market orders).
+
+    Picks the price with the maximum executable volume min(demand, supply);
+    ties go to the smallest imbalance, then to the price closest to the
+    reference price, then to the lower price. Limit prices are the
+    candidates; when both sides only hold Market orders the reference price
+    is used. Returns None when nothing crosses.
+    """
+    bid_levels, ask_levels = defaultdict(int), defaultdict(int)
+    for price, quantity in bids:
+        bid_levels[price] += quantity
+    for price, quantity in asks:
+        ask_levels[price] += quantity
+    market_demand = bid_levels.pop(None, 0)
+    market_supply = ask_levels.pop(None, 0)
+    candidates = sorted(set(bid_levels) | set(ask_levels))
+    if not candidates:
+        if not (market_demand and market_supply) or reference_price is None:
+            return None
+        volume = min(market_demand, market_supply)
+        return AuctionResult(reference_price, volume, market_demand - market_supply)
+
+    # Cumulative demand (bids at or above the price) and supply (asks at or below)
+    demand_at, running = {}, market_demand
+    for price in reversed(candidates):
+        running += bid_levels.get(price, 0)
+        demand_at[price] = running
+    supply_at, running = {}, market_supply
+    for price in candidates:
+        running += ask_levels.get(price, 0)
+        supply_at[price] = running
+
+    best = None
+    best_key = None
+    for price in candidates:
+        demand, supply = demand_at[price], supply_at[price]
+        volume = min(demand, supply)
+        if volume <= 0:
+            continue
+        distance = abs(price - reference_price) if reference_price is not None else 0
+        key = (-volume, abs(demand - supply), distance, price)
+        if best_key is None or key < best_key:
+            best_key = key
+            best = AuctionResult(price, volume, demand - supply)
+    return best
+
+
+class CallAuction:
+    """
+    Session phases around the WorkingHours window of each day, and which call
+    auctions are due.
+
+    With CALL_AUCTION['enabled'], orders accepted during the pre-open window
+    (`pre_open_minutes` before start_time) and the pre-close window
+    (`pre_close_minutes` before end_time, 0 to disable) are only collected;
+    each stock's book is then uncrossed once at a single price (see
+    Orders.run_call_auction). The opening auction runs lazily ahead of the
+    first continuous match of the stock after the open, or from the
+    `run_call_auction` command; the closing auction runs from the command.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._completed = set()  # (stock_id, kind, session_date) known to have run
+
+    @staticmethod
+    def _config():
+        config = getattr(settings, 'CALL_AUCTION', {})
+        if not config.get('enabled', False):
+            return 0, 0
+        return config.get('pre_open_minutes', 15), config.get('pre_close_minutes', 0)
+
+    def phase(self, now=None):
+        """(phase, session date) of the local time `now`."""
+        now = timezone.localtime(now)
+        day = now.date()
+        working_hours = regulation_cache.working_hours(now.strftime('%A'))
+        if working_hours is None:
+            return CLOSED, day
+
+        pre_open_minutes, pre_close_minutes = self._config()
+        start_time, end_time = working_hours
+        current = now.replace(tzinfo=None)
+        open_at = datetime.datetime.combine(day, start_time)
+        close_at = datetime.datetime.combine(day, end_time)
+        pre_open_at = max(open_at - datetime.timedelta(minutes=pre_open_minutes), datetime.datetime.combine(day, datetime.time.min))
+        pre_close_at = close_at - datetime.timedelta(minutes=pre_close_minutes)
+
+        if pre_open_at <= current < open_at:
+            return PRE_OPEN, day
+        if pre_close_minutes and pre_close_at <= current <= close_at:
+            return PRE_CLOSE, day
+        if open_at <= current <= close_at:
+            return CONTINUOUS, day
+        return CLOSED, day
+
+    def is_collecting(self, now=None):
+        """True while new orders are held for an auction instead of matched."""
+        return self.phase(now)[0] in (PRE_OPEN, PRE_CLOSE)
+
+    def due_auction(self, stock_id, now=None):
+        """
+        (kind, session_date) of the opening auction a continuous match of
+        this stock must run first, or None. Cheap once it has run here.
+        """
+        pre_open_minutes, _ = self._config()
+        if not pre_open_minutes:
+            return None
+        phase, day = self.phase(now)
+        if phase != CONTINUOUS or (stock_id, 'open', day) in self._completed:
+            return None
+        return 'open', day
+
+    def scheduled_auction(self, now=None):
+        """(kind, session_date) of the auction a scheduled run should execute now, or None."""
+        pre_open_minutes, pre_close_minutes = self._config()
+        phase, day = self.phase(now)
+        if phase == CONTINUOUS and pre_open_minutes:
+            return 'open', day
+        if phase == CLOSED and pre_close_minutes:
+            # Closed after (not before) today's session
+            now = timezone.localtime(now)
+            working_hours = regulation_cache.working_hours(now.strftime('%A'))
+            if working_hours and now.time() > working_hours[1]:
+                return 'close', day
+        return None
+
+    def mark_completed(self, stock_id, kind, session_date):
+        with self._lock:
+            self._completed.add((stock_id, kind, session_date))
+
+
+call_auction = CallAuction()
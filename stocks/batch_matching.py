@@ -0,0 +1,70 @@
+# stocks/batch_matching.py
+
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import close_old_connections, connections
+
+from .market_data import market_data
+from .order_book import OPEN_STATUSES
+from .surveillance import surveillance_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def stocks_with_open_orders():
+    from stocks.models import Orders  # Inline import to avoid circular dependency
+
+    return list(
+        Orders.objects.filter(status__in=OPEN_STATUSES, quantity__gt=0)
+        .values_list('stock_id', flat=True).distinct().order_by('stock_id')
+    )
+
+
+def recross_stock(stock_id):
+    """
+    Recross one stock's book (Orders.recross_book), then wait for its trades
+    to be through surveillance and pushed to market data subscribers.
+    Returns (stock_id, trades created, error or None).
+    """
+    from stocks.models import Orders  # Inline import to avoid circular dependency
+
+    try:
+        trades = Orders.recross_book(stock_id)
+        surveillance_pipeline.drain()
+        market_data.flush()
+        return stock_id, len(trades), None
+    except Exception as e:
+        logger.error(f"Recross of stock {stock_id} failed: {e}", exc_info=True)
+        return stock_id, 0, str(e)
+    finally:
+        close_old_connections()
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:  # spawn/forkserver start methods
+        django.setup()
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+
+
+def recross_stocks(stock_ids, workers=1):
+    """
+    Recross the given stocks, one process per stock at a time across a pool
+    of `workers` processes (in this process when workers <= 1). Stocks are
+    independent: each is matched under its own row lock and transaction.
+    Yields (stock_id, trades created, error or None) as stocks finish.
+    """
+    if workers <= 1 or len(stock_ids) <= 1:
+        for stock_id in stock_ids:
+            yield recross_stock(stock_id)
+        return
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(recross_stock, stock_id) for stock_id in stock_ids]
+        for future in as_completed(futures):
+            yield future.result()
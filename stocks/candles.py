@@ -0,0 +1,160 @@
+# stocks/candles.py
+
+import datetime
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models_candles import Candle
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ('1m', '5m', '1h', '1d')
+_RESOLUTION_MINUTES = {'1m': 1, '5m': 5, '1h': 60}
+
+
+def bucket_start(value, resolution):
+    """Start of the `resolution` interval containing `value`, in local time."""
+    local = timezone.localtime(value).replace(second=0, microsecond=0)
+    if resolution == '1d':
+        return local.replace(hour=0, minute=0)
+    step = _RESOLUTION_MINUTES[resolution]
+    minute_of_day = local.hour * 60 + local.minute
+    floored = minute_of_day - minute_of_day % step
+    return local.replace(hour=floored // 60, minute=floored % 60)
+
+
+class _Bar:
+    __slots__ = ('open', 'high', 'low', 'close', 'volume', 'trade_count')
+
+    def __init__(self, price, quantity):
+        self.open = self.high = self.low = self.close = price
+        self.volume = quantity
+        self.trade_count = 1
+
+    def add(self, price, quantity):
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.close = price
+        self.volume += quantity
+        self.trade_count += 1
+
+
+def _aggregate(ticks):
+    """{(stock_id, resolution, start): _Bar} from (stock_id, trade_time, price, quantity) in time order."""
+    bars = {}
+    for stock_id, trade_time, price, quantity in ticks:
+        for resolution in RESOLUTIONS:
+            key = (stock_id, resolution, bucket_start(trade_time, resolution))
+            bar = bars.get(key)
+            if bar is None:
+                bars[key] = _Bar(price, quantity)
+            else:
+                bar.add(price, quantity)
+    return bars
+
+
+def record_trades(ticks):
+    """
+    Folds executions, given as (stock_id, trade_time, price, quantity) in
+    execution order, into the candles of every resolution. Must run inside
+    the settling transaction; costs three queries however many fills.
+    Returns the updated candles.
+    """
+    bars = _aggregate(ticks)
+    if not bars:
+        return []
+
+    # Make sure every bar exists, then lock them and merge
+    Candle.objects.bulk_create(
+        [
+            Candle(stock_id=stock_id, resolution=resolution, start=start,
+                   open=bar.open, high=bar.high, low=bar.low, close=bar.close)
+            for (stock_id, resolution, start), bar in bars.items()
+        ],
+        ignore_conflicts=True,
+    )
+    candles = Candle.objects.select_for_update().filter(
+        stock_id__in={key[0] for key in bars},
+        resolution__in={key[1] for key in bars},
+        start__in={key[2] for key in bars},
+    )
+    updated = []
+    for candle in candles:
+        bar = bars.get((candle.stock_id, candle.resolution, candle.start))
+        if bar is None:
+            continue
+        if candle.trade_count == 0:
+            candle.open, candle.high, candle.low = bar.open, bar.high, bar.low
+        else:
+            candle.high = max(candle.high, bar.high)
+            candle.low = min(candle.low, bar.low)
+        candle.close = bar.close
+        candle.volume += bar.volume
+        candle.trade_count += bar.trade_count
+        updated.append(candle)
+    Candle.objects.bulk_update(updated, ['open', 'high', 'low', 'close', 'volume', 'trade_count'])
+    return updated
+
+
+def backfill(stock_ids=None, start=None, end=None, chunk_size=2000):
+    """
+    Rebuilds candles from the buyer-side Trade rows in a single streaming
+    pass ordered by (stock, trade_time). The range is widened to whole local
+    days so no bar is rebuilt from part of its trades. Returns the number of
+    candles written.
+    """
+    from .models import Trade  # Inline import to avoid circular dependency
+
+    start = bucket_start(start, '1d') if start else None
+    end = bucket_start(end, '1d') + datetime.timedelta(days=1) if end else None
+
+    trades = Trade.objects.filter(order__action='Buy')
+    candles = Candle.objects.all()
+    if stock_ids:
+        trades = trades.filter(stock_id__in=stock_ids)
+        candles = candles.filter(stock_id__in=stock_ids)
+    if start:
+        trades = trades.filter(trade_time__gte=start)
+        candles = candles.filter(start__gte=start)
+    if end:
+        trades = trades.filter(trade_time__lt=end)
+        candles = candles.filter(start__lt=end)
+    ticks = trades.order_by('stock_id', 'trade_time', 'id').values_list('stock_id', 'trade_time', 'price', 'quantity')
+
+    written = 0
+    pending = []
+    open_bars = {}  # resolution -> (key, _Bar) of the bar being built
+
+    def emit(key, bar):
+        stock_id, resolution, bar_start = key
+        pending.append(Candle(
+            stock_id=stock_id, resolution=resolution, start=bar_start,
+            open=bar.open, high=bar.high, low=bar.low, close=bar.close,
+            volume=bar.volume, trade_count=bar.trade_count,
+        ))
+
+    with transaction.atomic():
+        candles.delete()
+        for stock_id, trade_time, price, quantity in ticks.iterator(chunk_size=chunk_size):
+            for resolution in RESOLUTIONS:
+                key = (stock_id, resolution, bucket_start(trade_time, resolution))
+                current = open_bars.get(resolution)
+                if current and current[0] == key:
+                    current[1].add(price, quantity)
+                    continue
+                if current:
+                    emit(*current)
+                open_bars[resolution] = (key, _Bar(price, quantity))
+            if len(pending) >= chunk_size:
+                Candle.objects.bulk_create(pending)
+                written += len(pending)
+                pending = []
+        for current in open_bars.values():
+            emit(*current)
+        Candle.objects.bulk_create(pending, batch_size=chunk_size)
+        written += len(pending)
+
+    logger.info(f"Backfilled {written} candles.")
+    return written
@@ -1,5 +1,11 @@
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
+from django.conf import settings
+from django.utils import timezone
+
+from .market_data import market_data, market_group
+
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -15,3 +21,110 @@ class NotificationConsumer(AsyncWebsocketConsumer):
 
     async def send_notification(self, event):
         await self.send(text_data=json.dumps(event['message']))
+
+
+class MarketDataConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Public market data by ticker. Clients send
+
+        {"action": "subscribe", "tickers": ["ABC", "XYZ"]}
+        {"action": "unsubscribe", "tickers": ["ABC"]}
+
+    and get a "snapshot" per newly subscribed ticker, then the coalesced
+    "trade", "quote", "candle" and "depth" messages pushed by
+    stocks.market_data. The snapshot's "depth" carries the sequence number
+    of the depth it holds: apply only the depth deltas numbered after it,
+    and re-subscribe (or fetch /stocks/<id>/depth/) on a gap.
+    """
+
+    async def connect(self):
+        self.subscriptions = {}  # ticker -> stock_id
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for stock_id in getattr(self, 'subscriptions', {}).values():
+            await self.channel_layer.group_discard(market_group(stock_id), self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        tickers = content.get('tickers') if isinstance(content, dict) else None
+        if action not in ('subscribe', 'unsubscribe') or not isinstance(tickers, list) \
+                or not all(isinstance(ticker, str) for ticker in tickers):
+            await self.send_json({'type': 'error', 'detail': 'Expected {"action": "subscribe"|"unsubscribe", "tickers": [...]}.'})
+            return
+
+        if action == 'unsubscribe':
+            for ticker in tickers:
+                stock_id = self.subscriptions.pop(ticker, None)
+                if stock_id is not None:
+                    await self.channel_layer.group_discard(market_group(stock_id), self.channel_name)
+            await self.send_json({'type': 'unsubscribed', 'tickers': tickers})
+            return
+
+        new = [ticker for ticker in dict.fromkeys(tickers) if ticker not in self.subscriptions]
+        limit = getattr(settings, 'MARKET_DATA', {}).get('max_subscriptions', 50)
+        if len(self.subscriptions) + len(new) > limit:
+            await self.send_json({'type': 'error', 'detail': f'At most {limit} tickers per connection.'})
+            return
+
+        stock_ids = await _stock_ids(new)
+        for ticker, stock_id in stock_ids.items():
+            self.subscriptions[ticker] = stock_id
+            await self.channel_layer.group_add(market_group(stock_id), self.channel_name)
+        await self.send_json({
+            'type': 'subscribed',
+            'tickers': list(stock_ids),
+            'unknown': [ticker for ticker in new if ticker not in stock_ids],
+        })
+        for message in await _snapshots(stock_ids):
+            await self.send_json(message)
+
+    async def market_data(self, event):
+        await self.send_json(event['message'])
+
+
+@database_sync_to_async
+def _stock_ids(tickers):
+    from .models import Stocks  # Inline import to avoid circular dependency
+
+    return dict(Stocks.objects.filter(ticker_symbol__in=tickers).values_list('ticker_symbol', 'id'))
+
+
+@database_sync_to_async
+def _snapshots(stock_ids):
+    """Last trade, today's candle, best bid/ask and depth per ticker."""
+    from .candles import bucket_start
+    from .models import Candle, Trade  # Inline import to avoid circular dependency
+
+    today = bucket_start(timezone.now(), '1d')
+    days = {
+        candle.stock_id: candle
+        for candle in Candle.objects.filter(stock_id__in=stock_ids.values(), resolution='1d', start=today)
+    }
+    messages = []
+    for ticker, stock_id in stock_ids.items():
+        last_trade = (
+            Trade.objects.filter(stock_id=stock_id).order_by('-trade_time', '-id')
+            .values_list('price', 'trade_time').first()
+        )
+        depth = market_data.depth_snapshot(stock_id, ticker)
+        # Best bid/ask are the depth's first levels, so the two always agree
+        best_bid = depth['bids'][0] if depth['bids'] else {}
+        best_ask = depth['asks'][0] if depth['asks'] else {}
+        day = days.get(stock_id)
+        messages.append({
+            'type': 'snapshot',
+            'ticker': ticker,
+            'last_price': str(last_trade[0]) if last_trade else None,
+            'last_trade_time': last_trade[1].isoformat() if last_trade else None,
+            'day': {
+                'open': str(day.open), 'high': str(day.high), 'low': str(day.low), 'close': str(day.close),
+                'volume': day.volume, 'trade_count': day.trade_count,
+            } if day else None,
+            'bid': best_bid.get('price'),
+            'bid_size': best_bid.get('quantity'),
+            'ask': best_ask.get('price'),
+            'ask_size': best_ask.get('quantity'),
+            'depth': depth,
+        })
+    return messages
@@ -0,0 +1,184 @@
+# stocks/dividend_jobs.py
+
+import datetime
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .holdings import iter_net_buy_lots
+from .models import Dividend, DividendDetailedHolding, DividendJob
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+
+class DividendJobRunner:
+    """
+    Runs server-side dividend declarations in the background.
+
+    A job makes two streamed passes over the stock's FIFO holdings
+    (stocks/holdings.py). The first pass sums the weighted values to get the
+    ratio. The second writes DividendDetailedHolding rows with chunked
+    bulk_create. Eligible holders' profit_balance is then credited by a single
+    set-based UPDATE, in the same transaction that marks the dividend
+    'Disbursed'. Progress is written to the DividendJob row after every chunk.
+
+    A run claims its job with a conditional UPDATE, so the background runner
+    and run_dividend_job never work on the same job at once. A job left
+    'Running' for DIVIDEND_JOBS['stale_seconds'] (its worker died) can be
+    claimed again. Its first worker may only be slow, so each claim gets a
+    run token: a run writes, credits and cleans up only the holding rows
+    tagged with its token. Crediting re-checks the dividend under a row lock,
+    so a dividend is paid out at most once, from exactly one run's rows.
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'DIVIDEND_JOBS', {})
+        self.workers = config.get('workers', 1)
+        self.chunk_size = config.get('chunk_size', 1000)
+        self.stale_seconds = config.get('stale_seconds', 6 * 3600)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, job_id):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dividend-job')
+        return self._executor.submit(self._run_in_background, job_id)
+
+    def _run_in_background(self, job_id):
+        try:
+            self.run(job_id)
+        finally:
+            close_old_connections()
+
+    def claimable(self):
+        """Jobs a run may claim: queued, failed, or running with a worker presumed dead."""
+        stale_before = timezone.now() - datetime.timedelta(seconds=self.stale_seconds)
+        return DividendJob.objects.filter(
+            Q(status__in=['Queued', 'Failed']) | Q(status='Running', started_at__lt=stale_before)
+        )
+
+    def run(self, job_id):
+        run_token = uuid.uuid4().hex
+        claimed = self.claimable().filter(id=job_id).update(
+            status='Running', phase='weighing', started_at=timezone.now(), error='', run_token=run_token
+        )
+        job = DividendJob.objects.select_related('dividend', 'stock').get(id=job_id)
+        if not claimed:
+            return job
+        job.run_token = run_token
+
+        dividend = job.dividend
+        own_rows = DividendDetailedHolding.objects.filter(dividend=dividend, run_token=run_token)
+        credited = False
+        try:
+            # Pass 1: sum of all weighted values (eligible or not) -> ratio
+            sum_weighted_value = Decimal('0.00')
+            total_holdings = 0
+            for lot in iter_net_buy_lots(job.stock, job.current_price):
+                sum_weighted_value += lot['weighted_value']
+                total_holdings += 1
+            if sum_weighted_value <= 0:
+                raise ValueError("sum_weighted_value must be > 0.")
+            ratio = (Decimal(str(dividend.total_dividend_amount)) / sum_weighted_value).quantize(Decimal('0.000001'))
+            self._progress(
+                job, phase='writing', total_holdings=total_holdings, sum_weighted_value=sum_weighted_value
+            )
+
+            # Pass 2: DividendDetailedHolding rows of this run, in chunks
+            processed = 0
+            rows = []
+            for lot in iter_net_buy_lots(job.stock, job.current_price):
+                rows.append(DividendDetailedHolding(
+                    dividend=dividend,
+                    user_id=lot['user_id'],
+                    username=lot['username'],
+                    stock_symbol=lot['stock_symbol'],
+                    order_type=lot['order_type'],
+                    price=lot['price'],
+                    quantity=lot['quantity'],
+                    transaction_fee=lot['transaction_fee'],
+                    total_buying_price=lot['total_buying_price'],
+                    weighted_value=lot['weighted_value'],
+                    dividend_eligible=lot['dividend_eligible'],
+                    trade_time=lot['trade_time'],
+                    ratio_at_creation=ratio,
+                    paid_dividend=(ratio * lot['weighted_value']).quantize(Decimal('0.01')),
+                    company_id=dividend.company_id,
+                    budget_year=dividend.budget_year,
+                    run_token=run_token,
+                ))
+                if len(rows) >= self.chunk_size:
+                    processed += self._write_chunk(job, rows, processed)
+                    rows = []
+            if rows:
+                processed += self._write_chunk(job, rows, processed)
+
+            # Credit every eligible holder in one statement and close the dividend
+            self._progress(job, phase='crediting')
+            with transaction.atomic():
+                if Dividend.objects.select_for_update().get(id=dividend.id).status == 'Disbursed':
+                    # Paid by another run of this job; only this run's rows go
+                    logger.warning(f"Dividend job {job.id}: dividend {dividend.id} is already disbursed.")
+                    own_rows.delete()
+                    self._progress(job, status='Completed', phase='done', finished_at=timezone.now())
+                    return job
+                # Rows of runs that died (or are still writing) are not paid out
+                DividendDetailedHolding.objects.filter(dividend=dividend).exclude(run_token=run_token).delete()
+                credited_users = self._credit_eligible_holders(dividend, run_token)
+                dividend.dividend_ratio = ratio
+                dividend.status = 'Disbursed'
+                dividend.save()
+            credited = True
+            self._progress(
+                job, status='Completed', phase='done', credited_users=credited_users,
+                finished_at=timezone.now()
+            )
+        except Exception as e:
+            logger.error(f"Dividend job {job.id} failed: {e}", exc_info=True)
+            if not credited:
+                # Only this run's rows, and never the rows a disbursed dividend was paid from
+                own_rows.delete()
+            self._progress(job, status='Failed', error=str(e), finished_at=timezone.now())
+        return job
+
+    def _write_chunk(self, job, rows, processed):
+        DividendDetailedHolding.objects.bulk_create(rows)
+        self._progress(job, processed_holdings=processed + len(rows))
+        return len(rows)
+
+    @staticmethod
+    def _credit_eligible_holders(dividend, run_token):
+        eligible = DividendDetailedHolding.objects.filter(
+            dividend=dividend, run_token=run_token, dividend_eligible='Yes', paid_dividend__gt=0
+        )
+        credit = (
+            eligible.filter(user_id=OuterRef('pk'))
+            .values('user_id')
+            .annotate(total=Sum('paid_dividend'))
+            .values('total')
+        )
+        return User.objects.filter(id__in=eligible.values('user_id')).update(
+            profit_balance=F('profit_balance') + Subquery(
+                credit, output_field=DecimalField(max_digits=15, decimal_places=2)
+            )
+        )
+
+    @staticmethod
+    def _progress(job, **fields):
+        for name, value in fields.items():
+            setattr(job, name, value)
+        # A run whose job was claimed again since no longer reports on it
+        DividendJob.objects.filter(id=job.id, run_token=job.run_token).update(**fields)
+
+
+dividend_job_runner = DividendJobRunner()
@@ -0,0 +1,110 @@
+# stocks/expiry.py
+
+import datetime
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from regulations.cache import regulation_cache
+from stocks.models_audit import TransactionAuditTrail
+from .market_data import market_data
+from .order_book import OPEN_STATUSES, order_books
+
+logger = logging.getLogger(__name__)
+
+
+def end_of_trading_day(now=None):
+    """
+    End of today's trading session as an aware datetime, or None when no
+    working hours are defined for today.
+    """
+    now = timezone.localtime(now)
+    working_hours = regulation_cache.working_hours(now.strftime('%A'))
+    if working_hours is None:
+        return None
+    _, end_time = working_hours
+    return timezone.make_aware(datetime.datetime.combine(now.date(), end_time), timezone.get_current_timezone())
+
+
+def expire_open_orders(reason='end_of_day', chunk_size=1000):
+    """
+    Cancels every open ('Pending' or 'Partially Completed') order.
+
+    Works through the orders in id order, chunk_size at a time, each chunk in
+    its own short transaction: lock the orders' stocks (as matching does) and
+    the orders themselves, cancel them with one UPDATE, write their
+    'OrderStatusChanged' audit rows with one bulk_create and, after commit,
+    drop them from any order book resident in this process and mark their
+    stocks' depth for the market data publisher. Books in other processes
+    drop them when matching next reaches them.
+    Returns the number of orders cancelled.
+    """
+    from stocks.models import Orders, Stocks  # Inline import to avoid circular dependency
+
+    cancelled = 0
+    last_id = 0
+    while True:
+        candidates = list(
+            Orders.objects.filter(status__in=OPEN_STATUSES, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'stock_id')[:chunk_size]
+        )
+        if not candidates:
+            break
+        last_id = candidates[-1][0]
+
+        with transaction.atomic():
+            # Take the stock locks matching takes, so no match is mid-flight
+            # on these orders, then re-read them under lock
+            list(Stocks.objects.select_for_update().filter(
+                id__in={stock_id for _, stock_id in candidates}
+            ).order_by('id').values_list('id', flat=True))
+            rows = list(
+                Orders.objects.select_for_update()
+                .filter(id__in=[order_id for order_id, _ in candidates], status__in=OPEN_STATUSES)
+                .order_by('id')
+                .values_list('id', 'stock_id', 'status', 'action', 'order_type', 'quantity', 'price')
+            )
+            if not rows:
+                continue
+
+            Orders.objects.filter(id__in=[row[0] for row in rows]).update(status='Cancelled')
+            TransactionAuditTrail.objects.bulk_create([
+                TransactionAuditTrail(
+                    event_type='OrderStatusChanged',
+                    order_id=order_id,
+                    details={
+                        'reason': reason,
+                        'previous_status': status,
+                        'new_status': 'Cancelled',
+                        'action': action,
+                        'order_type': order_type,
+                        'remaining_quantity': quantity,
+                        'price': str(price) if price is not None else None,
+                    },
+                )
+                for order_id, _, status, action, order_type, quantity, price in rows
+            ])
+            released = [(stock_id, order_id) for order_id, stock_id, *_ in rows]
+            transaction.on_commit(lambda released=released: _release_from_books(released))
+        cancelled += len(rows)
+
+    if cancelled:
+        logger.info(f"Expired {cancelled} open orders ({reason}).")
+    return cancelled
+
+
+def _release_from_books(released):
+    from stocks.models import Stocks  # Inline import to avoid circular dependency
+
+    books = {}
+    for stock_id, order_id in released:
+        book = order_books.peek(stock_id)
+        if book is not None:
+            book.remove(order_id)
+        books[stock_id] = book
+    tickers = dict(Stocks.objects.filter(id__in=books).values_list('id', 'ticker_symbol'))
+    for stock_id, book in books.items():
+        # Every stock's depth moved; only a resident book has a quote to send
+        market_data.publish_book(stock_id, tickers.get(stock_id), book.quote() if book is not None else None)
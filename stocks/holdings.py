@@ -0,0 +1,106 @@
+# stocks/holdings.py
+
+import datetime
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.utils import timezone
+from django.utils.timezone import make_aware
+
+from .models import Trade
+
+DIVIDEND_ELIGIBLE_DAYS = 10
+
+
+class HoldingsInconsistencyError(Exception):
+    """The trade history of a user cannot be replayed (more sold than bought)."""
+
+
+def days_stayed(trade_date):
+    """
+    Number of days from trade_date to June 30 of its financial year, including
+    both the start date and the end date, clamped to [0, 365].
+    """
+    # Ensure trade_date is timezone-aware
+    if timezone.is_naive(trade_date):
+        trade_date = make_aware(trade_date, timezone.get_current_timezone())
+
+    # Define end of financial year based on trade_date
+    year = trade_date.year
+    if trade_date.month >= 7:
+        fy_end = datetime.datetime(year + 1, 6, 30, tzinfo=datetime.timezone.utc)
+    else:
+        fy_end = datetime.datetime(year, 6, 30, tzinfo=datetime.timezone.utc)
+
+    # Calculate difference in days and include both start and end dates
+    delta = fy_end - trade_date.astimezone(datetime.timezone.utc)
+    return max(0, min(delta.days + 1, 365))
+
+
+def iter_net_buy_lots(stock, current_price, after_user_id=None, chunk_size=2000):
+    """
+    Yields the BUY trades of a stock that are still held after FIFO
+    subtraction of each user's SELL trades, one dict per lot, user by user
+    in ascending user_id order (and by trade time within a user).
+
+    Trades are streamed in a single query ordered by user, so memory is
+    bounded by the largest single user's history rather than the whole
+    stock. `after_user_id` resumes after a given user (keyset pagination) and
+    `chunk_size` is the number of rows fetched per round trip.
+    Raises HoldingsInconsistencyError when a user sold more than they bought.
+    """
+    trades = Trade.objects.filter(stock=stock, order__isnull=False)
+    if after_user_id is not None:
+        trades = trades.filter(user_id__gt=after_user_id)
+    trades = trades.order_by('user_id', 'trade_time', 'id').values_list(
+        'user_id', 'id', 'user__username', 'order__action', 'order__order_type',
+        'price', 'quantity', 'transaction_fee', 'trade_time',
+    )
+
+    current_price = Decimal(current_price)
+    for user_id, user_trades in groupby(trades.iterator(chunk_size=chunk_size), key=itemgetter(0)):
+        buy_lots = []
+        for _, trade_id, username, action, order_type, price, quantity, fee, trade_time in user_trades:
+            action = action.lower()
+            if action == 'buy':
+                buy_lots.append({
+                    "id": trade_id,
+                    "user_id": user_id,
+                    "username": username,
+                    "stock_symbol": stock.ticker_symbol,
+                    "order_type": order_type,
+                    "price": price,
+                    "quantity": quantity,
+                    "transaction_fee": fee,
+                    "trade_time": trade_time,
+                    "remaining_quantity": quantity,
+                })
+            elif action == 'sell':
+                if not buy_lots:
+                    raise HoldingsInconsistencyError(
+                        f"User {user_id} has sell trades but no corresponding buy trades."
+                    )
+                sell_qty = quantity
+                for lot in buy_lots:
+                    if sell_qty == 0:
+                        break
+                    taken = min(lot["remaining_quantity"], sell_qty)
+                    lot["remaining_quantity"] -= taken
+                    sell_qty -= taken
+                if sell_qty > 0:
+                    raise HoldingsInconsistencyError(
+                        f"User {user_id} sold more shares than bought. Data inconsistency."
+                    )
+
+        for lot in buy_lots:
+            remaining_qty = lot.pop("remaining_quantity")
+            if remaining_qty <= 0:
+                continue
+            stayed = days_stayed(lot["trade_time"])
+            weighted_value = (Decimal(stayed) / Decimal(365)) * Decimal(remaining_qty) * current_price
+            lot["quantity"] = remaining_qty
+            lot["total_buying_price"] = lot["price"] * Decimal(remaining_qty)
+            lot["weighted_value"] = weighted_value.quantize(Decimal('0.01'))
+            lot["dividend_eligible"] = "Yes" if stayed >= DIVIDEND_ELIGIBLE_DAYS else "No"
+            yield lot
@@ -0,0 +1,46 @@
+# stocks/management/commands/backfill_candles.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from stocks.candles import backfill
+
+
+class Command(BaseCommand):
+    help = """
+    Rebuilds OHLCV candles (1m, 5m, 1h, 1d) from historical trades in a single
+    streaming pass. Existing candles in the range are replaced; the range is
+    widened to whole days.
+
+    Usage:
+        python manage.py backfill_candles                                # all stocks, all history
+        python manage.py backfill_candles --stock 3 --stock 5
+        python manage.py backfill_candles --start 2025-01-01 --end 2025-01-31
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, action='append', dest='stocks', help='Stock id (repeatable).')
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per fetch and per insert.')
+
+    def handle(self, *args, **options):
+        start = self._parse_day(options['start'], '--start')
+        end = self._parse_day(options['end'], '--end')
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end.")
+
+        written = backfill(stock_ids=options['stocks'], start=start, end=end, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {written} candles."))
+
+    @staticmethod
+    def _parse_day(value, option):
+        if not value:
+            return None
+        try:
+            day = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"{option} must be in YYYY-MM-DD format.")
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
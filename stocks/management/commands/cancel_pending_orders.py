@@ -2,63 +2,51 @@
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.core.exceptions import ObjectDoesNotExist
-from regulations.models import WorkingHours  # Import from the correct app
-from stocks.models import Orders, TransactionAuditTrail  # Adjust import as necessary
 
-class Command(BaseCommand):
-    help = 'Cancels all pending orders at the end of the trading day.'
+from stocks.expiry import end_of_trading_day, expire_open_orders
+from stocks.market_data import market_data
 
-    def handle(self, *args, **options):
-        # Get the current datetime with timezone awareness
-        current_time = timezone.now()
-        current_day_of_week = current_time.strftime('%A')  # e.g., 'Monday', 'Tuesday', etc.
 
-        try:
-            # Retrieve the working hours for the current day of the week
-            working_hours = WorkingHours.objects.get(day_of_week=current_day_of_week)
-            end_time = working_hours.end_time  # This should be a TimeField
-        except ObjectDoesNotExist:
-            self.stdout.write(self.style.ERROR(f'Working hours for {current_day_of_week} are not defined.'))
-            return
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'An error occurred while fetching working hours: {e}'))
-            return
+class Command(BaseCommand):
+    help = """
+    Cancels all open (Pending and Partially Completed) orders at the end of the
+    trading day, in chunks, with an audit row per order.
+
+    Usage:
+        python manage.py cancel_pending_orders
+        python manage.py cancel_pending_orders --force            # ignore working hours
+        python manage.py cancel_pending_orders --chunk-size 5000
+    """
 
-        # Combine current date with end_time to get a complete datetime
-        naive_end_of_day_datetime = timezone.datetime.combine(current_time.date(), end_time)
-        end_of_day_datetime = timezone.make_aware(
-            naive_end_of_day_datetime,
-            timezone.get_current_timezone()
-        )
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Cancel even before the end of the trading day.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Orders cancelled per transaction.')
 
-        if current_time >= end_of_day_datetime:
-            pending_orders = Orders.objects.filter(status='Pending')
-            if pending_orders.exists():
-                for order in pending_orders:
-                    order.status = 'Cancelled'
-                    order.save()
+    def handle(self, *args, **options):
+        current_time = timezone.now()
 
-                    # Log audit trail for cancellation
-                    TransactionAuditTrail.objects.create(
-                        event_type='OrderStatusChanged',
-                        order=order,
-                        details=(
-                            f"Order automatically cancelled at end of day. "
-                            f"Action: {order.action}, Type: {order.order_type}, "
-                            f"Quantity: {order.quantity}, Price: {order.price}"
-                        )
+        if not options['force']:
+            end_of_day_datetime = end_of_trading_day(current_time)
+            if end_of_day_datetime is None:
+                current_day_of_week = timezone.localtime(current_time).strftime('%A')
+                self.stdout.write(self.style.ERROR(f'Working hours for {current_day_of_week} are not defined.'))
+                return
+            if current_time < end_of_day_datetime:
+                time_remaining = end_of_day_datetime - current_time
+                hours, remainder = divmod(time_remaining.seconds, 3600)
+                minutes, _ = divmod(remainder, 60)
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'It is not the end of the trading day yet. '
+                        f'Time remaining: {hours}h {minutes}m.'
                     )
-                self.stdout.write(self.style.SUCCESS('Successfully cancelled all pending orders.'))
-            else:
-                self.stdout.write(self.style.WARNING('No pending orders to cancel.'))
-        else:
-            time_remaining = end_of_day_datetime - current_time
-            hours, remainder = divmod(time_remaining.seconds, 3600)
-            minutes, _ = divmod(remainder, 60)
-            self.stdout.write(
-                self.style.WARNING(
-                    f'It is not the end of the trading day yet. '
-                    f'Time remaining: {hours}h {minutes}m.'
                 )
-            )
+                return
+
+        cancelled = expire_open_orders(chunk_size=options['chunk_size'])
+        # This process exits before the publisher's next push: send the depth changes now
+        market_data.flush()
+        if cancelled:
+            self.stdout.write(self.style.SUCCESS(f'Successfully cancelled {cancelled} open orders.'))
+        else:
+            self.stdout.write(self.style.WARNING('No pending orders to cancel.'))
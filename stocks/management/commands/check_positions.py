@@ -0,0 +1,60 @@
+# stocks/management/commands/check_positions.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stocks.models import Position, Trade
+
+
+class Command(BaseCommand):
+    help = """
+    Replays the Trade table into per-user, per-stock positions and compares
+    them with the stored Position rows. With --fix, the Position table is
+    rebuilt from the replay.
+
+    Usage:
+        python manage.py check_positions
+        python manage.py check_positions --fix
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rebuild Position rows from the trade history.')
+
+    def handle(self, *args, **options):
+        expected = {}
+        trades = (
+            Trade.objects.filter(order__isnull=False)
+            .order_by('trade_time', 'id')
+            .values_list('user_id', 'stock_id', 'order__action', 'quantity', 'price')
+        )
+        for user_id, stock_id, action, quantity, price in trades.iterator(chunk_size=5000):
+            position = expected.get((user_id, stock_id))
+            if position is None:
+                position = expected[(user_id, stock_id)] = Position(user_id=user_id, stock_id=stock_id)
+            position.apply_fill(quantity, price, is_buy=(action == 'Buy'))
+
+        stored = {(p.user_id, p.stock_id): p for p in Position.objects.all().iterator(chunk_size=5000)}
+        fields = ('quantity', 'cost_basis', 'realized_pnl')
+        mismatches = 0
+        for key in expected.keys() | stored.keys():
+            want, have = expected.get(key), stored.get(key)
+            want_values = tuple(getattr(want, f) for f in fields) if want else (0, 0, 0)
+            have_values = tuple(getattr(have, f) for f in fields) if have else (0, 0, 0)
+            if want_values != have_values:
+                mismatches += 1
+                self.stdout.write(
+                    f"user={key[0]} stock={key[1]}: stored {have_values}, trades give {want_values}"
+                )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f"All {len(expected)} positions are consistent with the trade history."))
+            return
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(f"{mismatches} positions differ. Run with --fix to rebuild them."))
+            return
+
+        with transaction.atomic():
+            Position.objects.all().delete()
+            Position.objects.bulk_create(expected.values(), batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(expected)} positions ({mismatches} were inconsistent)."))
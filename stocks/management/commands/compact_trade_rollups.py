@@ -0,0 +1,29 @@
+# stocks/management/commands/compact_trade_rollups.py
+
+from django.core.management.base import BaseCommand
+
+from stocks.rollups import compact, get_watermark
+
+
+class Command(BaseCommand):
+    help = """
+    Rolls closed hours and days of trades up into TradeRollup rows, which the
+    important report sums instead of scanning Trade. Run it nightly (or
+    hourly); trades past the watermark are still read raw, so reports stay
+    exact in between.
+
+    Usage:
+        python manage.py compact_trade_rollups            # everything up to the current hour
+        python manage.py compact_trade_rollups --rebuild  # recompute from the first trade
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Discard the watermark and recompute all rollups.')
+
+    def handle(self, *args, **options):
+        previous = get_watermark()
+        watermark = compact(rebuild=options['rebuild'])
+        if previous is not None and watermark == previous and not options['rebuild']:
+            self.stdout.write(self.style.WARNING(f"Nothing to compact; rollups already cover trades before {watermark}."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Trade rollups now cover trades before {watermark}."))
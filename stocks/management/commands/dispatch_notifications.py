@@ -0,0 +1,26 @@
+# stocks/management/commands/dispatch_notifications.py
+
+import logging
+from django.core.management.base import BaseCommand
+from stocks.notifications import notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = """
+    Delivers pending trade notifications from the outbox.
+
+    The web process drains the outbox on its own after every settled trade;
+    this command picks up whatever is left behind (e.g. after a restart or
+    a transport outage).
+
+    Usage:
+        python manage.py dispatch_notifications
+    """
+
+    def handle(self, *args, **options):
+        sent, failed = notification_dispatcher.drain()
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Delivered {sent} notifications, {failed} failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Delivered {sent} notifications."))
@@ -1,9 +1,15 @@
 from django.core.management.base import BaseCommand
-from stocks.models import Orders
+from stocks.batch_matching import recross_stocks, stocks_with_open_orders
+from stocks.notifications import notification_dispatcher
 
 class Command(BaseCommand):
-    help = 'Match and execute pending orders using the Price-Time Priority Algorithm'
+    help = 'Match and execute pending orders using the Price-Time Priority Algorithm (see match_pending_orders)'
 
     def handle(self, *args, **kwargs):
-        Orders.match_and_execute_orders()
+        results = list(recross_stocks(stocks_with_open_orders()))
+        notification_dispatcher.drain()
+        errors = [f"stock {stock_id}: {error}" for stock_id, _, error in results if error]
+        if errors:
+            self.stdout.write(self.style.ERROR('Matching failed for ' + '; '.join(errors)))
+            return
         self.stdout.write(self.style.SUCCESS('Successfully matched and executed pending orders.'))
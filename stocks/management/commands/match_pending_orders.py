@@ -2,53 +2,56 @@
 
 import sys
 import logging
+import time
 from django.core.management.base import BaseCommand
-from django.db import transaction
-from stocks.models import Orders
+from stocks.batch_matching import recross_stocks, stocks_with_open_orders
+from stocks.notifications import notification_dispatcher
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = """
-    Scans all pending orders in the database and attempts to match them
-    using the existing Orders.match_and_execute_orders() logic.
-    
+    Batch recross: for every stock with open orders, loads its open book once,
+    replays the orders through the matching rules in price-time priority in
+    memory and settles all resulting fills in bulk. Independent stocks are
+    processed in parallel across a process pool.
+
     Usage: 
         python manage.py match_pending_orders
+        python manage.py match_pending_orders --workers 4
+        python manage.py match_pending_orders --stock 3 --stock 5
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, action='append', dest='stocks', help='Stock id (repeatable).')
+        parser.add_argument('--workers', type=int, default=1, help='Processes matching stocks in parallel (default 1).')
+
     def handle(self, *args, **options):
-        try:
-            self.stdout.write("Starting matching process for pending orders...")
-
-            # Step 1: Fetch all pending orders. 
-            #   Typically you might fetch in chronological order, or by best price, 
-            #   but let's keep it simple and just order by created_at.
-            pending_orders = Orders.objects.filter(status='Pending').order_by('created_at')
-
-            if not pending_orders.exists():
-                self.stdout.write("No pending orders found.")
-                return
-
-            # Step 2: Loop and match
-            for order in pending_orders:
-                with transaction.atomic():
-                    # Re-fetch the order to ensure it’s still pending
-                    order.refresh_from_db()
-                    if order.status != 'Pending':
-                        continue  # skip if it's no longer pending
-
-                    # Call the existing method from your Orders model
-                    Orders.match_and_execute_orders(order)
-                    # The above code will attempt to match the order 
-                    # with suitable Buy/Sell orders. 
-
-                    # You could add logging for each order
-                    logger.info(f"Processed matching for Order ID={order.id}. Status is now {order.status}")
-
-            self.stdout.write("Matching process completed successfully.")
-
-        except Exception as e:
-            logger.error(f"Error while matching pending orders: {str(e)}", exc_info=True)
-            self.stderr.write(f"Error: {str(e)}")
+        self.stdout.write("Starting matching process for pending orders...")
+
+        stock_ids = options['stocks'] or stocks_with_open_orders()
+        if not stock_ids:
+            self.stdout.write("No pending orders found.")
+            return
+
+        started = time.monotonic()
+        total_trades = 0
+        failed = []
+        for stock_id, trades, error in recross_stocks(stock_ids, workers=options['workers']):
+            if error:
+                failed.append(stock_id)
+                self.stderr.write(f"Stock {stock_id}: {error}")
+                continue
+            total_trades += trades
+            logger.info(f"Recrossed stock {stock_id}: {trades} trades.")
+
+        # Deliver the trade notifications queued by the workers before exiting
+        notification_dispatcher.drain()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Matching process completed: {len(stock_ids) - len(failed)} stocks, "
+            f"{total_trades} trades in {elapsed:.2f}s."
+        )
+        if failed:
             sys.exit(1)
@@ -0,0 +1,74 @@
+# stocks/management/commands/rebuild_trading_counters.py
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils.timezone import localdate
+
+from stocks.models import DailyTradingCounter, Orders, Trade
+
+
+class Command(BaseCommand):
+    help = """
+    Recomputes DailyTradingCounter rows (orders created and traded amount per
+    user per day) from the Orders and Trade tables.
+
+    Usage:
+        python manage.py rebuild_trading_counters                 # today
+        python manage.py rebuild_trading_counters --date 2025-01-15
+        python manage.py rebuild_trading_counters --all
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to rebuild (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--all', action='store_true', help='Rebuild every day that has orders or trades.')
+
+    def handle(self, *args, **options):
+        orders = Orders.objects.all()
+        trades = Trade.objects.all()
+        counters = DailyTradingCounter.objects.all()
+
+        if not options['all']:
+            try:
+                day = datetime.date.fromisoformat(options['date']) if options['date'] else localdate()
+            except ValueError:
+                raise CommandError("--date must be in YYYY-MM-DD format.")
+            orders = orders.filter(created_at__date=day)
+            trades = trades.filter(trade_time__date=day)
+            counters = counters.filter(date=day)
+
+        totals = defaultdict(lambda: [0, Decimal('0.00')])
+        order_counts = (
+            orders.annotate(day=TruncDate('created_at'))
+            .values_list('user_id', 'day')
+            .annotate(order_count=Count('id'))
+        )
+        for user_id, day, order_count in order_counts:
+            totals[(user_id, day)][0] = order_count
+
+        traded_amounts = (
+            trades.annotate(day=TruncDate('trade_time'))
+            .values_list('user_id', 'day')
+            .annotate(traded_amount=Sum(ExpressionWrapper(
+                F('quantity') * F('price'), output_field=DecimalField(max_digits=20, decimal_places=2)
+            )))
+        )
+        for user_id, day, traded_amount in traded_amounts:
+            totals[(user_id, day)][1] = traded_amount or Decimal('0.00')
+
+        with transaction.atomic():
+            counters.delete()
+            DailyTradingCounter.objects.bulk_create(
+                [
+                    DailyTradingCounter(user_id=user_id, date=day, order_count=count, traded_amount=amount)
+                    for (user_id, day), (count, amount) in totals.items()
+                ],
+                batch_size=1000,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(totals)} daily trading counters."))
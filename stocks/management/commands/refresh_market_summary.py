@@ -0,0 +1,20 @@
+# stocks/management/commands/refresh_market_summary.py
+
+from django.core.management.base import BaseCommand
+
+from stocks.market_summary import market_summary
+
+
+class Command(BaseCommand):
+    help = """
+    Recomputes the precomputed extended-dashboard documents (MarketSummary).
+    Trade settlement and dividend events already refresh them; run this on a
+    schedule (e.g. every minute from cron) as a backstop or after bulk imports.
+
+    Usage:
+        python manage.py refresh_market_summary
+    """
+
+    def handle(self, *args, **options):
+        documents = market_summary.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(documents)} market summary documents."))
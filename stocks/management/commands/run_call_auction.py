@@ -0,0 +1,82 @@
+# stocks/management/commands/run_call_auction.py
+
+import datetime
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from stocks.auction import call_auction
+from stocks.batch_matching import stocks_with_open_orders
+from stocks.market_data import market_data
+from stocks.models import Orders
+from stocks.notifications import notification_dispatcher
+from stocks.surveillance import surveillance_pipeline
+
+
+class Command(BaseCommand):
+    help = """
+    Runs the call auction that is due now for every stock with open orders:
+    the opening auction once the session has opened, the closing auction once
+    it has closed (schedule this before cancel_pending_orders). Each stock's
+    collected orders are uncrossed at a single price; a stock's auction runs
+    at most once per session, so re-running is safe.
+
+    Usage:
+        python manage.py run_call_auction
+        python manage.py run_call_auction --kind open --date 2025-01-15
+        python manage.py run_call_auction --kind close --stock 3
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['open', 'close'], help='Auction to run (default: the one due now).')
+        parser.add_argument('--date', help='Session date (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--stock', type=int, action='append', dest='stocks', help='Stock id (repeatable).')
+
+    def handle(self, *args, **options):
+        if options['kind']:
+            kind = options['kind']
+            session_date = self._parse_day(options['date']) if options['date'] else localdate()
+        else:
+            if options['date']:
+                raise CommandError("--date requires --kind.")
+            due = call_auction.scheduled_auction()
+            if due is None:
+                self.stdout.write(self.style.WARNING("No call auction is due now."))
+                return
+            kind, session_date = due
+
+        stock_ids = options['stocks'] or stocks_with_open_orders()
+        started = time.monotonic()
+        volume = fills = 0
+        failed = []
+        for stock_id in stock_ids:
+            try:
+                run = Orders.run_call_auction(stock_id, kind, session_date)
+            except Exception as e:
+                failed.append(stock_id)
+                self.stderr.write(f"Stock {stock_id}: {e}")
+                continue
+            volume += run.volume
+            fills += run.fill_count
+
+        # Let surveillance, trade notifications and market data catch up before exiting
+        surveillance_pipeline.drain()
+        notification_dispatcher.drain()
+        market_data.flush()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{kind.capitalize()} auction of {session_date} completed: {len(stock_ids) - len(failed)} stocks, "
+            f"{volume} shares in {fills} fills, {elapsed:.2f}s."
+        ))
+        if failed:
+            sys.exit(1)
+
+    @staticmethod
+    def _parse_day(value):
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError("--date must be in YYYY-MM-DD format.")
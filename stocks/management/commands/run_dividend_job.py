@@ -0,0 +1,42 @@
+# stocks/management/commands/run_dividend_job.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stocks.dividend_jobs import dividend_job_runner
+from stocks.models import DividendJob
+
+
+class Command(BaseCommand):
+    help = """
+    Runs (or re-runs) server-side dividend jobs in the foreground, e.g. jobs
+    left queued by a restart, jobs that failed, or jobs stuck 'Running' past
+    DIVIDEND_JOBS['stale_seconds'] because their worker died. A job another
+    process is running is left alone.
+
+    Usage:
+        python manage.py run_dividend_job 12
+        python manage.py run_dividend_job --pending
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', type=int, help='DividendJob ids to run.')
+        parser.add_argument('--pending', action='store_true', help='Run every queued, failed or stale job.')
+
+    def handle(self, *args, **options):
+        job_ids = list(options['job_ids'])
+        if options['pending']:
+            job_ids += list(dividend_job_runner.claimable().order_by('id').values_list('id', flat=True))
+        if not job_ids:
+            raise CommandError("Give one or more job ids, or --pending.")
+
+        for job_id in job_ids:
+            try:
+                job = dividend_job_runner.run(job_id)
+            except DividendJob.DoesNotExist:
+                self.stderr.write(f"DividendJob {job_id} does not exist.")
+                continue
+            style = self.style.SUCCESS if job.status == 'Completed' else self.style.ERROR
+            self.stdout.write(style(
+                f"DividendJob {job.id}: {job.status}, {job.processed_holdings}/{job.total_holdings} holdings, "
+                f"{job.credited_users} holders credited. {job.error}".strip()
+            ))
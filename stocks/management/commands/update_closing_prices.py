@@ -1,25 +1,126 @@
-from django.core.management.base import BaseCommand
-from django.db.models import Max
-from stocks.models import Trade, Stocks, DailyClosingPrice
-from datetime import date
+# stocks/management/commands/update_closing_prices.py
+
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.models import F, Window
+from django.db.models.functions import FirstValue, TruncDate
+from django.utils import timezone
+from django.utils.timezone import localdate
+
+from stocks.models import DailyClosingPrice, Trade
+
+
+def closing_prices(first_day, last_day):
+    """
+    DailyClosingPrice rows (unsaved) for every stock and day in
+    [first_day, last_day] that had trades: the price of the day's last trade,
+    computed in one query.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min), tz)
+    trade_day = TruncDate('trade_time', tzinfo=tz)
+    rows = (
+        Trade.objects.filter(trade_time__gte=start, trade_time__lt=end)
+        .annotate(
+            day=trade_day,
+            last_price=Window(
+                FirstValue('price'),
+                partition_by=[F('stock_id'), trade_day],
+                order_by=[F('trade_time').desc(), F('id').desc()],
+            ),
+        )
+        .values_list('stock_id', 'day', 'last_price')
+        .distinct()
+    )
+    return [
+        DailyClosingPrice(stock_id=stock_id, date=day, closing_price=last_price)
+        for stock_id, day, last_price in rows
+    ]
+
+
+def write_closing_prices(first_day, last_day):
+    """Upserts the closes of [first_day, last_day] keyed on (stock, date); returns rows written."""
+    rows = closing_prices(first_day, last_day)
+    DailyClosingPrice.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['stock', 'date'],
+        update_fields=['closing_price'],
+    )
+    return len(rows)
+
+
+def _write_chunk_in_thread(chunk):
+    try:
+        return write_closing_prices(*chunk)
+    finally:
+        close_old_connections()
+
 
 class Command(BaseCommand):
-    help = 'Update daily closing prices from trades at end of working hours.'
+    help = """
+    Writes each stock's daily closing price (the price of its last trade of the
+    day) as a bulk upsert keyed on (stock, date), so re-running is safe.
+    Ranges are split into chunks of days processed in parallel.
+
+    Usage:
+        python manage.py update_closing_prices                     # today
+        python manage.py update_closing_prices --date 2025-01-15
+        python manage.py update_closing_prices --start 2024-07-01 --end 2025-06-30 --workers 4
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Single day (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--start', help='First day of a backfill range (YYYY-MM-DD).')
+        parser.add_argument('--end', help='Last day of a backfill range (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days per chunk (default 7).')
+        parser.add_argument('--workers', type=int, default=1, help='Chunks processed in parallel (default 1).')
 
     def handle(self, *args, **options):
-        # Get max price per stock from trades of the current day
-        today = date.today()
-        closing_prices = Trade.objects.filter(trade_time__date=today).values('stock').annotate(max_price=Max('price'))
-        
-        for cp in closing_prices:
-            stock_id = cp['stock']
-            max_price = cp['max_price']
-            stock = Stocks.objects.get(id=stock_id)
-
-            DailyClosingPrice.objects.create(
-                stock=stock,
-                date=today,
-                closing_price=max_price
-            )
-
-        self.stdout.write(self.style.SUCCESS('Daily closing prices updated successfully!'))
+        if options['date'] and (options['start'] or options['end']):
+            raise CommandError("Use either --date or --start/--end, not both.")
+        if options['chunk_days'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-days and --workers must be at least 1.")
+
+        if options['start'] or options['end']:
+            first_day = self._parse_day(options['start'], '--start') if options['start'] else None
+            last_day = self._parse_day(options['end'], '--end') if options['end'] else localdate()
+            if first_day is None:
+                raise CommandError("--start is required with --end.")
+            if first_day > last_day:
+                raise CommandError("--start must not be after --end.")
+        else:
+            first_day = last_day = self._parse_day(options['date'], '--date') if options['date'] else localdate()
+
+        chunks = []
+        chunk_start = first_day
+        while chunk_start <= last_day:
+            chunk_end = min(chunk_start + datetime.timedelta(days=options['chunk_days'] - 1), last_day)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+
+        started = time.monotonic()
+        if options['workers'] == 1 or len(chunks) == 1:
+            written = sum(write_closing_prices(*chunk) for chunk in chunks)
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                written = sum(executor.map(_write_chunk_in_thread, chunks))
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Daily closing prices updated successfully: {written} rows for {first_day} to {last_day} "
+            f"in {len(chunks)} chunk(s), {elapsed:.2f}s."
+        ))
+
+    @staticmethod
+    def _parse_day(value, option):
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"{option} must be in YYYY-MM-DD format.")
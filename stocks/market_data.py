@@ -0,0 +1,265 @@
+# stocks/market_data.py
+
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Sum
+
+from .order_book import OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+def market_group(stock_id):
+    """Channel-layer group of a stock's market data subscribers."""
+    return f"market_{stock_id}"
+
+
+def _price(value):
+    # Prices are stored with two decimals, but in-memory orders may not be quantized yet
+    return f"{value:.2f}" if value is not None else None
+
+
+def _changed_levels(before, after, best_first_descending):
+    """Levels of `after` that differ from `before`, plus removed ones at quantity 0, best first."""
+    before = {level['price']: level for level in before}
+    after = {level['price']: level for level in after}
+    changed = [level for price, level in after.items() if before.get(price) != level]
+    changed += [{'price': price, 'quantity': 0, 'orders': 0} for price in before.keys() - after.keys()]
+    return sorted(changed, key=lambda level: Decimal(level['price']), reverse=best_first_descending)
+
+
+class MarketDataPublisher:
+    """
+    Pushes trade prints, best bid/ask and candle updates to the per-stock
+    groups MarketDataConsumer subscribers join.
+
+    Publishing never touches the channel layer directly: each update only
+    replaces the pending value for its (stock, kind) key, latest value wins
+    (trade prints add up their quantity and count instead), and a background
+    thread sends whatever is pending once per MARKET_DATA['interval_seconds'].
+    A stock that trades a thousand times in an interval costs its
+    subscribers one trade, one quote and one message per candle resolution,
+    however slow they are. Matching calls the publish_* methods after commit.
+
+    Book depth (the top MARKET_DATA['depth_levels'] price levels per side)
+    goes out as sequenced deltas instead. A book change only marks its stock;
+    at the next push the depth is aggregated from the open orders in the DB
+    and diffed against the stock's BookDepth row, the depth last sent. The
+    changed levels are sent (a quantity of 0 meaning the level is gone) and
+    the row advanced to the next sequence number under a row lock, so every
+    process publishing a stock adds to the same sequence, in order.
+    depth_snapshot() only reads the row: a client applies the deltas
+    numbered after its seq and re-fetches the snapshot on a gap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (stock_id, kind) -> message
+        self._pending_depth = {}  # stock_id -> ticker whose depth may have changed
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _config():
+        config = getattr(settings, 'MARKET_DATA', {})
+        return config.get('enabled', True), config.get('interval_seconds', 0.25)
+
+    @staticmethod
+    def depth_levels():
+        return getattr(settings, 'MARKET_DATA', {}).get('depth_levels', 10)
+
+    # ------------------ Publishing -------------------
+    def publish_fills(self, fills, candles=()):
+        """Trade prints of settled fills (in execution order) and the candles they updated."""
+        tickers = {}
+        for fill in fills:
+            stock = fill.buy_order.stock
+            tickers[stock.id] = stock.ticker_symbol
+            self._put(stock.id, 'trade', {
+                'type': 'trade',
+                'ticker': stock.ticker_symbol,
+                'price': _price(fill.price),
+                'quantity': fill.quantity,
+                'trades': 1,
+                'time': fill.trade_buyer.trade_time.isoformat(),
+            })
+        for candle in candles:
+            self._put(candle.stock_id, f'candle:{candle.resolution}', {
+                'type': 'candle',
+                'ticker': tickers.get(candle.stock_id),
+                'resolution': candle.resolution,
+                'start': candle.start.isoformat(),
+                'open': _price(candle.open),
+                'high': _price(candle.high),
+                'low': _price(candle.low),
+                'close': _price(candle.close),
+                'volume': candle.volume,
+                'trade_count': candle.trade_count,
+            })
+
+    def publish_book(self, stock_id, ticker, quote=None):
+        """
+        Marks the stock's depth to be re-read at the next push, and publishes
+        its best bid/ask when given (as returned by OrderBook.quote()).
+        """
+        if quote is not None:
+            self.publish_quote(stock_id, ticker, quote)
+        enabled, _ = self._config()
+        if not enabled:
+            return
+        with self._lock:
+            self._pending_depth[stock_id] = ticker
+            self._ensure_started()
+        self._wakeup.set()
+
+    def publish_quote(self, stock_id, ticker, quote):
+        """Best bid/ask as returned by OrderBook.quote()."""
+        bid, bid_size, ask, ask_size = quote
+        self._put(stock_id, 'quote', {
+            'type': 'quote',
+            'ticker': ticker,
+            'bid': _price(bid),
+            'bid_size': bid_size,
+            'ask': _price(ask),
+            'ask_size': ask_size,
+        })
+
+    def _put(self, stock_id, kind, message):
+        enabled, _ = self._config()
+        if not enabled:
+            return
+        key = (stock_id, kind)
+        with self._lock:
+            previous = self._pending.get(key)
+            if kind == 'trade' and previous is not None:
+                # The print carries the last price, and the volume and count since the last push
+                message['quantity'] += previous['quantity']
+                message['trades'] += previous['trades']
+            self._pending[key] = message
+            self._ensure_started()
+        self._wakeup.set()
+
+    # ------------------ Sending -------------------
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='market-data-publisher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            _, interval = self._config()
+            time.sleep(interval)  # Let the interval's updates coalesce
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+    def flush(self):
+        """Send everything pending now; returns the number of messages sent."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            pending_depth, self._pending_depth = self._pending_depth, {}
+        if not pending and not pending_depth:
+            return 0
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return 0
+        sent = 0
+        for (stock_id, _), message in pending.items():
+            try:
+                self._send(channel_layer, stock_id, message)
+                sent += 1
+            except Exception as e:
+                logger.warning(f"Market data push for stock {stock_id} failed: {e}")
+        for stock_id, ticker in pending_depth.items():
+            try:
+                sent += self._advance_depth(stock_id, ticker, channel_layer)
+            except Exception as e:
+                logger.warning(f"Depth push for stock {stock_id} failed, retrying with the next push: {e}")
+                with self._lock:
+                    self._pending_depth.setdefault(stock_id, ticker)
+        return sent
+
+    @staticmethod
+    def _send(channel_layer, stock_id, message):
+        async_to_sync(channel_layer.group_send)(market_group(stock_id), {'type': 'market.data', 'message': message})
+
+    # ------------------ Depth -------------------
+    def _read_depth(self, stock_id):
+        """Top price levels per side aggregated from the stock's open Limit orders, best first."""
+        from .models import Orders  # Inline import to avoid circular dependency
+
+        def side(action, ordering):
+            rows = (
+                Orders.objects.filter(
+                    stock_id=stock_id, action=action, status__in=OPEN_STATUSES, quantity__gt=0, price__isnull=False
+                )
+                .values('price')
+                .annotate(total=Sum('quantity'), orders=Count('id'))
+                .order_by(ordering)[:self.depth_levels()]
+            )
+            return [{'price': _price(row['price']), 'quantity': row['total'], 'orders': row['orders']} for row in rows]
+
+        return side('Buy', '-price'), side('Sell', 'price')
+
+    def _advance_depth(self, stock_id, ticker, channel_layer):
+        """
+        Bring the stock's BookDepth row up to the current depth. When it
+        changed, the row moves to the next sequence number and the delta is
+        sent while the row is still locked, so deltas leave in sequence order
+        whichever process sends them. Returns the number of messages sent.
+        """
+        from .models import BookDepth  # Inline import to avoid circular dependency
+
+        current = self._read_depth(stock_id)
+        depth = BookDepth.objects.filter(stock_id=stock_id).first()
+        if depth is not None and (depth.bids, depth.asks) == current:
+            return 0
+        with transaction.atomic():
+            depth, _ = BookDepth.objects.select_for_update().get_or_create(stock_id=stock_id)
+            current = self._read_depth(stock_id)  # Again, now that publishers are serialized
+            if (depth.bids, depth.asks) == current:
+                return 0
+            delta = {
+                'type': 'depth',
+                'ticker': ticker,
+                'seq': depth.seq + 1,
+                'bids': _changed_levels(depth.bids, current[0], best_first_descending=True),
+                'asks': _changed_levels(depth.asks, current[1], best_first_descending=False),
+            }
+            depth.seq += 1
+            depth.bids, depth.asks = current
+            depth.save()
+            self._send(channel_layer, stock_id, delta)
+            return 1
+
+    def depth_snapshot(self, stock_id, ticker, levels=None):
+        """
+        Depth of a stock as of the last delta pushed, best levels first, with
+        that delta's sequence number; later changes arrive as the next delta.
+        Read-only: a stock whose depth was never pushed is served empty at
+        seq 0 and marked for the next push. With market data disabled there
+        is no stream to follow, so the current depth is read instead.
+        """
+        from .models import BookDepth  # Inline import to avoid circular dependency
+
+        enabled, _ = self._config()
+        depth = BookDepth.objects.filter(stock_id=stock_id).values_list('seq', 'bids', 'asks').first()
+        if not enabled:
+            bids, asks = self._read_depth(stock_id)
+            return {'seq': depth[0] if depth else 0, 'bids': bids[:levels], 'asks': asks[:levels]}
+        if depth is None:
+            self.publish_book(stock_id, ticker)
+            return {'seq': 0, 'bids': [], 'asks': []}
+        seq, bids, asks = depth
+        return {'seq': seq, 'bids': bids[:levels], 'asks': asks[:levels]}
+
+
+market_data = MarketDataPublisher()
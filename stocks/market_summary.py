@@ -0,0 +1,224 @@
+# stocks/market_summary.py
+
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+TOP_LIMIT = 5
+
+
+def _top_selling_stocks(limit=TOP_LIMIT):
+    from stocks.models import Stocks, Trade  # Inline import to avoid circular dependency
+
+    sold = list(
+        Trade.objects.filter(order__action='Sell')
+        .values('stock_id')
+        .annotate(total_sold=Sum('quantity'))
+        .order_by('-total_sold')[:limit]
+    )
+    stocks = Stocks.objects.select_related('company').in_bulk([row['stock_id'] for row in sold])
+    return [
+        {
+            "ticker_symbol": stocks[row['stock_id']].ticker_symbol,
+            "company_name": stocks[row['stock_id']].company.company_name,
+            "total_sold": row['total_sold'] or 0,
+        }
+        for row in sold if row['stock_id'] in stocks
+    ]
+
+
+def _highest_dividend_paid_stocks(limit=TOP_LIMIT):
+    from stocks.models import Dividend  # Inline import to avoid circular dependency
+
+    return [
+        {
+            "company_name": company_name,
+            "budget_year": budget_year,
+            "total_dividend_amount_etb": str(amount),
+        }
+        for company_name, budget_year, amount in (
+            Dividend.objects.order_by('-total_dividend_amount')
+            .values_list('company__company_name', 'budget_year', 'total_dividend_amount')[:limit]
+        )
+    ]
+
+
+def _highest_dividend_ratio_companies(limit=TOP_LIMIT):
+    """
+    Example: Dividend ratio = SUM of dividends / SUM of total_shares.
+    Adjust as needed for your real business logic.
+    """
+    from stocks.models import ListedCompany  # Inline import to avoid circular dependency
+
+    companies = (
+        ListedCompany.objects
+        .annotate(
+            total_dividend=Sum('dividends__total_dividend_amount'),
+            total_shares_published=Sum('stocks__total_shares'),
+            dividend_ratio=ExpressionWrapper(
+                Sum('dividends__total_dividend_amount') / Sum('stocks__total_shares'),
+                output_field=FloatField()
+            )
+        )
+        .filter(
+            total_dividend__isnull=False,
+            total_shares_published__gt=0
+        )
+        .order_by('-dividend_ratio')[:limit]
+    )
+    return [
+        {
+            "company_name": company.company_name,
+            "dividend_ratio": round(company.dividend_ratio, 2) if company.dividend_ratio else 0.00,
+            "total_dividend_amount_etb": str(company.total_dividend or Decimal('0.00')),
+        }
+        for company in companies
+    ]
+
+
+def highest_profit_traders(limit=TOP_LIMIT):
+    """Top users by 'profit_balance'."""
+    return [
+        {"username": username, "profit_balance_etb": str(profit_balance)}
+        for username, profit_balance in (
+            User.objects.exclude(profit_balance=None)
+            .order_by('-profit_balance')
+            .values_list('username', 'profit_balance')[:limit]
+        )
+    ]
+
+
+def _company_sales():
+    """Total shares sold and average selling price per company, keyed by company id."""
+    from stocks.models import Trade  # Inline import to avoid circular dependency
+
+    rows = (
+        Trade.objects.filter(order__action='Sell')
+        .values('stock__company_id')
+        .annotate(total_sold=Sum('quantity'), total_price_qty=Sum(F('quantity') * F('price')))
+    )
+    sales = {}
+    for row in rows:
+        total_sold = row['total_sold'] or 0
+        avg_price = "0.00"
+        if total_sold > 0:
+            avg_price = str((Decimal(row['total_price_qty']) / Decimal(total_sold)).quantize(Decimal('0.01')))
+        sales[str(row['stock__company_id'])] = {"total_sold": total_sold, "avg_selling_price_etb": avg_price}
+    return sales
+
+
+def build_documents():
+    """The dashboard documents for every audience, keyed like MarketSummary.key."""
+    from stocks.models import ListedCompany, Orders, Stocks, Trade  # Inline import to avoid circular dependency
+
+    top_traders = highest_profit_traders()
+    common_data = {
+        "top_selling_stocks": _top_selling_stocks(),
+        "highest_dividend_paid_stocks": _highest_dividend_paid_stocks(),
+        "highest_dividend_ratio_companies": _highest_dividend_ratio_companies(),
+        "total_companies": ListedCompany.objects.count(),
+        "total_stocks": Stocks.objects.count(),
+        "highest_profit_traders": top_traders,
+    }
+    total_fees = Trade.objects.aggregate(sum_fees=Sum('transaction_fee'))['sum_fees'] or Decimal('0.00')
+
+    return {
+        'default': {"common_data": common_data},
+        'company_admin': {"common_data": common_data, "company_sales": _company_sales()},
+        'regulator': {
+            "common_data": {**common_data, "total_transaction_fees_etb": str(total_fees)},
+            "regulator_data": {
+                "total_users": User.objects.count(),
+                "total_orders": Orders.objects.count(),
+                "total_trades": Trade.objects.count(),
+                "highest_profit_traders": top_traders,
+            },
+        },
+    }
+
+
+class MarketSummaryStore:
+    """
+    Keeps the extended dashboard's market-wide sections precomputed in
+    MarketSummary rows.
+
+    Trade settlement and dividend/company/stock changes call mark_dirty()
+    after commit; the refresh then runs on a timer `refresh_delay_seconds`
+    later, so a burst of trades costs one recomputation. A reader finds the
+    document rebuilt inline only if it is missing or older than
+    `max_age_seconds` (which also covers writes made by other processes);
+    `python manage.py refresh_market_summary` refreshes it on a schedule.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+
+    @staticmethod
+    def _config():
+        config = getattr(settings, 'MARKET_SUMMARY', {})
+        return config.get('refresh_delay_seconds', 2.0), config.get('max_age_seconds', 60)
+
+    def get(self, role):
+        """The precomputed document for this role, refreshed first if missing or too old."""
+        from stocks.models_summary import MarketSummary  # Inline import to avoid circular dependency
+
+        key = role if role in ('company_admin', 'regulator') else 'default'
+        _, max_age = self._config()
+        row = MarketSummary.objects.filter(key=key).values_list('document', 'computed_at').first()
+        if row is None or row[1] < timezone.now() - timedelta(seconds=max_age):
+            return self.refresh()[key]
+        return row[0]
+
+    def refresh(self):
+        from stocks.models_summary import MarketSummary  # Inline import to avoid circular dependency
+
+        with self._lock:
+            self._dirty = False
+        documents = build_documents()
+        computed_at = timezone.now()
+        with transaction.atomic():
+            for key, document in documents.items():
+                MarketSummary.objects.update_or_create(
+                    key=key, defaults={'document': document, 'computed_at': computed_at}
+                )
+        logger.debug(f"Market summary refreshed at {computed_at}.")
+        return documents
+
+    def mark_dirty(self):
+        delay, _ = self._config()
+        with self._lock:
+            self._dirty = True
+            if delay is None or self._timer is not None:
+                return
+            self._timer = threading.Timer(delay, self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Market summary refresh failed: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._timer = None
+                dirty = self._dirty
+            if dirty:
+                # Changes arrived while refreshing
+                self.mark_dirty()
+
+
+market_summary = MarketSummaryStore()
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0019_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveillanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_trade_id', models.BigIntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('trade_count', models.BigIntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('notional', models.DecimalField(decimal_places=2, default=0, max_digits=28)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='surveillance_checkpoint', to='stocks.stocks')),
+            ],
+        ),
+    ]
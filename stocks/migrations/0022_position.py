@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:29
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0021_dailytradingcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Position',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('cost_basis', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('realized_pnl', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='stocks.stocks')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stock', 'quantity'], name='position_stock_qty_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'stock'), name='unique_user_stock_position')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0022_position'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DividendJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_price', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Queued', max_length=10)),
+                ('phase', models.CharField(blank=True, max_length=20)),
+                ('total_holdings', models.IntegerField(default=0)),
+                ('processed_holdings', models.IntegerField(default=0)),
+                ('credited_users', models.IntegerField(default=0)),
+                ('sum_weighted_value', models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dividend_jobs', to=settings.AUTH_USER_MODEL)),
+                ('dividend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='stocks.dividend')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dividend_jobs', to='stocks.stocks')),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0023_dividendjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarketSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=30, unique=True)),
+                ('document', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:37
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0024_marketsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=30, unique=True)),
+                ('compacted_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('action', models.CharField(blank=True, default='', max_length=4)),
+                ('trade_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('fees', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=24)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=24)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['trade_time'], name='stocks_trad_trade_t_f2f53f_idx'),
+        ),
+        migrations.AddField(
+            model_name='traderollup',
+            name='stock',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trade_rollups', to='stocks.stocks'),
+        ),
+        migrations.AddIndex(
+            model_name='traderollup',
+            index=models.Index(fields=['granularity', 'bucket_start'], name='rollup_granularity_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='traderollup',
+            constraint=models.UniqueConstraint(fields=('granularity', 'stock', 'bucket_start', 'action'), name='unique_trade_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0025_traderollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('trade_count', models.PositiveIntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='stocks.stocks')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'resolution', 'start'), name='unique_candle')],
+            },
+        ),
+    ]
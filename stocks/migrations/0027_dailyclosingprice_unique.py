@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:41
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_closes(apps, schema_editor):
+    """Keep only the most recently written row of each (stock, date)."""
+    DailyClosingPrice = apps.get_model('stocks', 'DailyClosingPrice')
+    duplicates = (
+        DailyClosingPrice.objects.values('stock_id', 'date')
+        .annotate(rows=Count('id'), keep_id=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        DailyClosingPrice.objects.filter(stock_id=row['stock_id'], date=row['date']).exclude(
+            id=row['keep_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0026_candle'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyclosingprice',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.RunPython(remove_duplicate_closes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyclosingprice',
+            constraint=models.UniqueConstraint(fields=('stock', 'date'), name='unique_daily_closing_price'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0027_dailyclosingprice_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionaudittrail',
+            name='event_type',
+            field=models.CharField(choices=[('OrderCreated', 'Order Created'), ('TradeExecuted', 'Trade Executed'), ('TransactionFeeDeducted', 'Transaction Fee Deducted'), ('Direct Purchase', 'Direct Purchase'), ('OrderStatusChanged', 'Order Status Changed')], max_length=50),
+        ),
+    ]
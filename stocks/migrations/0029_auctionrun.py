@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0028_audit_order_status_changed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuctionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_date', models.DateField()),
+                ('kind', models.CharField(choices=[('open', 'Opening'), ('close', 'Closing')], max_length=5)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('volume', models.IntegerField(default=0)),
+                ('imbalance', models.IntegerField(default=0)),
+                ('fill_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auction_runs', to='stocks.stocks')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'session_date', 'kind'), name='unique_auction_run')],
+            },
+        ),
+    ]
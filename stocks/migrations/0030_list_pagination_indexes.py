@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0029_auctionrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dividenddistribution',
+            index=models.Index(fields=['created_at'], name='stocks_divi_created_71e716_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dividenddistribution',
+            index=models.Index(fields=['user', 'created_at'], name='stocks_divi_user_id_4eea74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['user', 'created_at'], name='stocks_orde_user_id_1a51cb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suspiciousactivity',
+            index=models.Index(fields=['flagged_at'], name='stocks_susp_flagged_7c9a76_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['user', 'trade_time'], name='stocks_trad_user_id_d8453e_idx'),
+        ),
+    ]
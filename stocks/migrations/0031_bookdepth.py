@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0030_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookDepth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(default=0)),
+                ('bids', models.JSONField(default=list)),
+                ('asks', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('stock', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='book_depth', to='stocks.stocks')),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def backfill_positions(apps, schema_editor):
+    """
+    Rebuild Position rows by replaying the trade history, as
+    `check_positions --fix` does, so sell checks see holdings that predate
+    the Position table. The average-cost arithmetic is Position.apply_fill's,
+    frozen here since historical models have no custom methods.
+    """
+    Position = apps.get_model('stocks', 'Position')
+    Trade = apps.get_model('stocks', 'Trade')
+
+    positions = {}
+    trades = (
+        Trade.objects.filter(order__isnull=False)
+        .order_by('trade_time', 'id')
+        .values_list('user_id', 'stock_id', 'order__action', 'quantity', 'price')
+    )
+    for user_id, stock_id, action, quantity, price in trades.iterator(chunk_size=5000):
+        position = positions.get((user_id, stock_id))
+        if position is None:
+            position = positions[(user_id, stock_id)] = Position(user_id=user_id, stock_id=stock_id)
+        quantity = int(quantity)
+        price = Decimal(price)
+        if action == 'Buy':
+            position.quantity += quantity
+            position.cost_basis += quantity * price
+            continue
+        if position.quantity > 0:
+            sold_cost = (
+                position.cost_basis * min(quantity, position.quantity) / position.quantity
+            ).quantize(Decimal('0.01'))
+        else:
+            sold_cost = Decimal('0.00')
+        position.realized_pnl += quantity * price - sold_cost
+        position.cost_basis -= sold_cost
+        position.quantity -= quantity
+        if position.quantity <= 0:
+            position.cost_basis = Decimal('0.00')
+
+    Position.objects.all().delete()
+    Position.objects.bulk_create(positions.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0031_bookdepth'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.utils.timezone import localdate
+
+
+def backfill_todays_counters(apps, schema_editor):
+    """
+    Rebuild today's DailyTradingCounter rows from Orders and Trade, as
+    `rebuild_trading_counters` does, so the daily limits count the orders
+    and trades placed before the counters were deployed. Earlier days are
+    never read by the limits.
+    """
+    DailyTradingCounter = apps.get_model('stocks', 'DailyTradingCounter')
+    Orders = apps.get_model('stocks', 'Orders')
+    Trade = apps.get_model('stocks', 'Trade')
+    today = localdate()
+
+    totals = defaultdict(lambda: [0, Decimal('0.00')])
+    order_counts = (
+        Orders.objects.filter(created_at__date=today)
+        .values_list('user_id')
+        .annotate(order_count=Count('id'))
+    )
+    for user_id, order_count in order_counts:
+        totals[user_id][0] = order_count
+    traded_amounts = (
+        Trade.objects.filter(trade_time__date=today)
+        .values_list('user_id')
+        .annotate(traded_amount=Sum(ExpressionWrapper(
+            F('quantity') * F('price'), output_field=DecimalField(max_digits=20, decimal_places=2)
+        )))
+    )
+    for user_id, traded_amount in traded_amounts:
+        totals[user_id][1] = traded_amount or Decimal('0.00')
+
+    DailyTradingCounter.objects.filter(date=today).delete()
+    DailyTradingCounter.objects.bulk_create(
+        [
+            DailyTradingCounter(user_id=user_id, date=today, order_count=count, traded_amount=amount)
+            for user_id, (count, amount) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0032_backfill_positions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_todays_counters, migrations.RunPython.noop),
+    ]
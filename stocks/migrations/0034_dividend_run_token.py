@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0033_backfill_trading_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dividenddetailedholding',
+            name='run_token',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='dividendjob',
+            name='run_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
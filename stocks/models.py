@@ -5,10 +5,8 @@ from django.utils.timezone import localtime, localdate
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import ValidationError
 import logging
-from django.db.models import Sum, F
 
 # Adjust these imports based on your project structure
-from ethio_stock_simulation.utils import send_order_notification
 from regulations.models import StockSuspension
 from regulations.utils import get_regulation_value
 from asgiref.sync import async_to_sync
@@ -17,8 +15,20 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.core.mail import send_mail
 from stocks.models_audit import TransactionAuditTrail
+from stocks.models_auction import AuctionRun
+from stocks.models_candles import Candle
+from stocks.models_depth import BookDepth
+from stocks.models_counters import DailyTradingCounter
+from stocks.models_positions import Position
+from stocks.models_rollups import RollupWatermark, TradeRollup
+from stocks.models_outbox import NotificationOutbox
+from stocks.models_summary import MarketSummary
 from stocks.utils import is_within_working_hours
-from .surveillance import detect_suspicious_trade
+from .auction import call_auction, uncrossing_price
+from .market_data import market_data
+from .order_book import OPEN_STATUSES, order_books
+from .settlement import SettlementBatch
+from .surveillance import surveillance_engine
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -205,6 +215,7 @@ class Orders(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['stock', 'action', 'price', 'status']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at']),
         ]
 
     def __str__(self):
@@ -213,9 +224,12 @@ class Orders(models.Model):
     def save(self, *args, **kwargs):
         """
         If direct_purchase=True, skip matching logic.
+        If defer_matching=True, hand the order to the matching sequencer once
+        the insert commits instead of matching inside the caller's request.
         Otherwise, handle normal validations and possibly match_and_execute_orders.
         """
         direct_purchase = kwargs.pop('direct_purchase', False)
+        defer_matching = kwargs.pop('defer_matching', False)
         is_new = self._state.adding
 
         if is_new:
@@ -225,6 +239,17 @@ class Orders(models.Model):
         # Save the order to DB
         super().save(*args, **kwargs)
 
+        if is_new:
+            DailyTradingCounter.record_order(self.user_id, localdate(self.created_at))
+
+        if not is_new:
+            # Keep a resident order book in line with cancellations/edits
+            book = order_books.peek(self.stock_id)
+            if book is not None:
+                book.sync_order(self)
+            # Depth is read from the DB, so it may have moved whether or not a book is resident here
+            Orders._publish_book(self.stock_id, self.stock_symbol, book)
+
         if is_new:
             if direct_purchase:
                 # Bypass all matching logic
@@ -242,7 +267,19 @@ class Orders(models.Model):
                     )
                 )
                 # Execute matching
-                Orders.match_and_execute_orders(self)
+                if defer_matching:
+                    from stocks.sequencer import matching_sequencer  # Inline import to avoid circular dependency
+                    transaction.on_commit(
+                        lambda: matching_sequencer.submit(self.id, self.stock_id)
+                    )
+                else:
+                    Orders.match_and_execute_orders(self)
+
+    def delete(self, *args, **kwargs):
+        book = order_books.peek(self.stock_id)
+        if book is not None:
+            book.remove(self.id)
+        return super().delete(*args, **kwargs)
 
     def _perform_basic_checks(self, direct_purchase=False):
         """
@@ -260,15 +297,17 @@ class Orders(models.Model):
         # 2. Working hours (only for normal orders)
         if not direct_purchase:
             current_time = localtime()
-            if not is_within_working_hours(current_time):
+            if not is_within_working_hours(current_time) and not call_auction.is_collecting(current_time):
                 raise ValidationError("Orders can only be created during working hours.")
 
         # 3. Daily trade (count) limit
+        # Today's order count and traded amount come from the user's
+        # DailyTradingCounter row, read at most once per order.
         daily_trade_limit = get_regulation_value("Daily Trade Limit")
+        daily_trade_amount_limit = get_regulation_value("Daily Trade Amount Limit")
+        if daily_trade_limit or daily_trade_amount_limit:
+            user_trades_today, user_trades_today_amount = DailyTradingCounter.for_day(self.user_id, localdate())
         if daily_trade_limit:
-            user_trades_today = Orders.objects.filter(
-                user=self.user, created_at__date=localdate()
-            ).count()
             if user_trades_today >= int(daily_trade_limit):
                 raise ValidationError("Daily trade limit reached.")
 
@@ -276,29 +315,12 @@ class Orders(models.Model):
         # 3.1. Daily trade AMOUNT limit
         # -----------------------------
         # Suppose you store the numeric limit in the regulation as a string or decimal.
-        daily_trade_amount_limit = get_regulation_value("Daily Trade Amount Limit")
         if daily_trade_amount_limit:
             # Convert string to Decimal if needed
             daily_trade_amount_limit = Decimal(daily_trade_amount_limit)
 
-            # Sum up the user's total traded amount for the current day.
-            # Here, we consider *all* trades or just *buy* trades, depending on your rule.
-            # Example 1: Summing *all* trades (buy + sell).
-            user_trades_today_amount = Trade.objects.filter(
-                user=self.user,
-                trade_time__date=localdate()  # trades made today
-            ).aggregate(
-                total_amount=Sum(F('quantity') * F('price'))
-            )['total_amount'] or Decimal('0.00')
-
-            # OR Example 2: Summing *only buy* trades
-            # user_trades_today_amount = Trade.objects.filter(
-            #     user=self.user,
-            #     order__action='Buy',  # only Buy side
-            #     trade_time__date=localdate()
-            # ).aggregate(
-            #     total_amount=Sum(F('quantity') * F('price'))
-            # )['total_amount'] or Decimal('0.00')
+            # The user's total traded amount for the current day counts *all*
+            # trades (buy + sell), as maintained in DailyTradingCounter.
 
             # We'll calculate the cost of this new order:
             # For a Buy order:
@@ -359,44 +381,300 @@ class Orders(models.Model):
 
         # 6. Validate Sell Orders
         if self.action == 'Sell':
-            owned_quantity = Trade.objects.filter(
+            owned_quantity = Position.objects.filter(
                 user=self.user,
                 stock=self.stock,
-            ).aggregate(total_quantity=models.Sum('quantity'))['total_quantity'] or 0
+            ).values_list('quantity', flat=True).first() or 0
             if owned_quantity < self.quantity:
                 raise ValidationError("You do not own enough stock to place this sell order.")
 
     @classmethod
-    def match_and_execute_orders(cls, new_order):
-        """Entry point to match buy/sell orders based on type & price-time priority."""
-        with transaction.atomic():
-            if new_order.action == 'Buy':
-                cls._handle_buy_order(new_order)
-            else:  # Sell
-                cls._handle_sell_order(new_order)
+    def match_and_execute_orders(cls, new_order, refresh=False):
+        """
+        Entry point to match buy/sell orders based on type & price-time priority.
+
+        Counterparties are picked from the stock's in-memory order book, so the
+        DB only sees point lookups of the chosen resting orders and the writes
+        produced by the fills. Whatever is left of the new order rests in the book.
+        With refresh=True (orders that waited in a queue), the order row is
+        re-read under a lock once the stock is locked, and left alone if it
+        was closed in the meantime.
+        """
+        if call_auction.is_collecting():
+            # Pre-open/pre-close: the order waits for the call auction
+            logger.debug(f"Order ID={new_order.id} collected for the call auction.")
+            return
+
+        book = order_books.get(new_order.stock_id)
+        with book.lock:
+            try:
+                with transaction.atomic():
+                    # Serialize matching per stock across processes, and make sure
+                    # company fills see the current available_shares
+                    new_order.stock = Stocks.objects.select_for_update().select_related('company').get(
+                        id=new_order.stock_id
+                    )
+                    book.sync_new_orders(exclude_id=new_order.id)
+                    if refresh:
+                        row = cls.objects.select_for_update().get(id=new_order.id)
+                        for field in ('status', 'quantity', 'price', 'order_type', 'action', 'transaction_fee'):
+                            setattr(new_order, field, getattr(row, field))
+                        if new_order.status not in OPEN_STATUSES or new_order.quantity <= 0:
+                            logger.debug(f"Order ID={new_order.id} was closed before it was matched.")
+                            return
+                    due = call_auction.due_auction(new_order.stock_id)
+                    if due:
+                        # First continuous match since the open: uncross what was
+                        # collected, then match the new order against the result
+                        book.remove(new_order.id)
+                        cls._uncross(new_order.stock, book, *due)
+                    batch = SettlementBatch()
+                    if new_order.action == 'Buy':
+                        cls._handle_buy_order(new_order, book, batch)
+                    else:  # Sell
+                        cls._handle_sell_order(new_order, book, batch)
+                    batch.flush()
+                    book.add(new_order)
+                    cls._publish_book(new_order.stock_id, new_order.stock.ticker_symbol, book)
+            except Exception:
+                # The book (and surveillance state) may now disagree with the
+                # rolled back rows; rebuild them on next use
+                order_books.invalidate(new_order.stock_id)
+                surveillance_engine.invalidate(new_order.stock_id)
+                raise
 
     @classmethod
-    def _handle_buy_order(cls, buy_order):
-        """Process Market/Limit Buy: partial fill from pending/partially completed Sell orders, then match remaining with company."""
-        stock = buy_order.stock
+    def recross_book(cls, stock_id):
+        """
+        Batch recross of one stock: replays every open order through the
+        matching rules in time priority, as if they had arrived one by one into
+        an empty book, so any orders left crossed (e.g. queued while matching
+        was paused) trade at the prices continuous matching would have given.
+
+        The open rows are loaded once and matched in memory; all fills are
+        settled with a single SettlementBatch in one transaction, under the
+        same stock lock continuous matching takes. Returns the trades created.
+        """
+        if call_auction.is_collecting():
+            return []
+
+        book = order_books.get(stock_id)
+        with book.lock:
+            try:
+                with transaction.atomic():
+                    stock = Stocks.objects.select_for_update().select_related('company').get(id=stock_id)
+                    book.sync_new_orders()
+                    due = call_auction.due_auction(stock_id)
+                    if due:
+                        cls._uncross(stock, book, *due)
+                    entries = book.take_all()
+                    rows = cls.objects.select_related('user').in_bulk([entry.order_id for entry in entries])
+                    batch = SettlementBatch()
+                    for entry in entries:
+                        order = rows.get(entry.order_id)
+                        if order is None or order.status not in OPEN_STATUSES or order.quantity <= 0:
+                            continue
+                        order.stock = stock  # One instance, so company sales see each other
+                        if order.action == 'Buy':
+                            cls._handle_buy_order(order, book, batch, cache=rows)
+                        else:
+                            cls._handle_sell_order(order, book, batch, cache=rows)
+                        book.add(order)
+                    cls._publish_book(stock.id, stock.ticker_symbol, book)
+                    return batch.flush()
+            except Exception:
+                order_books.invalidate(stock_id)
+                surveillance_engine.invalidate(stock_id)
+                raise
+
+    @classmethod
+    def run_call_auction(cls, stock_id, kind, session_date):
+        """
+        Call auction of one stock: uncrosses everything collected in its book
+        at a single price (see stocks.auction.uncrossing_price) and settles all
+        executions with one SettlementBatch, under the stock lock continuous
+        matching takes. Runs at most once per stock, session and kind; returns
+        the AuctionRun.
+        """
+        book = order_books.get(stock_id)
+        with book.lock:
+            try:
+                with transaction.atomic():
+                    stock = Stocks.objects.select_for_update().select_related('company').get(id=stock_id)
+                    book.sync_new_orders()
+                    return cls._uncross(stock, book, kind, session_date)
+            except Exception:
+                order_books.invalidate(stock_id)
+                surveillance_engine.invalidate(stock_id)
+                raise
 
-        # 1. Match with existing Sell Orders
-        # -- STATUS CORRECTION: we look for sell orders with status in ['Pending', 'Partially Completed'].
-        if buy_order.order_type == 'Market':
-            # No price limit from buyer side; lowest price first
-            sell_orders = cls.objects.filter(
+    @classmethod
+    def _uncross(cls, stock, book, kind, session_date):
+        """run_call_auction's body; the caller holds the book lock and the stock row lock."""
+        run = AuctionRun.objects.filter(stock=stock, session_date=session_date, kind=kind).first()
+        if run is None:
+            # Price the book from the current rows, not from possibly stale entries
+            entries = list(book.iter_bids()) + list(book.iter_asks())
+            rows = cls.objects.select_related('user').in_bulk([entry.order_id for entry in entries])
+            for entry in entries:
+                row = rows.get(entry.order_id)
+                if row is None:
+                    book.remove(entry.order_id)
+                else:
+                    row.stock = stock
+                    book.sync_order(row)
+
+            def side(entries):
+                return [(None if e.order_type == 'Market' else e.price, e.quantity) for e in entries]
+
+            result = uncrossing_price(side(book.iter_bids()), side(book.iter_asks()), stock.current_price)
+            batch = SettlementBatch()
+            if result is not None:
+                buyers = cls._auction_side(book.iter_bids(), rows, lambda price: price >= result.price)
+                sellers = cls._auction_side(book.iter_asks(), rows, lambda price: price <= result.price)
+                remaining = result.volume
+                buy, sell = next(buyers, None), next(sellers, None)
+                while remaining > 0 and buy is not None and sell is not None:
+                    trade_quantity = min(buy.quantity, sell.quantity, remaining)
+                    batch.add_fill(buy, sell, trade_quantity, result.price)
+                    cls._record_fill_status(buy, trade_quantity, batch)
+                    cls._record_fill_status(sell, trade_quantity, batch)
+                    book.sync_order(buy)
+                    book.sync_order(sell)
+                    remaining -= trade_quantity
+                    if buy.quantity == 0:
+                        buy = next(buyers, None)
+                    if sell.quantity == 0:
+                        sell = next(sellers, None)
+
+            # Buys still open take company shares, as they would have on arrival
+            for buy in cls._auction_side(book.iter_bids(), rows, lambda price: stock.current_price <= price):
+                if stock.available_shares <= 0:
+                    break
+                trade_quantity = min(buy.quantity, stock.available_shares)
+                batch.add_fill(buy, None, trade_quantity, stock.current_price)
+                batch.sell_from_company(stock, trade_quantity)
+                cls._record_fill_status(buy, trade_quantity, batch)
+                book.sync_order(buy)
+
+            fill_count = len(batch.fills)
+            batch.flush()
+            run = AuctionRun.objects.create(
                 stock=stock,
-                action='Sell',
-                status__in=['Pending', 'Partially Completed']
-            ).order_by('price', 'created_at')  # Lowest price first
+                session_date=session_date,
+                kind=kind,
+                price=result.price if result else None,
+                volume=result.volume if result else 0,
+                imbalance=result.imbalance if result else 0,
+                fill_count=fill_count,
+            )
+            logger.info(
+                f"{run.get_kind_display()} auction of {stock.ticker_symbol} on {session_date}: "
+                f"{run.volume} shares at {run.price}, {fill_count} fills."
+            )
+            cls._publish_book(stock.id, stock.ticker_symbol, book)
+        call_auction.mark_completed(stock.id, kind, session_date)
+        return run
+
+    @staticmethod
+    def _publish_book(stock_id, ticker, book):
+        """
+        Mark the stock's depth changed, and push the book's best bid/ask when
+        the book is resident (book is not None), to market data subscribers
+        once the current transaction commits.
+        """
+        quote = book.quote() if book is not None else None
+        transaction.on_commit(lambda: market_data.publish_book(stock_id, ticker, quote))
+
+    @staticmethod
+    def _auction_side(entries, rows, eligible):
+        """
+        Rows of one side of the book that take part in an auction, in
+        priority order: Market orders oldest first, then Limit orders whose
+        price is `eligible`, in book order.
+        """
+        market, limit = [], []
+        for entry in entries:
+            if entry.order_type == 'Market':
+                market.append(entry)
+            elif eligible(entry.price):
+                limit.append(entry)
+        market.sort(key=lambda entry: (entry.created_at, entry.order_id))
+        return iter([rows[entry.order_id] for entry in market + limit])
+
+    @classmethod
+    def _resting_orders(cls, book, entries, taker, cache=None):
+        """
+        Yields resting order rows for the given book entries, in book order,
+        fetching them in as few queries as the taker's remaining quantity allows.
+        Entries whose row is no longer open (e.g. cancelled elsewhere) are dropped.
+        Rows re-priced (or turned around) elsewhere are moved to their new
+        level and only yielded if they still cross the taker.
+        With `cache` ({id: order}, as loaded by recross_book) rows are taken
+        from it instead, so in-memory fills of earlier takers are seen.
+        """
+        entries = iter(entries)
+        while taker.quantity > 0:
+            batch = []
+            planned = 0
+            for entry in entries:
+                batch.append(entry)
+                planned += entry.quantity
+                if planned >= taker.quantity:
+                    break
+            if not batch:
+                return
+
+            if cache is not None:
+                rows = cache
+            else:
+                rows = cls.objects.select_related('user', 'stock').in_bulk([e.order_id for e in batch])
+            for entry in batch:
+                if taker.quantity == 0:
+                    return
+                row = rows.get(entry.order_id)
+                if row is None or row.status not in OPEN_STATUSES or row.quantity <= 0:
+                    logger.debug(f"Dropping stale order {entry.order_id} from the order book.")
+                    book.remove(entry.order_id)
+                    continue
+                if row.price != entry.price or row.action != entry.action:
+                    book.sync_order(row)
+                    if not cls._crosses(row, taker):
+                        logger.debug(f"Order {row.id} was re-priced elsewhere and no longer crosses; skipped.")
+                        continue
+                yield row
+
+    @staticmethod
+    def _crosses(row, taker):
+        """Whether resting order `row` may fill against `taker`, by side and the taker's limit."""
+        if row.action == taker.action:
+            return False
+        if taker.order_type == 'Market':
+            return True
+        if row.price is None:
+            # Resting Market orders only meet Market takers
+            return False
+        return row.price <= taker.price if taker.action == 'Buy' else row.price >= taker.price
+
+    @staticmethod
+    def _record_fill_status(order, trade_quantity, batch):
+        """Apply a fill to an order's remaining quantity/status (written on batch flush)."""
+        order.quantity -= trade_quantity
+        if order.quantity == 0:
+            order.status = 'Fully Completed'
         else:
-            # Limit Buy: price__lte=buy_order.price
-            sell_orders = cls.objects.filter(
-                stock=stock,
-                action='Sell',
-                status__in=['Pending', 'Partially Completed'],
-                price__lte=buy_order.price
-            ).order_by('price', 'created_at')  # Lowest price first
+            order.status = 'Partially Completed'
+        batch.touch(order)
+
+    @classmethod
+    def _handle_buy_order(cls, buy_order, book, batch, cache=None):
+        """Process Market/Limit Buy: partial fill from pending/partially completed Sell orders, then match remaining with company."""
+        stock = buy_order.stock
+
+        # 1. Match with existing Sell Orders, lowest price first.
+        #    Market Buy has no price limit; Limit Buy only takes asks <= buy_order.price
+        limit_price = None if buy_order.order_type == 'Market' else buy_order.price
+        sell_orders = cls._resting_orders(book, book.iter_asks(limit_price), buy_order, cache)
 
         for pending_sell in sell_orders:
             if buy_order.quantity == 0:
@@ -406,84 +684,29 @@ class Orders(models.Model):
             trade_price = pending_sell.price
             trade_quantity = min(buy_order.quantity, pending_sell.quantity)
 
-            trade_buyer, trade_seller = Trade.execute_trade(buy_order, pending_sell, trade_quantity, trade_price)
-
-            # Update quantities
-            buy_order.quantity -= trade_quantity
-            pending_sell.quantity -= trade_quantity
-
-            # Update statuses
-            if pending_sell.quantity == 0:
-                pending_sell.status = 'Fully Completed'
-            else:
-                pending_sell.status = 'Partially Completed'
-            pending_sell.save()
+            batch.add_fill(buy_order, pending_sell, trade_quantity, trade_price)
 
-            if buy_order.quantity == 0:
-                buy_order.status = 'Fully Completed'
-            else:
-                buy_order.status = 'Partially Completed'
-            buy_order.save()
+            # Update quantities & statuses
+            cls._record_fill_status(pending_sell, trade_quantity, batch)
+            cls._record_fill_status(buy_order, trade_quantity, batch)
+            book.sync_order(pending_sell)
 
         # 2. If there's remaining quantity, buy from the company (only if Market or if stock.current_price <= limit)
-        if buy_order.quantity > 0:
-            if buy_order.order_type == 'Market':
-                available_shares = stock.available_shares
-                if available_shares > 0:
-                    trade_quantity = min(buy_order.quantity, available_shares)
-                    trade_price = stock.current_price
-                    trade_buyer, trade_seller = Trade.execute_trade(buy_order, None, trade_quantity, trade_price)
-
-                    stock.available_shares -= trade_quantity
-                    stock.save()
-
-                    buy_order.quantity -= trade_quantity
-                    if buy_order.quantity == 0:
-                        buy_order.status = 'Fully Completed'
-                    else:
-                        buy_order.status = 'Partially Completed'
-                    buy_order.save()
-
-            elif buy_order.order_type == 'Limit':
-                # Buy from the company if company's price <= buy_order.price
-                if stock.current_price <= buy_order.price:
-                    available_shares = stock.available_shares
-                    if available_shares > 0:
-                        trade_quantity = min(buy_order.quantity, available_shares)
-                        trade_price = stock.current_price
-                        trade_buyer, trade_seller = Trade.execute_trade(buy_order, None, trade_quantity, trade_price)
-
-                        stock.available_shares -= trade_quantity
-                        stock.save()
-
-                        buy_order.quantity -= trade_quantity
-                        if buy_order.quantity == 0:
-                            buy_order.status = 'Fully Completed'
-                        else:
-                            buy_order.status = 'Partially Completed'
-                        buy_order.save()
+        if buy_order.quantity > 0 and stock.available_shares > 0:
+            if buy_order.order_type == 'Market' or stock.current_price <= buy_order.price:
+                trade_quantity = min(buy_order.quantity, stock.available_shares)
+                batch.add_fill(buy_order, None, trade_quantity, stock.current_price)
+                batch.sell_from_company(stock, trade_quantity)
+                cls._record_fill_status(buy_order, trade_quantity, batch)
 
     @classmethod
-    def _handle_sell_order(cls, sell_order):
+    def _handle_sell_order(cls, sell_order, book, batch, cache=None):
         """Process Market/Limit Sell: match with highest-price Buy orders; partial fill leftover remains pending."""
         stock = sell_order.stock
 
-        # -- STATUS CORRECTION: we look for buy orders with status in ['Pending', 'Partially Completed'].
-        if sell_order.order_type == 'Market':
-            # Match with Buy orders at highest price first
-            buy_orders = cls.objects.filter(
-                stock=stock,
-                action='Buy',
-                status__in=['Pending', 'Partially Completed']
-            ).order_by('-price', 'created_at')  # Highest price first
-        else:  # Limit
-            # Limit Sell: price__gte=sell_order.price
-            buy_orders = cls.objects.filter(
-                stock=stock,
-                action='Buy',
-                status__in=['Pending', 'Partially Completed'],
-                price__gte=sell_order.price
-            ).order_by('-price', 'created_at')  # Highest price first
+        # Market Sell takes any bid (resting Market buys first); Limit Sell only bids >= sell_order.price
+        limit_price = None if sell_order.order_type == 'Market' else sell_order.price
+        buy_orders = cls._resting_orders(book, book.iter_bids(limit_price), sell_order, cache)
 
         for pending_buy in buy_orders:
             if sell_order.quantity == 0:
@@ -493,24 +716,12 @@ class Orders(models.Model):
             trade_price = pending_buy.price if pending_buy.order_type == 'Limit' else stock.current_price
             trade_quantity = min(sell_order.quantity, pending_buy.quantity)
 
-            trade_buyer, trade_seller = Trade.execute_trade(pending_buy, sell_order, trade_quantity, trade_price)
+            batch.add_fill(pending_buy, sell_order, trade_quantity, trade_price)
 
-            # Update quantities
-            sell_order.quantity -= trade_quantity
-            pending_buy.quantity -= trade_quantity
-
-            # Update statuses
-            if pending_buy.quantity == 0:
-                pending_buy.status = 'Fully Completed'
-            else:
-                pending_buy.status = 'Partially Completed'
-            pending_buy.save()
-
-            if sell_order.quantity == 0:
-                sell_order.status = 'Fully Completed'
-            else:
-                sell_order.status = 'Partially Completed'
-            sell_order.save()
+            # Update quantities & statuses
+            cls._record_fill_status(pending_buy, trade_quantity, batch)
+            cls._record_fill_status(sell_order, trade_quantity, batch)
+            book.sync_order(pending_buy)
 
 
 class Trade(models.Model):
@@ -528,6 +739,12 @@ class Trade(models.Model):
     transaction_fee = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     trade_time = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['trade_time']),
+            models.Index(fields=['user', 'trade_time']),
+        ]
+
     def __str__(self):
         return f"Trade by {self.user.username} on {self.trade_time.strftime('%Y-%m-%d %H:%M:%S')}"
 
@@ -535,187 +752,15 @@ class Trade(models.Model):
     def execute_trade(cls, buy_order, sell_order, quantity, price=None):
         """
         Executes a trade between a buy order and a sell order (or company, if sell_order=None).
-        Updates buyer/seller account balance & portfolio, logs the transaction, and sends notifications.
-        """
-        if price is None:
-            if sell_order:
-                price = sell_order.stock.current_price
-            else:
-                price = buy_order.stock.current_price
-
-        TRANSACTION_FEE_PERCENTAGE = Decimal('0.01')  # 1%
-        total_cost = Decimal(quantity) * Decimal(price)
-        transaction_fee_buyer = (total_cost * TRANSACTION_FEE_PERCENTAGE).quantize(Decimal('0.01'))
-
-        with transaction.atomic():
-            # Buyer side
-            trade_buyer = cls.objects.create(
-                user=buy_order.user,
-                stock=buy_order.stock,
-                order=buy_order,
-                quantity=quantity,
-                price=price,
-                transaction_fee=transaction_fee_buyer
-            )
-            buy_order.user.account_balance -= (total_cost + transaction_fee_buyer)
-            buy_order.user.save()
-
-            buy_order.transaction_fee += transaction_fee_buyer
-            buy_order.save()
-
-            # Identify seller details
-            if sell_order:
-                seller_user = sell_order.user
-                seller_username = seller_user.username
-            else:
-                seller_user = None
-                seller_username = buy_order.stock.company.company_name
-
-            # Buyer Audit Trail
-            TransactionAuditTrail.objects.create(
-                event_type='TradeExecuted',
-                order=buy_order,
-                trade=trade_buyer,
-                details={
-                    'trade_type': 'Buyer',
-                    'buyer_id': buy_order.user.id,
-                    'buyer_username': buy_order.user.username,
-                    'seller_id': seller_user.id if seller_user else None,
-                    'seller_username': seller_username,
-                    'stock_id': buy_order.stock.id,
-                    'stock_symbol': buy_order.stock.ticker_symbol,
-                    'quantity': quantity,
-                    'price_per_share': str(price),
-                    'total_cost': str(total_cost),
-                    'transaction_fee': str(transaction_fee_buyer),
-                    'remaining_quantity': buy_order.quantity if buy_order.status != 'Fully Completed' else 0
-                }
-            )
-
-            trade_seller = None
-            if sell_order:
-                # Seller side
-                transaction_fee_seller = (total_cost * TRANSACTION_FEE_PERCENTAGE).quantize(Decimal('0.01'))
-                trade_seller = cls.objects.create(
-                    user=sell_order.user,
-                    stock=sell_order.stock,
-                    order=sell_order,
-                    quantity=quantity,
-                    price=price,
-                    transaction_fee=transaction_fee_seller
-                )
-                sell_order.user.account_balance += (total_cost - transaction_fee_seller)
-                sell_order.user.save()
-
-                sell_order.transaction_fee += transaction_fee_seller
-                sell_order.save()
-
-                # Seller Audit Trail
-                TransactionAuditTrail.objects.create(
-                    event_type='TradeExecuted',
-                    order=sell_order,
-                    trade=trade_seller,
-                    details={
-                        'trade_type': 'Seller',
-                        'buyer_id': buy_order.user.id,
-                        'buyer_username': buy_order.user.username,
-                        'seller_id': sell_order.user.id,
-                        'seller_username': sell_order.user.username,
-                        'stock_id': sell_order.stock.id,
-                        'stock_symbol': sell_order.stock.ticker_symbol,
-                        'quantity': quantity,
-                        'price_per_share': str(price),
-                        'total_proceeds': str(total_cost),
-                        'transaction_fee': str(transaction_fee_seller),
-                        'remaining_quantity': sell_order.quantity if sell_order.status != 'Fully Completed' else 0
-                    }
-                )
-
-                # Update Seller's Portfolio
-                cls._update_portfolio(
-                    user=sell_order.user,
-                    stock=sell_order.stock,
-                    quantity=quantity,
-                    price=price,
-                    is_buy=False
-                )
-
-                # SuspiciousActivity checks
-                detect_suspicious_trade(trade_buyer)
-                detect_suspicious_trade(trade_seller)
-
-                # Notifications to both buyer & seller
-                send_order_notification(
-                    to_email=buy_order.user.email,
-                    username=buy_order.user.username,
-                    action="Buy",
-                    stock_symbol=buy_order.stock.ticker_symbol,
-                    quantity=quantity,
-                    price=price,
-                    new_balance=buy_order.user.account_balance
-                )
-                send_order_notification(
-                    to_email=sell_order.user.email,
-                    username=sell_order.user.username,
-                    action="Sell",
-                    stock_symbol=sell_order.stock.ticker_symbol,
-                    quantity=quantity,
-                    price=price,
-                    new_balance=sell_order.user.account_balance
-                )
-            else:
-                # Direct purchase from company => only notify buyer
-                send_order_notification(
-                    to_email=buy_order.user.email,
-                    username=buy_order.user.username,
-                    action="Buy",
-                    stock_symbol=buy_order.stock.ticker_symbol,
-                    quantity=quantity,
-                    price=price,
-                    new_balance=buy_order.user.account_balance
-                )
-
-            # Update Buyer's Portfolio
-            cls._update_portfolio(
-                user=buy_order.user,
-                stock=buy_order.stock,
-                quantity=quantity,
-                price=price,
-                is_buy=True
-            )
-
-            # After completing the trade execution, invoke suspicious trade detection
-            detect_suspicious_trade(trade_buyer)
-            if trade_seller:
-                detect_suspicious_trade(trade_seller)
+        Updates buyer/seller account balance & portfolio, logs the transaction, and queues notifications.
 
-            return trade_buyer, trade_seller
-
-    @staticmethod
-    def _update_portfolio(user, stock, quantity, price, is_buy):
+        This settles a single fill; the matching path accumulates all fills of a
+        pass in one SettlementBatch instead (see stocks/settlement.py).
         """
-        Updates the user's portfolio upon trade execution.
-        """
-        quantity = int(quantity)  # Ensure quantity is integer
-        price = Decimal(price)
-
-        with transaction.atomic():
-            portfolio, created = UsersPortfolio.objects.select_for_update().get_or_create(user=user)
-            if is_buy:
-                portfolio.quantity += quantity
-                portfolio.total_investment += quantity * price
-                if portfolio.quantity > 0:
-                    portfolio.average_purchase_price = (portfolio.total_investment / portfolio.quantity).quantize(Decimal('0.01'))
-            else:
-                portfolio.quantity -= quantity
-                # We subtract from total_investment based on the average purchase price,
-                # not the current trade price, to keep consistent cost basis.
-                portfolio.total_investment -= quantity * portfolio.average_purchase_price
-                if portfolio.quantity > 0:
-                    portfolio.average_purchase_price = (portfolio.total_investment / portfolio.quantity).quantize(Decimal('0.01'))
-                else:
-                    portfolio.average_purchase_price = Decimal('0.00')
-            portfolio.save()
+        batch = SettlementBatch()
+        fill = batch.add_fill(buy_order, sell_order, quantity, price)
+        batch.flush()
+        return fill.trade_buyer, fill.trade_seller
 
 
 def notify_user_real_time(user, message):
@@ -753,10 +798,19 @@ class Dividend(models.Model):
 
 
 class DailyClosingPrice(models.Model):
+    """
+    Last trade price of a stock on a day; one row per (stock, date).
+    Written by `python manage.py update_closing_prices`.
+    """
     stock = models.ForeignKey(Stocks, on_delete=models.CASCADE, related_name='daily_closes')
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=localdate)
     closing_price = models.DecimalField(max_digits=15, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'date'], name='unique_daily_closing_price'),
+        ]
+
     def __str__(self):
         return f"{self.stock.ticker_symbol} closing price on {self.date}: {self.closing_price}"
 
@@ -813,6 +867,12 @@ class DividendDistribution(models.Model):
     amount = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
     def __str__(self):
         return (f"DividendDistribution: Dividend={self.dividend.id}, "
                 f"User={self.user.username}, Amount={self.amount}")
@@ -846,8 +906,43 @@ class DividendDetailedHolding(models.Model):
     # NEW FIELDS
     company_id = models.IntegerField(null=True, blank=True)
     budget_year = models.CharField(max_length=4, blank=True)
+    # DividendJob run that wrote the row (see stocks/dividend_jobs.py); blank otherwise
+    run_token = models.CharField(max_length=32, blank=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"[Div={self.dividend_id}] {self.user.username} - {self.stock_symbol} - ratio={self.ratio_at_creation}"
+
+
+class DividendJob(models.Model):
+    """
+    A server-side dividend declaration: holdings are computed from the trade
+    history and paid out in the background (see stocks/dividend_jobs.py),
+    while the client polls this row for progress.
+    """
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    dividend = models.ForeignKey(Dividend, on_delete=models.CASCADE, related_name='jobs')
+    stock = models.ForeignKey(Stocks, on_delete=models.CASCADE, related_name='dividend_jobs')
+    current_price = models.DecimalField(max_digits=15, decimal_places=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    phase = models.CharField(max_length=20, blank=True)
+    total_holdings = models.IntegerField(default=0)
+    processed_holdings = models.IntegerField(default=0)
+    credited_users = models.IntegerField(default=0)
+    sum_weighted_value = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
+    error = models.TextField(blank=True)
+    run_token = models.CharField(max_length=32, blank=True)  # Set by each claim of the job
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='dividend_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"DividendJob {self.id} for Dividend {self.dividend_id} ({self.status})"
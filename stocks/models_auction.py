@@ -0,0 +1,32 @@
+# stocks/models_auction.py
+
+from django.db import models
+
+
+class AuctionRun(models.Model):
+    """
+    Outcome of one call auction (opening or closing) of a stock's session.
+    The row is written in the same transaction as the auction's fills, so its
+    existence is what makes an auction run at most once per stock and session.
+    """
+    KIND_CHOICES = [
+        ('open', 'Opening'),
+        ('close', 'Closing'),
+    ]
+
+    stock = models.ForeignKey('stocks.Stocks', on_delete=models.CASCADE, related_name='auction_runs')
+    session_date = models.DateField()
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    price = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)  # None: nothing crossed
+    volume = models.IntegerField(default=0)
+    imbalance = models.IntegerField(default=0)  # demand - supply left at the uncrossing price
+    fill_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'session_date', 'kind'], name='unique_auction_run'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} auction of stock {self.stock_id} on {self.session_date}"
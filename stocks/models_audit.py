@@ -11,6 +11,7 @@ class TransactionAuditTrail(models.Model):
         ('TradeExecuted', 'Trade Executed'),
         ('TransactionFeeDeducted', 'Transaction Fee Deducted'),
         ('Direct Purchase', 'Direct Purchase'),
+        ('OrderStatusChanged', 'Order Status Changed'),
         # Add other event types as needed
     ]
 
@@ -0,0 +1,37 @@
+# stocks/models_candles.py
+
+from django.db import models
+
+
+class Candle(models.Model):
+    """
+    One OHLCV bar of a stock at a given resolution, starting at `start`
+    (local time). Only intervals with at least one trade have a row.
+
+    Maintained by trade settlement from the buyer side of each execution
+    (one row per fill); rebuild with `python manage.py backfill_candles`.
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minute'),
+        ('5m', '5 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    stock = models.ForeignKey('stocks.Stocks', on_delete=models.CASCADE, related_name='candles')
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    start = models.DateTimeField()
+    open = models.DecimalField(max_digits=15, decimal_places=2)
+    high = models.DecimalField(max_digits=15, decimal_places=2)
+    low = models.DecimalField(max_digits=15, decimal_places=2)
+    close = models.DecimalField(max_digits=15, decimal_places=2)
+    volume = models.BigIntegerField(default=0)
+    trade_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'resolution', 'start'], name='unique_candle'),
+        ]
+
+    def __str__(self):
+        return f"{self.resolution} candle of stock {self.stock_id} at {self.start}"
@@ -0,0 +1,67 @@
+# stocks/models_counters.py
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Case, DecimalField, F, Value, When
+
+
+class DailyTradingCounter(models.Model):
+    """
+    Per-user, per-day running totals used by the daily trade limits: how many
+    orders the user created that day and the notional value (quantity * price)
+    of the trades recorded for them that day.
+
+    Kept up to date by Orders.save and trade settlement; rebuild with
+    `python manage.py rebuild_trading_counters`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_trading_counters')
+    date = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    traded_amount = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_trading_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.date}: {self.order_count} orders, {self.traded_amount} traded"
+
+    @classmethod
+    def _ensure_rows(cls, keys):
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, date=date) for user_id, date in keys],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def record_order(cls, user_id, date):
+        """Count one more order for the user on that day."""
+        cls._ensure_rows([(user_id, date)])
+        cls.objects.filter(user_id=user_id, date=date).update(order_count=F('order_count') + 1)
+
+    @classmethod
+    def record_traded_amounts(cls, amounts):
+        """Add traded notional values, given as {(user_id, date): amount}."""
+        if not amounts:
+            return
+        cls._ensure_rows(amounts)
+        by_date = defaultdict(dict)
+        for (user_id, date), amount in amounts.items():
+            by_date[date][user_id] = amount
+        for date, per_user in by_date.items():
+            cls.objects.filter(date=date, user_id__in=per_user).update(
+                traded_amount=F('traded_amount') + Case(
+                    *[When(user_id=user_id, then=Value(amount)) for user_id, amount in per_user.items()],
+                    output_field=DecimalField(max_digits=20, decimal_places=2),
+                )
+            )
+
+    @classmethod
+    def for_day(cls, user_id, date):
+        """(order_count, traded_amount) for the user on that day, zeros if nothing recorded."""
+        row = cls.objects.filter(user_id=user_id, date=date).values_list('order_count', 'traded_amount').first()
+        return row or (0, Decimal('0.00'))
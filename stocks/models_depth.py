@@ -0,0 +1,20 @@
+# stocks/models_depth.py
+
+from django.db import models
+
+
+class BookDepth(models.Model):
+    """
+    The order-book depth last streamed to ws/market/ subscribers for a stock,
+    with its sequence number (see stocks/market_data.py). Every process that
+    publishes market data advances this row under a row lock, so a stock has
+    one sequence of depth deltas however many processes match it.
+    """
+    stock = models.OneToOneField('stocks.Stocks', on_delete=models.CASCADE, related_name='book_depth')
+    seq = models.BigIntegerField(default=0)
+    bids = models.JSONField(default=list)  # [{'price', 'quantity', 'orders'}], best first
+    asks = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Book depth of stock {self.stock_id} at seq {self.seq}"
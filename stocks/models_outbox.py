@@ -0,0 +1,39 @@
+# stocks/models_outbox.py
+
+from django.conf import settings
+from django.db import models
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification produced by a trade, written in the same transaction as the
+    trade itself and delivered after commit by stocks.notifications.
+    """
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('websocket', 'WebSocket'),
+    ]
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Sending', 'Sending'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='outbox_notifications')
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} notification for user {self.user_id} ({self.status})"
@@ -0,0 +1,58 @@
+# stocks/models_positions.py
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+
+
+class Position(models.Model):
+    """
+    A user's holding in one stock, maintained by trade settlement.
+
+    `quantity` is net shares bought minus shares sold, `cost_basis` is what
+    the remaining shares cost (average-cost method), and `realized_pnl` is the
+    running profit or loss of everything sold so far.
+    Check or rebuild from Trade with `python manage.py check_positions`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='positions')
+    stock = models.ForeignKey('stocks.Stocks', on_delete=models.CASCADE, related_name='positions')
+    quantity = models.IntegerField(default=0)
+    cost_basis = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    realized_pnl = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'stock'], name='unique_user_stock_position'),
+        ]
+        indexes = [
+            models.Index(fields=['stock', 'quantity'], name='position_stock_qty_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} holds {self.quantity} of stock {self.stock_id}"
+
+    @property
+    def average_cost(self):
+        if self.quantity <= 0:
+            return Decimal('0.00')
+        return (self.cost_basis / self.quantity).quantize(Decimal('0.01'))
+
+    def apply_fill(self, quantity, price, is_buy):
+        """Apply one trade of this user in this stock (in memory; caller saves)."""
+        quantity = int(quantity)
+        price = Decimal(price)
+        if is_buy:
+            self.quantity += quantity
+            self.cost_basis += quantity * price
+            return
+        if self.quantity > 0:
+            sold_cost = (self.cost_basis * min(quantity, self.quantity) / self.quantity).quantize(Decimal('0.01'))
+        else:
+            sold_cost = Decimal('0.00')
+        self.realized_pnl += quantity * price - sold_cost
+        self.cost_basis -= sold_cost
+        self.quantity -= quantity
+        if self.quantity <= 0:
+            self.cost_basis = Decimal('0.00')
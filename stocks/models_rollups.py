@@ -0,0 +1,52 @@
+# stocks/models_rollups.py
+
+from decimal import Decimal
+
+from django.db import models
+
+
+class TradeRollup(models.Model):
+    """
+    Pre-aggregated trades of one stock and order action ('Buy', 'Sell', or ''
+    for trades without an order) over one hour or one day, local time.
+
+    Written by `python manage.py compact_trade_rollups` for buckets that have
+    closed; RollupWatermark records how far that has gone. Reports sum these
+    rows and read raw Trade rows only past the watermark (see stocks/rollups.py).
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    stock = models.ForeignKey('stocks.Stocks', on_delete=models.CASCADE, related_name='trade_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    action = models.CharField(max_length=4, blank=True, default='')
+    trade_count = models.PositiveIntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    fees = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal('0.00'))
+    value = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal('0.00'))
+    price_sum = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'stock', 'bucket_start', 'action'], name='unique_trade_rollup_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='rollup_granularity_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.granularity} rollup of stock {self.stock_id} {self.action or '-'} at {self.bucket_start}"
+
+
+class RollupWatermark(models.Model):
+    """Trades before `compacted_until` are fully covered by TradeRollup rows."""
+    key = models.CharField(max_length=30, unique=True)
+    compacted_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} compacted until {self.compacted_until}"
@@ -0,0 +1,17 @@
+# stocks/models_summary.py
+
+from django.db import models
+
+
+class MarketSummary(models.Model):
+    """
+    A precomputed dashboard document, one row per audience ('default',
+    'company_admin', 'regulator'). Written by stocks.market_summary; the
+    extended dashboard reads a single row instead of aggregating Trade.
+    """
+    key = models.CharField(max_length=30, unique=True)
+    document = models.JSONField(default=dict)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Market summary '{self.key}' computed at {self.computed_at}"
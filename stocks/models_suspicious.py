@@ -12,5 +12,31 @@ class SuspiciousActivity(models.Model):
     flagged_at = models.DateTimeField(auto_now_add=True)
     reviewed = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['flagged_at']),
+        ]
+
     def __str__(self):
         return f"Suspicious Trade: {self.trade.id} - {self.reason[:50]}"
+
+
+class SurveillanceCheckpoint(models.Model):
+    """
+    Running per-stock trade aggregates kept by the surveillance engine, as of
+    `last_trade_id`, so a restarted process only has to replay newer trades.
+    """
+    stock = models.OneToOneField(
+        'stocks.Stocks',
+        on_delete=models.CASCADE,
+        related_name='surveillance_checkpoint'
+    )
+    last_trade_id = models.BigIntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+    trade_count = models.BigIntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    notional = models.DecimalField(max_digits=28, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Surveillance checkpoint for stock {self.stock_id} at trade {self.last_trade_id}"
@@ -0,0 +1,198 @@
+# stocks/notifications.py
+
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ethio_stock_simulation.utils import send_order_digest_notification, send_order_notification
+from stocks.models_outbox import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_FIELDS = ('action', 'stock_symbol', 'quantity', 'price', 'new_balance')
+
+
+class SendGridTransport:
+    """Delivers order emails through the shared mail transport, one email per recipient."""
+
+    def send(self, to_email, username, executions):
+        if len(executions) == 1:
+            return send_order_notification(to_email=to_email, username=username, **executions[0])
+        return send_order_digest_notification(to_email, username, executions)
+
+
+class LocmemTransport:
+    """Keeps emails in memory instead of sending them (tests and local runs)."""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, to_email, username, executions):
+        self.outbox.append({'to_email': to_email, 'username': username, 'executions': executions})
+        return True
+
+
+class NotificationDispatcher:
+    """
+    Drains NotificationOutbox rows written by trade settlement.
+
+    Settlement only inserts outbox rows inside its transaction and calls
+    wake() on commit, so no network I/O happens while trade locks are held.
+    Draining runs on a small thread pool: pending rows are claimed in batches,
+    emails are grouped into one message per recipient and websocket events are
+    pushed through notify_user_real_time. Failed rows are retried on later
+    drains until NOTIFICATION_OUTBOX['max_attempts'] is reached; rows left in
+    'Sending' by a crashed process are reclaimed after claim_timeout_seconds.
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'NOTIFICATION_OUTBOX', {})
+        self.workers = config.get('workers', 2)
+        self.batch_size = config.get('batch_size', 200)
+        self.max_attempts = config.get('max_attempts', 5)
+        self.claim_timeout = timedelta(seconds=config.get('claim_timeout_seconds', 300))
+        self.email_transport = import_string(
+            config.get('email_transport', 'stocks.notifications.SendGridTransport')
+        )()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def wake(self):
+        """Schedule a background drain unless one is already waiting to start."""
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='notification-dispatcher'
+                )
+        self._executor.submit(self._drain_in_background)
+
+    def _drain_in_background(self):
+        with self._lock:
+            self._scheduled = False
+        try:
+            self.drain()
+        except Exception as e:
+            logger.error(f"Notification outbox drain failed: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+
+    # ------------------ Draining -------------------
+    def drain(self):
+        """Deliver pending notifications until none are left; returns (sent, failed)."""
+        sent = failed = 0
+        retried = set()
+        while True:
+            rows = self._claim(exclude_ids=retried)
+            if not rows:
+                break
+            ok, not_ok = self._deliver(rows)
+            sent += ok
+            failed += len(not_ok)
+            # Failed rows go back to Pending; leave them for the next drain
+            # rather than hammering a failing transport in a tight loop.
+            retried.update(not_ok)
+        return sent, failed
+
+    def _claim(self, exclude_ids=()):
+        now = timezone.now()
+        with transaction.atomic():
+            rows = list(
+                NotificationOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('user')
+                .filter(Q(status='Pending') | Q(status='Sending', claimed_at__lt=now - self.claim_timeout))
+                .exclude(id__in=exclude_ids)
+                .order_by('id')[:self.batch_size]
+            )
+            if rows:
+                NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+                    status='Sending', claimed_at=now
+                )
+        return rows
+
+    def _deliver(self, rows):
+        from stocks.models import notify_user_real_time  # Inline import to avoid circular dependency
+
+        errors = {}
+        emails = defaultdict(list)
+        for row in rows:
+            if row.channel == 'email':
+                emails[row.user_id].append(row)
+                continue
+            try:
+                notify_user_real_time(row.user, row.payload['message'])
+            except Exception as e:
+                errors[row.id] = str(e)
+
+        for group in emails.values():
+            latest = group[-1].payload
+            executions = [{field: row.payload.get(field) for field in EXECUTION_FIELDS} for row in group]
+            try:
+                delivered = self.email_transport.send(latest['to_email'], latest['username'], executions)
+                error = '' if delivered else 'Email transport reported a failure.'
+            except Exception as e:
+                error = str(e)
+            if error:
+                for row in group:
+                    errors[row.id] = error
+
+        self._record_outcome(rows, errors)
+        return len(rows) - len(errors), list(errors)
+
+    def _record_outcome(self, rows, errors):
+        now = timezone.now()
+        sent_ids = [row.id for row in rows if row.id not in errors]
+        if sent_ids:
+            NotificationOutbox.objects.filter(id__in=sent_ids).update(status='Sent', sent_at=now)
+
+        failed = [row for row in rows if row.id in errors]
+        for row in failed:
+            row.attempts += 1
+            row.last_error = errors[row.id]
+            row.status = 'Failed' if row.attempts >= self.max_attempts else 'Pending'
+            logger.warning(
+                f"Notification {row.id} ({row.channel}) for user {row.user_id} failed "
+                f"(attempt {row.attempts}): {row.last_error}"
+            )
+        if failed:
+            NotificationOutbox.objects.bulk_update(failed, ['attempts', 'last_error', 'status'])
+
+
+def order_execution_notifications(user, action, stock_symbol, quantity, price, new_balance):
+    """Outbox rows (unsaved) telling a user one of their orders was executed."""
+    return [
+        NotificationOutbox(
+            user=user,
+            channel='email',
+            payload={
+                'to_email': user.email,
+                'username': user.username,
+                'action': action,
+                'stock_symbol': stock_symbol,
+                'quantity': quantity,
+                'price': str(price),
+                'new_balance': str(new_balance) if new_balance is not None else None,
+            },
+        ),
+        NotificationOutbox(
+            user=user,
+            channel='websocket',
+            payload={
+                'message': f"Your {action} order for {quantity} shares of {stock_symbol} was executed at {price}.",
+            },
+        ),
+    ]
+
+
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,307 @@
+# stocks/order_book.py
+
+import bisect
+import datetime
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('Pending', 'Partially Completed')
+
+
+class BookEntry:
+    """
+    A resting order as seen by the book. Only the fields the matching path
+    needs to pick counterparties are kept here; the DB row stays authoritative.
+    """
+    __slots__ = ('order_id', 'user_id', 'action', 'order_type', 'price', 'quantity', 'created_at')
+
+    def __init__(self, order_id, user_id, action, order_type, price, quantity, created_at):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.action = action
+        self.order_type = order_type
+        self.price = price
+        self.quantity = quantity
+        self.created_at = created_at
+
+    @classmethod
+    def from_order(cls, order):
+        return cls(
+            order_id=order.id,
+            user_id=order.user_id,
+            action=order.action,
+            order_type=order.order_type,
+            price=order.price,
+            quantity=order.quantity,
+            created_at=order.created_at,
+        )
+
+
+class _BookSide:
+    """
+    One side of the book: sorted price levels, each a FIFO queue of entries,
+    plus a separate FIFO queue for resting Market orders (price=None).
+    """
+
+    def __init__(self):
+        self.prices = []      # ascending
+        self.levels = {}      # price -> deque[BookEntry]
+        self.market = deque()
+
+    def add(self, entry):
+        if entry.price is None:
+            self.market.append(entry)
+            return
+        level = self.levels.get(entry.price)
+        if level is None:
+            level = self.levels[entry.price] = deque()
+            bisect.insort(self.prices, entry.price)
+        level.append(entry)
+
+    def remove(self, entry):
+        if entry.price is None:
+            self.market.remove(entry)
+            return
+        level = self.levels[entry.price]
+        level.remove(entry)
+        if not level:
+            del self.levels[entry.price]
+            del self.prices[bisect.bisect_left(self.prices, entry.price)]
+
+    def level_quantity(self, price):
+        return sum(e.quantity for e in self.levels.get(price, ()))
+
+
+class OrderBook:
+    """
+    In-memory limit order book for a single stock.
+
+    Price levels are kept sorted so the best bid/ask is an O(1) lookup, and
+    each level is a FIFO queue so price-time priority matches the ordering the
+    matching path used to get from `order_by('price', 'created_at')`.
+    """
+
+    def __init__(self, stock_id):
+        self.stock_id = stock_id
+        self.lock = threading.RLock()
+        self.bids = _BookSide()
+        self.asks = _BookSide()
+        self._entries = {}
+        self.high_water_mark = 0
+        self.loaded_at = None  # time.monotonic() of the last load()
+
+    def __contains__(self, order_id):
+        return order_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _side(self, action):
+        return self.bids if action == 'Buy' else self.asks
+
+    # ------------------ Loading -------------------
+    def load(self):
+        """Rebuild the book from the open orders stored in the DB."""
+        from stocks.models import Orders  # Inline import to avoid circular dependency
+
+        with self.lock:
+            self.bids = _BookSide()
+            self.asks = _BookSide()
+            self._entries = {}
+            self.high_water_mark = 0
+            open_orders = Orders.objects.filter(
+                stock_id=self.stock_id,
+                status__in=OPEN_STATUSES,
+                quantity__gt=0,
+            ).order_by('created_at', 'id').values_list(
+                'id', 'user_id', 'action', 'order_type', 'price', 'quantity', 'created_at'
+            )
+            for row in open_orders.iterator(chunk_size=2000):
+                self._add_entry(BookEntry(*row))
+            self.loaded_at = time.monotonic()
+            self.high_water_mark = max(
+                self.high_water_mark,
+                Orders.objects.filter(stock_id=self.stock_id).aggregate(max_id=Max('id'))['max_id'] or 0,
+            )
+            logger.info(f"Order book for stock {self.stock_id} loaded with {len(self._entries)} resting orders.")
+
+    def sync_new_orders(self, exclude_id=None):
+        """
+        Pick up resting orders committed by other processes since the last
+        sync, in a single query: rows above the primary-key high-water mark,
+        plus open rows created in the last ORDER_BOOK['lag_seconds'], since a
+        transaction holding a lower id can commit after a higher id was synced.
+
+        Cancels, fills and expiries done elsewhere are not seen here, so once
+        the book is ORDER_BOOK['reload_seconds'] old it is rebuilt from the DB
+        instead; that also covers rows committed later than the lag window.
+        Callers hold the stock's row lock, so the rebuild sees a settled book.
+        """
+        from stocks.models import Orders  # Inline import to avoid circular dependency
+
+        config = getattr(settings, 'ORDER_BOOK', {})
+        with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= config.get('reload_seconds', 60):
+                self.load()
+                if exclude_id is not None:
+                    self.remove(exclude_id)
+                return
+            recent = timezone.now() - datetime.timedelta(seconds=config.get('lag_seconds', 30))
+            new_rows = Orders.objects.filter(
+                Q(id__gt=self.high_water_mark) | Q(created_at__gte=recent, status__in=OPEN_STATUSES),
+                stock_id=self.stock_id,
+            ).order_by('created_at', 'id').values_list(
+                'id', 'user_id', 'action', 'order_type', 'price', 'quantity', 'created_at', 'status'
+            )
+            for *row, status in new_rows:
+                if row[0] == exclude_id:
+                    continue
+                self.high_water_mark = max(self.high_water_mark, row[0])
+                if status in OPEN_STATUSES and row[5] > 0 and row[0] not in self._entries:
+                    self._add_entry(BookEntry(*row))
+
+    # ------------------ Mutations -------------------
+    def _add_entry(self, entry):
+        self._side(entry.action).add(entry)
+        self._entries[entry.order_id] = entry
+        self.high_water_mark = max(self.high_water_mark, entry.order_id)
+
+    def add(self, order):
+        """Add a resting order (or refresh it if it is already in the book)."""
+        with self.lock:
+            if order.id in self._entries:
+                self.sync_order(order)
+            elif order.status in OPEN_STATUSES and order.quantity > 0:
+                self._add_entry(BookEntry.from_order(order))
+
+    def remove(self, order_id):
+        with self.lock:
+            entry = self._entries.pop(order_id, None)
+            if entry is not None:
+                self._side(entry.action).remove(entry)
+            return entry
+
+    def take_all(self):
+        """Empty the book and return its entries in time priority (oldest first)."""
+        with self.lock:
+            entries = sorted(self._entries.values(), key=lambda entry: (entry.created_at, entry.order_id))
+            self.bids = _BookSide()
+            self.asks = _BookSide()
+            self._entries = {}
+            return entries
+
+    def reduce(self, order_id, quantity):
+        """Reduce a resting order after a fill; drop it once fully filled."""
+        with self.lock:
+            entry = self._entries.get(order_id)
+            if entry is None:
+                return
+            entry.quantity -= quantity
+            if entry.quantity <= 0:
+                self.remove(order_id)
+
+    def sync_order(self, order):
+        """
+        Bring the book in line with the current state of an order row, e.g.
+        after a cancellation or a price/quantity edit through the API.
+        """
+        with self.lock:
+            entry = self._entries.get(order.id)
+            is_open = order.status in OPEN_STATUSES and order.quantity > 0
+            if entry is None:
+                if is_open:
+                    self._add_entry(BookEntry.from_order(order))
+                return
+            if not is_open:
+                self.remove(order.id)
+            elif entry.price != order.price or entry.action != order.action:
+                # A re-priced order loses its time priority
+                self.remove(order.id)
+                self._add_entry(BookEntry.from_order(order))
+            else:
+                entry.quantity = order.quantity
+
+    # ------------------ Queries -------------------
+    def best_bid(self):
+        prices = self.bids.prices
+        return prices[-1] if prices else None
+
+    def best_ask(self):
+        prices = self.asks.prices
+        return prices[0] if prices else None
+
+    def quote(self):
+        """(best bid, its size, best ask, its size) over the priced levels; None/0 for an empty side."""
+        with self.lock:
+            bid, ask = self.best_bid(), self.best_ask()
+            return (
+                bid, self.bids.level_quantity(bid) if bid is not None else 0,
+                ask, self.asks.level_quantity(ask) if ask is not None else 0,
+            )
+
+    def iter_asks(self, limit_price=None):
+        """
+        Resting sell orders in the order a Buy taker consumes them: lowest
+        price first, then oldest first. Resting Market sells come last and
+        only for Market buys (limit_price=None).
+        """
+        for price in list(self.asks.prices):
+            if limit_price is not None and price > limit_price:
+                return
+            yield from list(self.asks.levels.get(price, ()))
+        if limit_price is None:
+            yield from list(self.asks.market)
+
+    def iter_bids(self, limit_price=None):
+        """
+        Resting buy orders in the order a Sell taker consumes them: resting
+        Market buys first (Market sells only), then highest price first.
+        """
+        if limit_price is None:
+            yield from list(self.bids.market)
+        for price in reversed(list(self.bids.prices)):
+            if limit_price is not None and price < limit_price:
+                return
+            yield from list(self.bids.levels.get(price, ()))
+
+
+class OrderBookRegistry:
+    """
+    Process-wide registry of order books, one per stock, built lazily from the
+    DB the first time a stock is matched in this process.
+    """
+
+    def __init__(self):
+        self._books = {}
+        self._lock = threading.Lock()
+
+    def get(self, stock_id):
+        with self._lock:
+            book = self._books.get(stock_id)
+            if book is None:
+                book = self._books[stock_id] = OrderBook(stock_id)
+                book.load()
+            return book
+
+    def peek(self, stock_id):
+        """Return the book only if it is already resident (no DB load)."""
+        return self._books.get(stock_id)
+
+    def invalidate(self, stock_id=None):
+        """Drop a book (or all books) so it is rebuilt from the DB on next use."""
+        with self._lock:
+            if stock_id is None:
+                self._books.clear()
+            else:
+                self._books.pop(stock_id, None)
+
+
+order_books = OrderBookRegistry()
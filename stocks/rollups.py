@@ -0,0 +1,205 @@
+# stocks/rollups.py
+
+import datetime
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import RollupWatermark, Trade, TradeRollup
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = 'trade_rollups'
+ZERO = Decimal('0.00')
+
+_trade_value = ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=24, decimal_places=2))
+
+
+# ------------------ Bucket boundaries (local time) -------------------
+def floor_hour(value):
+    return timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value):
+    floored = floor_hour(value)
+    return floored if floored == value else floored + datetime.timedelta(hours=1)
+
+
+def floor_day(value):
+    local = timezone.localtime(value)
+    return timezone.make_aware(datetime.datetime.combine(local.date(), datetime.time.min))
+
+
+def ceil_day(value):
+    floored = floor_day(value)
+    if floored == value:
+        return floored
+    return timezone.make_aware(datetime.datetime.combine(floored.date() + datetime.timedelta(days=1), datetime.time.min))
+
+
+def get_watermark():
+    return RollupWatermark.objects.filter(key=WATERMARK_KEY).values_list('compacted_until', flat=True).first()
+
+
+# ------------------ Compaction -------------------
+def compact(until=None, rebuild=False):
+    """
+    Writes hourly rollups for every closed hour since the watermark (up to
+    `until`, default the start of the current hour) and daily rollups for the
+    days that are complete by then, then moves the watermark. Buckets in the
+    window are rewritten, so re-running is safe. Returns the new watermark.
+    """
+    until = floor_hour(until or timezone.now())
+    since = None if rebuild else get_watermark()
+    if since is None:
+        first = Trade.objects.order_by('trade_time').values_list('trade_time', flat=True).first()
+        since = floor_day(first) if first else until
+    if since >= until:
+        return since
+
+    with transaction.atomic():
+        hourly = _aggregate('hour', TruncHour, since, until)
+        TradeRollup.objects.filter(granularity='hour', bucket_start__gte=since, bucket_start__lt=until).delete()
+        TradeRollup.objects.bulk_create(hourly, batch_size=1000)
+
+        # Days are rolled up once every hour of the day has been compacted
+        day_start, day_end = floor_day(since), floor_day(until)
+        daily = []
+        if day_start < day_end:
+            daily = _aggregate('day', TruncDay, day_start, day_end)
+            TradeRollup.objects.filter(granularity='day', bucket_start__gte=day_start, bucket_start__lt=day_end).delete()
+            TradeRollup.objects.bulk_create(daily, batch_size=1000)
+
+        RollupWatermark.objects.update_or_create(key=WATERMARK_KEY, defaults={'compacted_until': until})
+
+    logger.info(f"Trade rollups compacted up to {until}: {len(hourly)} hourly, {len(daily)} daily rows.")
+    return until
+
+
+def _aggregate(granularity, trunc, since, until):
+    rows = (
+        Trade.objects.filter(trade_time__gte=since, trade_time__lt=until)
+        .annotate(bucket=trunc('trade_time'), action=Coalesce('order__action', Value('')))
+        .values('stock_id', 'bucket', 'action')
+        .annotate(
+            trade_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_fees=Sum('transaction_fee'),
+            total_value=Sum(_trade_value),
+            total_price=Sum('price'),
+        )
+    )
+    return [
+        TradeRollup(
+            stock_id=row['stock_id'],
+            granularity=granularity,
+            bucket_start=row['bucket'],
+            action=row['action'],
+            trade_count=row['trade_count'],
+            quantity=row['total_quantity'] or 0,
+            fees=_money(row['total_fees']),
+            value=_money(row['total_value']),
+            price_sum=_money(row['total_price']),
+        )
+        for row in rows
+    ]
+
+
+# ------------------ Querying -------------------
+def summarize_trades(start, end, stock_id=None, company_id=None):
+    """
+    Totals of the trades with start <= trade_time <= end, overall and per
+    order action: {action: {count, quantity, fees, value, price_sum}}.
+
+    Closed, compacted buckets are read from TradeRollup (daily rows for whole
+    days, hourly rows for the hours around them); only the partial hours at
+    the range edges and everything past the watermark hit the Trade table.
+    """
+    totals = {}
+    watermark = get_watermark()
+    rolled_start, rolled_end = ceil_hour(start), None
+    if watermark is not None and rolled_start < watermark:
+        rolled_end = min(floor_hour(end), watermark)
+
+    if rolled_end is None or rolled_start >= rolled_end:
+        _add_raw(totals, Q(trade_time__gte=start, trade_time__lte=end), stock_id, company_id)
+        return totals
+
+    # Raw edges: before the first whole hour, and from the last rolled-up hour to `end`
+    _add_raw(
+        totals,
+        Q(trade_time__gte=start, trade_time__lt=rolled_start) | Q(trade_time__gte=rolled_end, trade_time__lte=end),
+        stock_id, company_id,
+    )
+
+    day_start, day_end = ceil_day(rolled_start), floor_day(rolled_end)
+    if day_start < day_end:
+        _add_rollups(totals, Q(granularity='day', bucket_start__gte=day_start, bucket_start__lt=day_end),
+                     stock_id, company_id)
+        hours = (Q(bucket_start__gte=rolled_start, bucket_start__lt=day_start)
+                 | Q(bucket_start__gte=day_end, bucket_start__lt=rolled_end))
+    else:
+        hours = Q(bucket_start__gte=rolled_start, bucket_start__lt=rolled_end)
+    _add_rollups(totals, Q(granularity='hour') & hours, stock_id, company_id)
+    return totals
+
+
+def _filter_scope(queryset, stock_id, company_id):
+    if stock_id:
+        queryset = queryset.filter(stock_id=stock_id)
+    if company_id:
+        queryset = queryset.filter(stock__company_id=company_id)
+    return queryset
+
+
+def _money(amount):
+    # Sums of 2-decimal columns; quantize away backend float noise (e.g. SQLite)
+    return Decimal(amount or 0).quantize(ZERO)
+
+
+def _add(totals, action, count, quantity, fees, value, price_sum):
+    bucket = totals.setdefault(action, {'count': 0, 'quantity': 0, 'fees': ZERO, 'value': ZERO, 'price_sum': ZERO})
+    bucket['count'] += count
+    bucket['quantity'] += quantity or 0
+    bucket['fees'] += _money(fees)
+    bucket['value'] += _money(value)
+    bucket['price_sum'] += _money(price_sum)
+
+
+def _add_raw(totals, window, stock_id, company_id):
+    rows = (
+        _filter_scope(Trade.objects.filter(window), stock_id, company_id)
+        .annotate(action=Coalesce('order__action', Value('')))
+        .values('action')
+        .annotate(
+            trade_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_fees=Sum('transaction_fee'),
+            total_value=Sum(_trade_value),
+            total_price=Sum('price'),
+        )
+    )
+    for row in rows:
+        _add(totals, row['action'], row['trade_count'], row['total_quantity'], row['total_fees'],
+             row['total_value'], row['total_price'])
+
+
+def _add_rollups(totals, window, stock_id, company_id):
+    rows = (
+        _filter_scope(TradeRollup.objects.filter(window), stock_id, company_id)
+        .values('action')
+        .annotate(
+            trade_count=Sum('trade_count'),
+            total_quantity=Sum('quantity'),
+            total_fees=Sum('fees'),
+            total_value=Sum('value'),
+            total_price=Sum('price_sum'),
+        )
+    )
+    for row in rows:
+        _add(totals, row['action'], row['trade_count'] or 0, row['total_quantity'], row['total_fees'],
+             row['total_value'], row['total_price'])
@@ -1,6 +1,7 @@
 from django.urls import path
-from .consumers import NotificationConsumer
+from .consumers import MarketDataConsumer, NotificationConsumer
 
 websocket_urlpatterns = [
     path('ws/notifications/', NotificationConsumer.as_asgi()),
+    path('ws/market/', MarketDataConsumer.as_asgi()),
 ]
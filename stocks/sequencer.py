@@ -0,0 +1,133 @@
+# stocks/sequencer.py
+
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .order_book import OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+class MatchingSequencer:
+    """
+    Single-writer matching front door.
+
+    Every new order is routed to a queue chosen by its stock_id and consumed by
+    exactly one worker thread, so orders for a given stock are matched strictly
+    one at a time in arrival order, while different stocks are matched in
+    parallel across workers. Callers get a Future right away and the filled
+    order once its worker has processed it.
+
+    Across processes, Orders.match_and_execute_orders additionally locks the
+    stock row, so two web workers never match the same stock concurrently.
+
+    The queues live in memory, so orders still waiting when a process dies
+    are stored but never matched as takers. With
+    MATCHING_SEQUENCER['recover_on_start'], each worker therefore first
+    recrosses (Orders.recross_book) the stocks of its shard that have open
+    orders. start() runs this at server startup instead of at the first order.
+    """
+
+    def __init__(self, workers=None):
+        config = getattr(settings, 'MATCHING_SEQUENCER', {})
+        self.workers = workers or config.get('workers', 4)
+        self.recover_on_start = config.get('recover_on_start', True)
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def shard_for(self, stock_id):
+        return stock_id % self.workers
+
+    def start(self):
+        """Start the workers (and their recovery pass) now, if the sequencer is enabled."""
+        if getattr(settings, 'MATCHING_SEQUENCER', {}).get('enabled', False):
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for shard in range(self.workers):
+                q = queue.Queue()
+                if self.recover_on_start:
+                    q.put((None, None))  # Recovery pass, ahead of any order
+                t = threading.Thread(
+                    target=self._run,
+                    args=(shard, q),
+                    name=f"matching-worker-{shard}",
+                    daemon=True,
+                )
+                self._queues.append(q)
+                self._threads.append(t)
+                t.start()
+
+    def submit(self, order_id, stock_id):
+        """Queue an already-saved order for matching; returns a Future of the order."""
+        self._ensure_started()
+        future = Future()
+        self._queues[self.shard_for(stock_id)].put((order_id, future))
+        return future
+
+    async def asubmit(self, order_id, stock_id):
+        """asyncio flavour of submit(), for ASGI consumers."""
+        return await asyncio.wrap_future(self.submit(order_id, stock_id))
+
+    def backlog(self):
+        """Number of orders waiting per shard."""
+        return [q.qsize() for q in self._queues]
+
+    def _run(self, shard, q):
+        while True:
+            order_id, future = q.get()
+            try:
+                if order_id is None:
+                    self._recover(shard)
+                    continue
+                future.set_result(self._match(order_id))
+            except Exception as e:
+                logger.error(f"Matching failed for Order ID={order_id}: {e}", exc_info=True)
+                future.set_exception(e)
+            finally:
+                close_old_connections()
+                q.task_done()
+
+    def _recover(self, shard):
+        from stocks.batch_matching import stocks_with_open_orders  # Inline import to avoid circular dependency
+        from stocks.models import Orders  # Inline import to avoid circular dependency
+
+        for stock_id in stocks_with_open_orders():
+            if self.shard_for(stock_id) != shard:
+                continue
+            try:
+                trades = Orders.recross_book(stock_id)
+            except Exception as e:
+                logger.error(f"Recovery recross of stock {stock_id} failed: {e}", exc_info=True)
+                continue
+            if trades:
+                logger.warning(f"Recovered stock {stock_id}: {len(trades)} trades from orders left unmatched.")
+
+    @staticmethod
+    def _match(order_id):
+        from stocks.models import Orders  # Inline import to avoid circular dependency
+
+        with transaction.atomic():
+            order = Orders.objects.select_related('user', 'stock').get(id=order_id)
+            if order.status not in OPEN_STATUSES or order.quantity <= 0:
+                # Cancelled (or otherwise closed) before its turn came
+                return order
+            # Re-read under the stock lock: a cancel may commit until then
+            Orders.match_and_execute_orders(order, refresh=True)
+        logger.info(f"Sequenced matching for Order ID={order.id}. Status is now {order.status}")
+        return order
+
+
+matching_sequencer = MatchingSequencer()
@@ -7,10 +7,12 @@ from django.db import transaction
 from stocks.models_audit import TransactionAuditTrail
 from django.contrib.auth import get_user_model
 
+from ethio_stock_simulation.projection import ProjectableSerializerMixin
+
 # Import everything ACTUALLY in `models.py`
 from .models import (
     Disclosure, DividendDetailedHolding, DividendDistribution, UsersPortfolio, ListedCompany,
-    Stocks, Orders, Trade, Dividend
+    Stocks, Orders, Trade, Dividend, DividendJob, Candle
 )
 
 # Import SuspiciousActivity from its own file
@@ -51,11 +53,16 @@ class StocksSerializer(serializers.ModelSerializer):
             'created_at',
             'company_name',
         ]
-class OrdersSerializer(serializers.ModelSerializer):
+class OrdersSerializer(ProjectableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Orders
         fields = '__all__'
 
+    def create(self, validated_data):
+        order = Orders(**validated_data)
+        order.save(defer_matching=self.context.get('defer_matching', False))
+        return order
+
 
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,12 +73,18 @@ class OrderSerializer(serializers.ModelSerializer):
         return Orders.objects.create(**validated_data)
 
 
-class TradeSerializer(serializers.ModelSerializer):
+class TradeSerializer(ProjectableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Trade
         fields = '__all__'
 
 
+class CandleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Candle
+        fields = ['start', 'open', 'high', 'low', 'close', 'volume', 'trade_count']
+
+
 # class DividendSerializer(serializers.ModelSerializer):
 #     class Meta:
 #         model = Dividend
@@ -126,7 +139,7 @@ class TradeWithOrderSerializer(serializers.ModelSerializer):
             'stock_symbol',
         ]
 # for Audit trail 
-class TransactionAuditTrailSerializer(serializers.ModelSerializer):
+class TransactionAuditTrailSerializer(ProjectableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = TransactionAuditTrail
         fields = [
@@ -163,7 +176,7 @@ class TradeDetailSerializer(serializers.ModelSerializer):
             'stock',   # => { id, ticker_symbol }
         ]
 
-class SuspiciousActivityDetailSerializer(serializers.ModelSerializer):
+class SuspiciousActivityDetailSerializer(ProjectableSerializerMixin, serializers.ModelSerializer):
     """
     SuspiciousActivity serializer that nests Trade data,
     which in turn nests User and Stock info.
@@ -177,7 +190,7 @@ class SuspiciousActivityDetailSerializer(serializers.ModelSerializer):
   
       
 # for dividend section 
-class DividendDistributionSerializer(serializers.ModelSerializer):
+class DividendDistributionSerializer(ProjectableSerializerMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)  # To display username
     dividend = serializers.StringRelatedField(read_only=True)  # To display dividend info
 
@@ -353,6 +366,63 @@ class DividendSerializer(serializers.ModelSerializer):
 
         return dividend
 
+
+class DividendDeclarationSerializer(DividendSerializer):
+    """
+    Server-side dividend declaration: instead of trusting client-posted
+    holdingsData/sum_weighted_value, the holdings are computed from the trade
+    history by a background DividendJob. The created job is exposed as
+    `self.job` after save().
+    """
+    stock_id = serializers.IntegerField(required=False, write_only=True)
+    current_price = serializers.DecimalField(
+        max_digits=15, decimal_places=2, required=False, write_only=True, min_value=Decimal('0.01')
+    )
+
+    class Meta(DividendSerializer.Meta):
+        fields = DividendSerializer.Meta.fields + ['stock_id', 'current_price']
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        stocks = attrs['company'].stocks.order_by('id')
+        stock_id = attrs.pop('stock_id', None)
+        stock = stocks.filter(id=stock_id).first() if stock_id else stocks.first()
+        if stock is None:
+            raise serializers.ValidationError("No stock found for this company.")
+        attrs['stock'] = stock
+        return attrs
+
+    def create(self, validated_data):
+        from .dividend_jobs import dividend_job_runner  # Inline import to avoid circular dependency
+
+        stock = validated_data.pop('stock')
+        current_price = validated_data.pop('current_price', None) or stock.current_price
+        request = self.context.get('request')
+        created_by = request.user if request and request.user.is_authenticated else None
+
+        with transaction.atomic():
+            dividend = Dividend.objects.create(dividend_ratio=Decimal('0.00'), **validated_data)
+            self.job = DividendJob.objects.create(
+                dividend=dividend,
+                stock=stock,
+                current_price=current_price,
+                created_by=created_by,
+            )
+            job_id = self.job.id
+            transaction.on_commit(lambda: dividend_job_runner.submit(job_id))
+        return dividend
+
+
+class DividendJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DividendJob
+        fields = [
+            'id', 'dividend', 'stock', 'current_price', 'status', 'phase',
+            'total_holdings', 'processed_holdings', 'credited_users',
+            'sum_weighted_value', 'error', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
 class DividendDetailedHoldingSerializer(serializers.ModelSerializer):
     class Meta:
         model = DividendDetailedHolding
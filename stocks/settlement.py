@@ -0,0 +1,354 @@
+# stocks/settlement.py
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.utils.timezone import localdate
+
+from stocks.models_audit import TransactionAuditTrail
+from stocks.models_counters import DailyTradingCounter
+from stocks.models_outbox import NotificationOutbox
+from stocks.models_positions import Position
+from .candles import record_trades
+from .market_data import market_data
+from .market_summary import market_summary
+from .notifications import notification_dispatcher, order_execution_notifications
+from .surveillance import surveillance_pipeline
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+TRANSACTION_FEE_PERCENTAGE = Decimal('0.01')  # 1%
+
+
+class Fill:
+    """One execution between a buy order and a sell order (or the company)."""
+    __slots__ = (
+        'buy_order', 'sell_order', 'quantity', 'price', 'total_cost',
+        'fee_buyer', 'fee_seller', 'buyer_remaining', 'seller_remaining',
+        'trade_buyer', 'trade_seller', 'buyer_balance', 'seller_balance',
+    )
+
+    def __init__(self, buy_order, sell_order, quantity, price):
+        self.buy_order = buy_order
+        self.sell_order = sell_order
+        self.quantity = quantity
+        self.price = price
+        self.total_cost = Decimal(quantity) * Decimal(price)
+        self.fee_buyer = (self.total_cost * TRANSACTION_FEE_PERCENTAGE).quantize(Decimal('0.01'))
+        self.fee_seller = (
+            (self.total_cost * TRANSACTION_FEE_PERCENTAGE).quantize(Decimal('0.01')) if sell_order else None
+        )
+        # Remaining quantity as the audit trail reports it at execution time
+        self.buyer_remaining = buy_order.quantity if buy_order.status != 'Fully Completed' else 0
+        self.seller_remaining = (
+            sell_order.quantity if sell_order and sell_order.status != 'Fully Completed' else 0
+        )
+        self.trade_buyer = None
+        self.trade_seller = None
+        self.buyer_balance = None
+        self.seller_balance = None
+
+    @property
+    def buyer_delta(self):
+        return -(self.total_cost + self.fee_buyer)
+
+    @property
+    def seller_delta(self):
+        return self.total_cost - self.fee_seller
+
+
+class SettlementBatch:
+    """
+    Accumulates the fills produced by one matching pass and settles them
+    together, so sweeping N resting orders costs a constant number of
+    statements instead of a dozen per fill:
+
+      - Trade and TransactionAuditTrail rows via bulk_create
+      - account balances and company available_shares via a single
+        CASE/WHEN F() update each
+      - touched orders via bulk_update
+      - portfolios and per-stock positions via one locked read and one
+        bulk_update each
+      - the users' DailyTradingCounter amounts via one CASE/WHEN F() update
+      - notifications via NotificationOutbox rows, delivered after commit
+    """
+
+    def __init__(self):
+        self.fills = []
+        self._orders = {}
+        self._company_sales = defaultdict(int)
+
+    def __bool__(self):
+        return bool(self.fills) or bool(self._orders)
+
+    def add_fill(self, buy_order, sell_order, quantity, price=None):
+        if price is None:
+            price = (sell_order or buy_order).stock.current_price
+        fill = Fill(buy_order, sell_order, quantity, price)
+        buy_order.transaction_fee += fill.fee_buyer
+        self.touch(buy_order)
+        if sell_order:
+            sell_order.transaction_fee += fill.fee_seller
+            self.touch(sell_order)
+        self.fills.append(fill)
+        return fill
+
+    def touch(self, order):
+        """Register an order whose quantity/status/fee must be written on flush."""
+        self._orders[order.id] = order
+
+    def sell_from_company(self, stock, quantity):
+        """Record shares sold directly by the company (decremented on flush)."""
+        stock.available_shares -= quantity
+        self._company_sales[stock.id] += quantity
+
+    # ------------------ Flush -------------------
+    def flush(self):
+        from stocks.models import Orders, Stocks, Trade  # Inline import to avoid circular dependency
+
+        if not self:
+            return []
+
+        with transaction.atomic():
+            trades = self._create_trades(Trade)
+            self._create_audit_rows()
+            self._apply_balances()
+            if self._orders:
+                Orders.objects.bulk_update(
+                    list(self._orders.values()), ['quantity', 'status', 'transaction_fee']
+                )
+            if self._company_sales:
+                Stocks.objects.filter(id__in=self._company_sales).update(
+                    available_shares=F('available_shares') - Case(
+                        *[When(id=sid, then=Value(qty)) for sid, qty in self._company_sales.items()],
+                        output_field=IntegerField(),
+                    )
+                )
+            self._apply_portfolios()
+            self._apply_positions()
+            self._record_traded_amounts(trades)
+            candles = self._apply_candles()
+
+            surveillance_pipeline.publish(trades)
+            self._queue_notifications()
+            transaction.on_commit(notification_dispatcher.wake)
+            transaction.on_commit(market_summary.mark_dirty)
+            fills = self.fills
+            transaction.on_commit(lambda: market_data.publish_fills(fills, candles))
+
+        self.fills = []
+        self._orders = {}
+        self._company_sales = defaultdict(int)
+        return trades
+
+    def _create_trades(self, Trade):
+        rows = []
+        for fill in self.fills:
+            fill.trade_buyer = Trade(
+                user=fill.buy_order.user,
+                stock=fill.buy_order.stock,
+                order=fill.buy_order,
+                quantity=fill.quantity,
+                price=fill.price,
+                transaction_fee=fill.fee_buyer,
+            )
+            rows.append(fill.trade_buyer)
+            if fill.sell_order:
+                fill.trade_seller = Trade(
+                    user=fill.sell_order.user,
+                    stock=fill.sell_order.stock,
+                    order=fill.sell_order,
+                    quantity=fill.quantity,
+                    price=fill.price,
+                    transaction_fee=fill.fee_seller,
+                )
+                rows.append(fill.trade_seller)
+        return Trade.objects.bulk_create(rows)
+
+    def _create_audit_rows(self):
+        rows = []
+        for fill in self.fills:
+            buy_order, sell_order = fill.buy_order, fill.sell_order
+            if sell_order:
+                seller_user = sell_order.user
+                seller_username = seller_user.username
+            else:
+                seller_user = None
+                seller_username = buy_order.stock.company.company_name
+
+            # Buyer Audit Trail
+            rows.append(TransactionAuditTrail(
+                event_type='TradeExecuted',
+                order=buy_order,
+                trade=fill.trade_buyer,
+                details={
+                    'trade_type': 'Buyer',
+                    'buyer_id': buy_order.user.id,
+                    'buyer_username': buy_order.user.username,
+                    'seller_id': seller_user.id if seller_user else None,
+                    'seller_username': seller_username,
+                    'stock_id': buy_order.stock.id,
+                    'stock_symbol': buy_order.stock.ticker_symbol,
+                    'quantity': fill.quantity,
+                    'price_per_share': str(fill.price),
+                    'total_cost': str(fill.total_cost),
+                    'transaction_fee': str(fill.fee_buyer),
+                    'remaining_quantity': fill.buyer_remaining,
+                }
+            ))
+            if sell_order:
+                # Seller Audit Trail
+                rows.append(TransactionAuditTrail(
+                    event_type='TradeExecuted',
+                    order=sell_order,
+                    trade=fill.trade_seller,
+                    details={
+                        'trade_type': 'Seller',
+                        'buyer_id': buy_order.user.id,
+                        'buyer_username': buy_order.user.username,
+                        'seller_id': sell_order.user.id,
+                        'seller_username': sell_order.user.username,
+                        'stock_id': sell_order.stock.id,
+                        'stock_symbol': sell_order.stock.ticker_symbol,
+                        'quantity': fill.quantity,
+                        'price_per_share': str(fill.price),
+                        'total_proceeds': str(fill.total_cost),
+                        'transaction_fee': str(fill.fee_seller),
+                        'remaining_quantity': fill.seller_remaining,
+                    }
+                ))
+        TransactionAuditTrail.objects.bulk_create(rows)
+
+    def _apply_balances(self):
+        deltas = defaultdict(Decimal)
+        for fill in self.fills:
+            deltas[fill.buy_order.user_id] += fill.buyer_delta
+            if fill.sell_order:
+                deltas[fill.sell_order.user_id] += fill.seller_delta
+
+        User.objects.filter(id__in=deltas).update(
+            account_balance=F('account_balance') + Case(
+                *[When(id=uid, then=Value(delta)) for uid, delta in deltas.items()],
+                output_field=DecimalField(max_digits=15, decimal_places=2),
+            )
+        )
+
+        # Read the settled balances back and replay the fills backwards so each
+        # fill knows the balance right after it (used by the notifications),
+        # and in-memory user objects don't carry stale balances.
+        balances = dict(User.objects.filter(id__in=deltas).values_list('id', 'account_balance'))
+        running = dict(balances)
+        for fill in reversed(self.fills):
+            if fill.sell_order:
+                fill.seller_balance = running[fill.sell_order.user_id]
+                running[fill.sell_order.user_id] -= fill.seller_delta
+            fill.buyer_balance = running[fill.buy_order.user_id]
+            running[fill.buy_order.user_id] -= fill.buyer_delta
+        for fill in self.fills:
+            fill.buy_order.user.account_balance = balances[fill.buy_order.user_id]
+            if fill.sell_order:
+                fill.sell_order.user.account_balance = balances[fill.sell_order.user_id]
+
+    def _apply_portfolios(self):
+        from stocks.models import UsersPortfolio  # Inline import to avoid circular dependency
+
+        user_ids = {f.buy_order.user_id for f in self.fills}
+        user_ids |= {f.sell_order.user_id for f in self.fills if f.sell_order}
+        UsersPortfolio.objects.bulk_create(
+            [UsersPortfolio(user_id=uid) for uid in user_ids], ignore_conflicts=True
+        )
+        portfolios = {
+            p.user_id: p for p in UsersPortfolio.objects.select_for_update().filter(user_id__in=user_ids)
+        }
+
+        # Same per-fill arithmetic (and order: seller, then buyer) as a
+        # sequence of individual trades would have applied
+        for fill in self.fills:
+            if fill.sell_order:
+                _apply_portfolio_change(portfolios[fill.sell_order.user_id], fill.quantity, fill.price, is_buy=False)
+            _apply_portfolio_change(portfolios[fill.buy_order.user_id], fill.quantity, fill.price, is_buy=True)
+
+        UsersPortfolio.objects.bulk_update(
+            list(portfolios.values()), ['quantity', 'total_investment', 'average_purchase_price']
+        )
+
+    def _apply_positions(self):
+        keys = {(f.buy_order.user_id, f.buy_order.stock_id) for f in self.fills}
+        keys |= {(f.sell_order.user_id, f.sell_order.stock_id) for f in self.fills if f.sell_order}
+        Position.objects.bulk_create(
+            [Position(user_id=user_id, stock_id=stock_id) for user_id, stock_id in keys],
+            ignore_conflicts=True,
+        )
+        user_ids = {user_id for user_id, _ in keys}
+        stock_ids = {stock_id for _, stock_id in keys}
+        positions = {
+            (p.user_id, p.stock_id): p
+            for p in Position.objects.select_for_update().filter(user_id__in=user_ids, stock_id__in=stock_ids)
+            if (p.user_id, p.stock_id) in keys
+        }
+
+        for fill in self.fills:
+            if fill.sell_order:
+                positions[(fill.sell_order.user_id, fill.sell_order.stock_id)].apply_fill(
+                    fill.quantity, fill.price, is_buy=False
+                )
+            positions[(fill.buy_order.user_id, fill.buy_order.stock_id)].apply_fill(
+                fill.quantity, fill.price, is_buy=True
+            )
+
+        Position.objects.bulk_update(
+            list(positions.values()), ['quantity', 'cost_basis', 'realized_pnl', 'updated_at']
+        )
+
+    def _apply_candles(self):
+        # One tick per execution: the buyer's side of each fill
+        return record_trades(
+            (fill.trade_buyer.stock_id, fill.trade_buyer.trade_time, fill.price, fill.quantity)
+            for fill in self.fills
+        )
+
+    @staticmethod
+    def _record_traded_amounts(trades):
+        amounts = defaultdict(Decimal)
+        for trade in trades:
+            amounts[(trade.user_id, localdate(trade.trade_time))] += trade.quantity * Decimal(trade.price)
+        DailyTradingCounter.record_traded_amounts(amounts)
+
+    def _queue_notifications(self):
+        rows = []
+        for fill in self.fills:
+            buy_order, sell_order = fill.buy_order, fill.sell_order
+            rows += order_execution_notifications(
+                buy_order.user, "Buy", buy_order.stock.ticker_symbol,
+                fill.quantity, fill.price, fill.buyer_balance,
+            )
+            if sell_order:
+                rows += order_execution_notifications(
+                    sell_order.user, "Sell", sell_order.stock.ticker_symbol,
+                    fill.quantity, fill.price, fill.seller_balance,
+                )
+        NotificationOutbox.objects.bulk_create(rows)
+
+
+def _apply_portfolio_change(portfolio, quantity, price, is_buy):
+    quantity = int(quantity)  # Ensure quantity is integer
+    price = Decimal(price)
+    if is_buy:
+        portfolio.quantity += quantity
+        portfolio.total_investment += quantity * price
+        if portfolio.quantity > 0:
+            portfolio.average_purchase_price = (portfolio.total_investment / portfolio.quantity).quantize(Decimal('0.01'))
+    else:
+        portfolio.quantity -= quantity
+        # We subtract from total_investment based on the average purchase price,
+        # not the current trade price, to keep consistent cost basis.
+        portfolio.total_investment -= quantity * portfolio.average_purchase_price
+        if portfolio.quantity > 0:
+            portfolio.average_purchase_price = (portfolio.total_investment / portfolio.quantity).quantize(Decimal('0.01'))
+        else:
+            portfolio.average_purchase_price = Decimal('0.00')
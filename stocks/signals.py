@@ -0,0 +1,27 @@
+# stocks/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .market_summary import market_summary
+from .models import Dividend, ListedCompany, Stocks
+
+
+@receiver([post_save, post_delete], sender=Dividend)
+def refresh_summary_on_dividend(sender, **kwargs):
+    # Dividend amounts, ratios and the profit balances credited with them
+    transaction.on_commit(market_summary.mark_dirty)
+
+
+@receiver(post_save, sender=ListedCompany)
+@receiver(post_save, sender=Stocks)
+def refresh_summary_on_listing(sender, created=False, **kwargs):
+    if created:
+        transaction.on_commit(market_summary.mark_dirty)
+
+
+@receiver(post_delete, sender=ListedCompany)
+@receiver(post_delete, sender=Stocks)
+def refresh_summary_on_delisting(sender, **kwargs):
+    transaction.on_commit(market_summary.mark_dirty)
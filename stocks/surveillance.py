@@ -1,82 +1,314 @@
 # stocks/surveillance_utils.py
 
+import bisect
 import logging
+import queue
+import threading
+import time
 from decimal import Decimal
 from django.apps import apps
 from django.conf import settings
+from django.db import close_old_connections, transaction
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Avg, Sum, Count
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+
+from stocks.models_suspicious import SurveillanceCheckpoint
 
 logger = logging.getLogger(__name__)
 
-def detect_suspicious_trade(trade):
-    """
-    Flags a trade as suspicious based on defined criteria without blocking the transaction.
-    """
-    logger.debug(f"Starting suspicious trade detection for Trade ID: {trade.id}")
 
+def _thresholds():
     # Load thresholds from settings or define default values
     thresholds = getattr(settings, 'SUSPICIOUS_TRADE_THRESHOLDS', {})
-    volume_ratio = thresholds.get('unusual_volume_ratio', 0.1)           # 10%
-    price_deviation = thresholds.get('price_deviation', 0.2)            # ±20%
-    freq_threshold = thresholds.get('trade_frequency_threshold', 2)      # More than 1 trade (i.e., 2 or more)
-    freq_minutes = thresholds.get('trade_frequency_minutes', 10)         # within 10 minutes
+    return (
+        thresholds.get('unusual_volume_ratio', 0.1),        # 10%
+        thresholds.get('price_deviation', 0.2),             # ±20%
+        thresholds.get('trade_frequency_threshold', 2),     # More than 1 trade (i.e., 2 or more)
+        thresholds.get('trade_frequency_minutes', 10),      # within 10 minutes
+    )
 
-    logger.debug(f"Thresholds - Volume Ratio: {volume_ratio}, Price Deviation: {price_deviation}, "
-                 f"Frequency Threshold: {freq_threshold}, Frequency Minutes: {freq_minutes}")
 
-    # Get models
-    TradeModel = apps.get_model('stocks', 'Trade')
-    SuspiciousActivityModel = apps.get_model('stocks', 'SuspiciousActivity')
+class _StockState:
+    """
+    Running aggregates for one stock plus, per user, the sorted trade times
+    that still fall inside the frequency window.
+    """
 
-    reasons = []
-
-    # --- 1) Unusual Trade Volume ---
-    stock = trade.stock
-    total_traded = TradeModel.objects.filter(stock=stock).aggregate(Sum('quantity'))['quantity__sum'] or 0
-    market_float = stock.available_shares + total_traded
-    logger.debug(f"Stock: {stock.ticker_symbol}, Total Traded: {total_traded}, Market Float: {market_float}")
-
-    if market_float > 0:
-        threshold_volume = volume_ratio * market_float
-        logger.debug(f"Threshold Volume: {threshold_volume}, Trade Quantity: {trade.quantity}")
-        if trade.quantity > threshold_volume:
-            reasons.append(
-                f"Unusually high volume: {trade.quantity} exceeds {volume_ratio*100:.0f}% "
-                f"of market float ({threshold_volume:.0f})."
-            )
-            logger.debug("Unusual volume condition met.")
-
-    # --- 2) Price Manipulation ---
-    avg_price = TradeModel.objects.filter(stock=stock).aggregate(Avg('price'))['price__avg']
-    logger.debug(f"Average Price for {stock.ticker_symbol}: {avg_price}")
-    if avg_price and avg_price > 0:
-        upper_limit = (Decimal('1') + Decimal(price_deviation)) * Decimal(avg_price)
-        lower_limit = (Decimal('1') - Decimal(price_deviation)) * Decimal(avg_price)
-        logger.debug(f"Price Limits - Lower: {lower_limit}, Upper: {upper_limit}, Trade Price: {trade.price}")
-        if not (lower_limit <= trade.price <= upper_limit):
-            reasons.append(
-                f"Potential price manipulation: Trade price {trade.price} deviates > "
-                f"{price_deviation*100:.0f}% from avg {avg_price:.2f}."
-            )
-            logger.debug("Price manipulation condition met.")
-
-    # --- 3) Frequent Trader Activity ---
-    time_threshold = timezone.now() - timedelta(minutes=freq_minutes)
-    recent_trades_count = TradeModel.objects.filter(
-        user=trade.user,
-        stock=stock,
-        trade_time__gte=time_threshold
-    ).count()
-    logger.debug(f"Recent Trades Count: {recent_trades_count} within last {freq_minutes} minutes.")
-
-    if recent_trades_count >= freq_threshold:
-        reasons.append(
-            f"High trading frequency: {recent_trades_count} trades of {stock.ticker_symbol} "
-            f"in the last {freq_minutes} minutes."
+    def __init__(self, stock_id):
+        self.stock_id = stock_id
+        self.lock = threading.RLock()
+        self.total_quantity = 0
+        self.trade_count = 0
+        self.price_sum = Decimal('0')
+        self.notional = Decimal('0')
+        self.trade_times = {}       # user_id -> sorted list of trade_time
+        self.synced_to = 0          # every trade with id <= synced_to is accounted for
+        self.local_ids = set()      # trades observed here with id > synced_to
+        self.last_sync = time.monotonic()
+        self.last_checkpoint = time.monotonic()
+
+    @property
+    def avg_price(self):
+        return self.price_sum / self.trade_count if self.trade_count else None
+
+    @property
+    def vwap(self):
+        return self.notional / self.total_quantity if self.total_quantity else None
+
+    def apply(self, user_id, quantity, price, trade_time):
+        price = Decimal(price)
+        self.total_quantity += quantity
+        self.trade_count += 1
+        self.price_sum += price
+        self.notional += quantity * price
+        bisect.insort(self.trade_times.setdefault(user_id, []), trade_time)
+
+    def recent_trades(self, user_id, since, until):
+        times = self.trade_times.get(user_id)
+        if not times:
+            return 0
+        # Trades of a stock are checked in order, so what is older than this
+        # window has aged out for good
+        expired = bisect.bisect_left(times, since)
+        if expired:
+            del times[:expired]
+        if not times:
+            del self.trade_times[user_id]
+            return 0
+        return bisect.bisect_right(times, until)
+
+
+class SurveillanceEngine:
+    """
+    Keeps the figures the surveillance rules need in memory, so checking a
+    trade no longer aggregates the stock's whole trade history.
+
+    Per stock it keeps the running traded volume, the mean trade price (the
+    rule's reference price), the VWAP, and per-user sliding windows of trade
+    times. State is seeded lazily from the stock's SurveillanceCheckpoint plus
+    the trades recorded after it. Every `sync_interval_seconds` it replays
+    trades committed by other processes, and every
+    `checkpoint_interval_seconds` it writes the checkpoint back.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _config():
+        config = getattr(settings, 'SURVEILLANCE_ENGINE', {})
+        return config.get('sync_interval_seconds', 5), config.get('checkpoint_interval_seconds', 60)
+
+    def _state(self, stock_id, before_id=None):
+        with self._lock:
+            state = self._states.get(stock_id)
+            if state is None:
+                state = self._states[stock_id] = self._seed(stock_id, before_id)
+            return state
+
+    def invalidate(self, stock_id=None):
+        """Drop in-memory state (e.g. after a rolled back settlement) so it is reseeded."""
+        with self._lock:
+            if stock_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(stock_id, None)
+
+    # ------------------ Seeding / syncing -------------------
+    def _seed(self, stock_id, before_id=None):
+        """
+        Build a stock's state from its checkpoint and the trades after it. When
+        seeding for a trade about to be checked, stop just before it so that
+        trade (and the ones after it) are applied in order by check().
+        """
+        TradeModel = apps.get_model('stocks', 'Trade')
+        state = _StockState(stock_id)
+
+        checkpoint = SurveillanceCheckpoint.objects.filter(stock_id=stock_id).first()
+        if checkpoint:
+            state.total_quantity = checkpoint.total_quantity
+            state.trade_count = checkpoint.trade_count
+            state.price_sum = checkpoint.price_sum
+            state.notional = checkpoint.notional
+            state.synced_to = checkpoint.last_trade_id
+
+        trades = TradeModel.objects.filter(stock_id=stock_id)
+        if before_id is not None:
+            trades = trades.filter(id__lt=before_id)
+
+        tail = trades.filter(id__gt=state.synced_to).aggregate(
+            quantity_sum=Sum('quantity'),
+            trade_count=Count('id'),
+            price_sum=Sum('price'),
+            notional_sum=Sum(ExpressionWrapper(
+                F('quantity') * F('price'), output_field=DecimalField(max_digits=28, decimal_places=2)
+            )),
+            max_id=Max('id'),
+        )
+        if tail['trade_count']:
+            state.total_quantity += tail['quantity_sum']
+            state.trade_count += tail['trade_count']
+            state.price_sum += Decimal(tail['price_sum'])
+            state.notional += Decimal(tail['notional_sum'])
+            state.synced_to = tail['max_id']
+
+        *_, freq_minutes = _thresholds()
+        recent = trades.filter(
+            id__lte=state.synced_to,
+            trade_time__gte=timezone.now() - timedelta(minutes=freq_minutes),
+        ).order_by('trade_time').values_list('user_id', 'trade_time')
+        for user_id, trade_time in recent:
+            state.trade_times.setdefault(user_id, []).append(trade_time)
+
+        logger.info(
+            f"Surveillance state for stock {stock_id} seeded up to trade {state.synced_to} "
+            f"({state.trade_count} trades)."
+        )
+        return state
+
+    def _sync(self, state):
+        """Replay trades other processes committed since the last sync."""
+        TradeModel = apps.get_model('stocks', 'Trade')
+        new_rows = TradeModel.objects.filter(
+            stock_id=state.stock_id, id__gt=state.synced_to
+        ).order_by('id').values_list('id', 'user_id', 'quantity', 'price', 'trade_time')
+        for trade_id, user_id, quantity, price, trade_time in new_rows:
+            if trade_id not in state.local_ids:
+                state.apply(user_id, quantity, price, trade_time)
+            state.synced_to = max(state.synced_to, trade_id)
+        if state.local_ids:
+            state.synced_to = max(state.synced_to, max(state.local_ids))
+        state.local_ids.clear()
+        state.last_sync = time.monotonic()
+
+    def checkpoint(self, state):
+        self._sync(state)
+        SurveillanceCheckpoint.objects.update_or_create(
+            stock_id=state.stock_id,
+            defaults={
+                'last_trade_id': state.synced_to,
+                'total_quantity': state.total_quantity,
+                'trade_count': state.trade_count,
+                'price_sum': state.price_sum,
+                'notional': state.notional,
+            },
+        )
+        state.last_checkpoint = time.monotonic()
+
+    def _maintain(self, state):
+        sync_interval, checkpoint_interval = self._config()
+        now = time.monotonic()
+        if now - state.last_checkpoint >= checkpoint_interval:
+            self.checkpoint(state)
+        elif now - state.last_sync >= sync_interval:
+            self._sync(state)
+
+    # ------------------ Checking -------------------
+    def check(self, event):
+        """
+        Account for a newly recorded trade (a TradeEvent) and return the
+        reasons, if any, it is suspicious, using the same rules and
+        thresholds as before. The frequency window ends at the trade's own
+        trade_time, so a check that runs late gives the same answer.
+        """
+        volume_ratio, price_deviation, freq_threshold, freq_minutes = _thresholds()
+        state = self._state(event.stock_id, before_id=event.id)
+
+        with state.lock:
+            self._maintain(state)
+            if event.id > state.synced_to and event.id not in state.local_ids:
+                state.apply(event.user_id, event.quantity, event.price, event.trade_time)
+                state.local_ids.add(event.id)
+
+            reasons = []
+
+            # --- 1) Unusual Trade Volume ---
+            market_float = event.available_shares + state.total_quantity
+            logger.debug(f"Stock: {event.ticker_symbol}, Total Traded: {state.total_quantity}, Market Float: {market_float}")
+            if market_float > 0:
+                threshold_volume = volume_ratio * market_float
+                if event.quantity > threshold_volume:
+                    reasons.append(
+                        f"Unusually high volume: {event.quantity} exceeds {volume_ratio*100:.0f}% "
+                        f"of market float ({threshold_volume:.0f})."
+                    )
+
+            # --- 2) Price Manipulation ---
+            avg_price = state.avg_price
+            logger.debug(f"Average Price for {event.ticker_symbol}: {avg_price}, VWAP: {state.vwap}")
+            if avg_price and avg_price > 0:
+                upper_limit = (Decimal('1') + Decimal(price_deviation)) * avg_price
+                lower_limit = (Decimal('1') - Decimal(price_deviation)) * avg_price
+                if not (lower_limit <= Decimal(event.price) <= upper_limit):
+                    reasons.append(
+                        f"Potential price manipulation: Trade price {event.price} deviates > "
+                        f"{price_deviation*100:.0f}% from avg {avg_price:.2f}."
+                    )
+
+            # --- 3) Frequent Trader Activity ---
+            time_threshold = event.trade_time - timedelta(minutes=freq_minutes)
+            recent_trades_count = state.recent_trades(event.user_id, time_threshold, event.trade_time)
+            if recent_trades_count >= freq_threshold:
+                reasons.append(
+                    f"High trading frequency: {recent_trades_count} trades of {event.ticker_symbol} "
+                    f"in the last {freq_minutes} minutes."
+                )
+
+        return reasons
+
+
+surveillance_engine = SurveillanceEngine()
+
+
+class TradeEvent:
+    """
+    What surveillance needs to know about a trade, captured when it is
+    settled (including the stock's available_shares at that moment), so it can
+    be evaluated later without touching the ORM objects of the matching path.
+    """
+    __slots__ = (
+        'id', 'stock_id', 'user_id', 'username', 'ticker_symbol', 'available_shares',
+        'quantity', 'price', 'trade_time', 'published_at',
+    )
+
+    def __init__(self, id, stock_id, user_id, username, ticker_symbol, available_shares,
+                 quantity, price, trade_time):
+        self.id = id
+        self.stock_id = stock_id
+        self.user_id = user_id
+        self.username = username
+        self.ticker_symbol = ticker_symbol
+        self.available_shares = available_shares
+        self.quantity = quantity
+        self.price = price
+        self.trade_time = trade_time
+        self.published_at = None
+
+    @classmethod
+    def from_trade(cls, trade):
+        return cls(
+            id=trade.id,
+            stock_id=trade.stock_id,
+            user_id=trade.user_id,
+            username=trade.user.username,
+            ticker_symbol=trade.stock.ticker_symbol,
+            available_shares=trade.stock.available_shares,
+            quantity=trade.quantity,
+            price=trade.price,
+            trade_time=trade.trade_time,
         )
-        logger.debug("Frequent trading activity condition met.")
+
+
+def detect_suspicious_trade(trade):
+    """
+    Flags a trade as suspicious based on defined criteria without blocking the transaction.
+    """
+    logger.debug(f"Starting suspicious trade detection for Trade ID: {trade.id}")
+
+    SuspiciousActivityModel = apps.get_model('stocks', 'SuspiciousActivity')
+    reasons = surveillance_engine.check(TradeEvent.from_trade(trade))
 
     # --- 4) Create SuspiciousActivity if needed ---
     if reasons:
@@ -93,3 +325,137 @@ def detect_suspicious_trade(trade):
             logger.error(f"Failed to create SuspiciousActivity for Trade #{trade.id}: {e}")
     else:
         logger.debug(f"Trade #{trade.id} for user '{trade.user.username}' is NOT suspicious.")
+
+
+class SurveillancePipeline:
+    """
+    Takes surveillance off the order latency path.
+
+    Settlement publishes its trades here. Once the trade transaction commits,
+    they are queued per stock shard (so each stock's trades are evaluated in
+    order by one worker). Workers evaluate them in micro-batches and write the
+    resulting SuspiciousActivity rows with a single bulk_create.
+    A batch is evaluated once it holds `batch_size` trades, or once its
+    oldest trade has waited `max_lag_seconds`, whichever comes first.
+    With SURVEILLANCE_PIPELINE['enabled'] off, trades are checked inline as before.
+    """
+
+    def __init__(self):
+        config = getattr(settings, 'SURVEILLANCE_PIPELINE', {})
+        self.workers = config.get('workers', 2)
+        self.batch_size = config.get('batch_size', 500)
+        self.max_lag = config.get('max_lag_seconds', 1.0)
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled():
+        return getattr(settings, 'SURVEILLANCE_PIPELINE', {}).get('enabled', True)
+
+    def publish(self, trades):
+        """Hand settled trades to surveillance; called inside the trade transaction."""
+        if not self.enabled():
+            for trade in trades:
+                detect_suspicious_trade(trade)
+            return
+        events = [TradeEvent.from_trade(trade) for trade in trades]
+        if events:
+            transaction.on_commit(lambda: self._enqueue(events))
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for shard in range(self.workers):
+                q = queue.Queue()
+                t = threading.Thread(
+                    target=self._run,
+                    args=(q,),
+                    name=f"surveillance-worker-{shard}",
+                    daemon=True,
+                )
+                self._queues.append(q)
+                self._threads.append(t)
+                t.start()
+
+    def _enqueue(self, events):
+        self._ensure_started()
+        now = time.monotonic()
+        for event in events:
+            event.published_at = now
+            self._queues[event.stock_id % self.workers].put(event)
+
+    def drain(self):
+        """Block until every queued trade has been evaluated (for short-lived processes)."""
+        for q in list(self._queues):
+            q.join()
+
+    def backlog(self):
+        """Queue depth per worker and how long the oldest queued trade has been waiting."""
+        now = time.monotonic()
+        depths = []
+        oldest = None
+        for q in self._queues:
+            with q.mutex:
+                depths.append(len(q.queue))
+                if q.queue:
+                    head = q.queue[0].published_at
+                    oldest = head if oldest is None else min(oldest, head)
+        return {
+            'enabled': self.enabled(),
+            'queued_trades': sum(depths),
+            'queued_per_worker': depths,
+            'oldest_lag_seconds': round(now - oldest, 3) if oldest is not None else 0.0,
+            'max_lag_seconds': self.max_lag,
+        }
+
+    def _run(self, q):
+        while True:
+            batch = [q.get()]
+            deadline = batch[0].published_at + self.max_lag
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(q.get(timeout=timeout) if timeout > 0 else q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.process(batch)
+            except Exception as e:
+                logger.error(f"Surveillance failed for a batch of {len(batch)} trades: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    q.task_done()
+
+    @staticmethod
+    def process(events):
+        """Evaluate a micro-batch of trades and store the flags in one statement."""
+        SuspiciousActivityModel = apps.get_model('stocks', 'SuspiciousActivity')
+
+        flagged = []
+        for event in events:
+            reasons = surveillance_engine.check(event)
+            if reasons:
+                flagged.append((event, reasons))
+            else:
+                logger.debug(f"Trade #{event.id} for user '{event.username}' is NOT suspicious.")
+        if not flagged:
+            return []
+
+        records = SuspiciousActivityModel.objects.bulk_create([
+            SuspiciousActivityModel(trade_id=event.id, reason="; ".join(reasons))
+            for event, reasons in flagged
+        ])
+        for record, (event, reasons) in zip(records, flagged):
+            logger.warning(
+                f"SuspiciousActivity #{record.id} created for "
+                f"Trade #{event.id} by user '{event.username}'. Reasons: {reasons}"
+            )
+        return records
+
+
+surveillance_pipeline = SurveillancePipeline()
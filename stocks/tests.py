@@ -1,3 +1,789 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.timezone import localdate
+from rest_framework.exceptions import ValidationError
+
+from regulations.cache import regulation_cache
+from regulations.models import Regulation, WorkingHours
+from . import candles
+from .auction import call_auction, uncrossing_price
+from .consumers import _snapshots
+from .dividend_calculation import distribute_dividend
+from .dividend_jobs import dividend_job_runner
+from .expiry import expire_open_orders
+from .market_data import market_data
+from .models import (
+    AuctionRun, Candle, DailyClosingPrice, DailyTradingCounter, Dividend, DividendDetailedHolding,
+    DividendDistribution, DividendJob, ListedCompany, Orders, Position, Stocks, Trade, TradeRollup,
+    TransactionAuditTrail, UsersPortfolio,
+)
+from .order_book import order_books
+from .rollups import compact, summarize_trades
+from .sequencer import MatchingSequencer
+
+User = get_user_model()
+
+
+class MarketTestCase(TestCase):
+    """A stock traded around the clock, a buyer with cash and a seller holding 300 shares at 100."""
+
+    def setUp(self):
+        for day, _ in WorkingHours.DAYS_OF_WEEK:
+            WorkingHours.objects.create(
+                day_of_week=day, start_time=datetime.time(0, 0), end_time=datetime.time(23, 59, 59)
+            )
+        # Process-wide state keyed by ids that are reused once a test rolls back
+        regulation_cache.invalidate()
+        order_books.invalidate()
+
+        company = ListedCompany.objects.create(company_name='TechCorp', sector='Tech')
+        self.stock = Stocks.objects.create(
+            company=company, ticker_symbol='TCH', total_shares=100000,
+            available_shares=0, current_price=Decimal('100.00'),
+        )
+        self.buyer = self.make_user('buyer', Decimal('100000.00'))
+        self.seller = self.make_user('seller', Decimal('100000.00'))
+        Position.objects.create(user=self.seller, stock=self.stock, quantity=300, cost_basis=Decimal('30000.00'))
+        UsersPortfolio.objects.create(
+            user=self.seller, quantity=300, total_investment=Decimal('30000.00'),
+            average_purchase_price=Decimal('100.00'),
+        )
+
+    @staticmethod
+    def make_user(username, balance):
+        user = User.objects.create(username=username, email=f'{username}@example.com')
+        # New traders are given a starting balance on creation
+        User.objects.filter(id=user.id).update(account_balance=balance)
+        user.account_balance = balance
+        return user
+
+    def place(self, user, order_type, action, quantity, price=None):
+        order = Orders(
+            user=User.objects.get(id=user.id), stock=Stocks.objects.get(id=self.stock.id),
+            stock_symbol=self.stock.ticker_symbol, order_type=order_type, action=action,
+            price=price, quantity=quantity,
+        )
+        order.save()
+        order.refresh_from_db()
+        return order
+
+    def balance(self, user):
+        return User.objects.get(id=user.id).account_balance
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class ContinuousMatchingTests(MarketTestCase):
+
+    def test_limit_buy_never_fills_above_its_price(self):
+        expensive = self.place(self.seller, 'Limit', 'Sell', 50, Decimal('105.00'))
+        cheap = self.place(self.seller, 'Limit', 'Sell', 40, Decimal('101.00'))
+
+        buy = self.place(self.buyer, 'Limit', 'Buy', 120, Decimal('104.00'))
+
+        self.assertEqual(list(Trade.objects.filter(order=buy).values_list('price', flat=True)), [Decimal('101.00')])
+        self.assertEqual((buy.status, buy.quantity), ('Partially Completed', 80))
+        cheap.refresh_from_db()
+        expensive.refresh_from_db()
+        self.assertEqual(cheap.status, 'Fully Completed')
+        self.assertEqual((expensive.status, expensive.quantity), ('Pending', 50))
+
+    def test_resting_order_repriced_elsewhere_is_rechecked(self):
+        sell = self.place(self.seller, 'Limit', 'Sell', 40, Decimal('101.00'))
+        # Another process raises the price; this process's book still holds 101
+        Orders.objects.filter(id=sell.id).update(price=Decimal('110.00'))
+
+        buy = self.place(self.buyer, 'Limit', 'Buy', 40, Decimal('104.00'))
+
+        self.assertFalse(Trade.objects.exists())
+        self.assertEqual((buy.status, buy.quantity), ('Pending', 40))
+        self.assertEqual(order_books.get(self.stock.id).best_ask(), Decimal('110.00'))
+
+    def test_orders_written_by_other_processes_are_picked_up(self):
+        self.place(self.seller, 'Limit', 'Sell', 10, Decimal('101.00'))  # loads the book
+        # Rows saved elsewhere never reach this process's book directly
+        _, remote_cancelled = Orders.objects.bulk_create([
+            Orders(user=self.seller, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Sell', price=Decimal('100.00'), quantity=20),
+            Orders(user=self.seller, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Sell', price=Decimal('99.00'), quantity=20, status='Cancelled'),
+        ])
+
+        buy = self.place(self.buyer, 'Limit', 'Buy', 20, Decimal('104.00'))
+
+        self.assertEqual(buy.status, 'Fully Completed')
+        self.assertEqual(list(Trade.objects.filter(order=buy).values_list('price', flat=True)), [Decimal('100.00')])
+        self.assertNotIn(remote_cancelled.id, order_books.get(self.stock.id))
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class MatchingSequencerTests(MarketTestCase):
+
+    def test_order_cancelled_while_queued_is_not_matched(self):
+        self.place(self.seller, 'Limit', 'Sell', 10, Decimal('101.00'))
+        buy = Orders(
+            user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+            action='Buy', price=Decimal('101.00'), quantity=10,
+        )
+        buy.save(defer_matching=True)
+        # The worker read the row before the cancel committed
+        Orders.objects.filter(id=buy.id).update(status='Cancelled')
+
+        Orders.match_and_execute_orders(buy, refresh=True)
+
+        self.assertFalse(Trade.objects.exists())
+        self.assertNotIn(buy.id, order_books.get(self.stock.id))
+
+    def test_recovery_matches_orders_left_in_a_lost_queue(self):
+        # Stored by a process that died before its sequencer matched them
+        Orders.objects.bulk_create([
+            Orders(user=self.seller, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Sell', price=Decimal('100.00'), quantity=10),
+            Orders(user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Buy', price=Decimal('102.00'), quantity=10),
+        ])
+
+        MatchingSequencer(workers=1)._recover(0)
+
+        self.assertEqual(list(Trade.objects.values_list('price', flat=True)), [Decimal('100.00')] * 2)
+        self.assertFalse(Orders.objects.filter(status='Pending').exists())
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class SettlementTests(MarketTestCase):
+
+    def test_partial_fills_settle_like_individual_trades(self):
+        """
+        Expected values are the per-fill arithmetic of the old settlement
+        path: 50 @ 101 then 20 @ 102, each charging both sides a 1% fee.
+        """
+        first = self.place(self.seller, 'Limit', 'Sell', 50, Decimal('101.00'))
+        second = self.place(self.seller, 'Limit', 'Sell', 40, Decimal('102.00'))
+
+        buy = self.place(self.buyer, 'Limit', 'Buy', 70, Decimal('104.00'))
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((buy.status, buy.quantity, buy.transaction_fee), ('Fully Completed', 0, Decimal('70.90')))
+        self.assertEqual((first.status, first.quantity, first.transaction_fee), ('Fully Completed', 0, Decimal('50.50')))
+        self.assertEqual(
+            (second.status, second.quantity, second.transaction_fee), ('Partially Completed', 20, Decimal('20.40'))
+        )
+        self.assertEqual(
+            list(Trade.objects.order_by('id').values_list('user__username', 'quantity', 'price', 'transaction_fee')),
+            [
+                ('buyer', 50, Decimal('101.00'), Decimal('50.50')),
+                ('seller', 50, Decimal('101.00'), Decimal('50.50')),
+                ('buyer', 20, Decimal('102.00'), Decimal('20.40')),
+                ('seller', 20, Decimal('102.00'), Decimal('20.40')),
+            ],
+        )
+        self.assertEqual(TransactionAuditTrail.objects.filter(event_type='TradeExecuted').count(), 4)
+
+        # 100000 - (5050 + 50.50) - (2040 + 20.40) and 100000 + (5050 - 50.50) + (2040 - 20.40)
+        self.assertEqual(self.balance(self.buyer), Decimal('92839.10'))
+        self.assertEqual(self.balance(self.seller), Decimal('107019.10'))
+
+        buyer_position = Position.objects.get(user=self.buyer, stock=self.stock)
+        self.assertEqual((buyer_position.quantity, buyer_position.cost_basis), (70, Decimal('7090.00')))
+        seller_position = Position.objects.get(user=self.seller, stock=self.stock)
+        self.assertEqual(
+            (seller_position.quantity, seller_position.cost_basis, seller_position.realized_pnl),
+            (230, Decimal('23000.00'), Decimal('90.00')),
+        )
+        portfolio = UsersPortfolio.objects.get(user=self.buyer)
+        self.assertEqual(
+            (portfolio.quantity, portfolio.total_investment, portfolio.average_purchase_price),
+            (70, Decimal('7090.00'), Decimal('101.29')),
+        )
+
+        today = localdate()
+        self.assertEqual(DailyTradingCounter.for_day(self.buyer.id, today), (1, Decimal('7090.00')))
+        self.assertEqual(DailyTradingCounter.for_day(self.seller.id, today), (2, Decimal('7090.00')))
+
+    def test_execute_trade_settles_a_single_company_fill(self):
+        buy = self.place(self.buyer, 'Limit', 'Buy', 10, Decimal('100.00'))
+
+        trade_buyer, trade_seller = Trade.execute_trade(buy, None, 10, Decimal('100.00'))
+
+        self.assertIsNone(trade_seller)
+        self.assertEqual((trade_buyer.quantity, trade_buyer.transaction_fee), (10, Decimal('10.00')))
+        self.assertEqual(self.balance(self.buyer), Decimal('98990.00'))
+        self.assertEqual(Position.objects.get(user=self.buyer, stock=self.stock).quantity, 10)
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class DailyTradingCounterTests(MarketTestCase):
+
+    def test_orders_beyond_the_daily_limit_are_rejected(self):
+        Regulation.objects.create(name="Daily Trade Limit", value="2")
+        regulation_cache.invalidate()
+        self.place(self.buyer, 'Limit', 'Buy', 1, Decimal('90.00'))
+        self.place(self.buyer, 'Limit', 'Buy', 1, Decimal('90.00'))
+
+        with self.assertRaisesMessage(ValidationError, "Daily trade limit reached."):
+            self.place(self.buyer, 'Limit', 'Buy', 1, Decimal('90.00'))
+        self.assertEqual(Orders.objects.filter(user=self.buyer).count(), 2)
+
+    def test_migration_backfills_todays_counters(self):
+        self.place(self.seller, 'Limit', 'Sell', 10, Decimal('101.00'))
+        self.place(self.buyer, 'Limit', 'Buy', 10, Decimal('101.00'))
+        self.place(self.buyer, 'Limit', 'Buy', 5, Decimal('90.00'))
+        # As on the day the counters were deployed
+        DailyTradingCounter.objects.all().delete()
+
+        migration = importlib.import_module('stocks.migrations.0033_backfill_trading_counters')
+        migration.backfill_todays_counters(apps, None)
+
+        today = localdate()
+        self.assertEqual(DailyTradingCounter.for_day(self.buyer.id, today), (2, Decimal('1010.00')))
+        self.assertEqual(DailyTradingCounter.for_day(self.seller.id, today), (1, Decimal('1010.00')))
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class DividendDistributionTests(MarketTestCase):
+
+    def test_payouts_sum_exactly_to_the_declared_amount(self):
+        Stocks.objects.filter(id=self.stock.id).update(available_shares=30)
+        holders = [self.make_user(f'holder{n}', Decimal('10000.00')) for n in range(3)]
+        for holder in holders:
+            self.place(holder, 'Limit', 'Buy', 10, Decimal('100.00'))
+        Trade.objects.update(trade_time=timezone.make_aware(datetime.datetime(2024, 8, 1, 10, 0)))
+        # budget_year is parsed as 'YYYY/YY', longer than the column allows outside SQLite
+        dividend = Dividend.objects.create(
+            company=self.stock.company, budget_year='2024',
+            dividend_ratio=Decimal('0'), total_dividend_amount=Decimal('100.00'),
+        )
+
+        with mock.patch(
+            'stocks.dividend_calculation._get_fiscal_year_dates',
+            return_value=(datetime.date(2024, 7, 1), datetime.date(2025, 6, 30)),
+        ):
+            distribute_dividend(dividend.id)
+
+        # Equal holders: 33.33 each plus the one cent left over
+        amounts = sorted(DividendDistribution.objects.filter(dividend=dividend).values_list('amount', flat=True))
+        self.assertEqual(amounts, [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+        self.assertEqual(
+            User.objects.filter(id__in=[h.id for h in holders]).aggregate(total=Sum('profit_balance'))['total'],
+            Decimal('100.00'),
+        )
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class DividendJobTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Stocks.objects.filter(id=self.stock.id).update(available_shares=100)
+        self.holders = [self.make_user('holder1', Decimal('10000.00')), self.make_user('holder2', Decimal('10000.00'))]
+        self.place(self.holders[0], 'Limit', 'Buy', 60, Decimal('100.00'))
+        self.place(self.holders[1], 'Limit', 'Buy', 40, Decimal('100.00'))
+        # Held long enough before the financial year end to be eligible
+        Trade.objects.update(trade_time=timezone.make_aware(datetime.datetime(2025, 1, 15, 10, 0)))
+
+        self.dividend = Dividend.objects.create(
+            company=self.stock.company, budget_year='2025',
+            dividend_ratio=Decimal('0'), total_dividend_amount=Decimal('1000.00'),
+        )
+        self.job = DividendJob.objects.create(dividend=self.dividend, stock=self.stock, current_price=Decimal('100.00'))
+
+    def profits(self):
+        return list(User.objects.filter(id__in=[u.id for u in self.holders]).order_by('id').values_list(
+            'profit_balance', flat=True
+        ))
+
+    def test_dividend_job_pays_exactly_once(self):
+        job = dividend_job_runner.run(self.job.id)
+
+        self.assertEqual((job.status, job.credited_users), ('Completed', 2))
+        self.dividend.refresh_from_db()
+        self.assertEqual(self.dividend.status, 'Disbursed')
+        paid = self.profits()
+        self.assertEqual(paid, [Decimal('600.00'), Decimal('400.00')])
+
+        # Finished jobs are not claimed again
+        self.assertEqual(dividend_job_runner.run(self.job.id).status, 'Completed')
+        self.assertEqual(self.profits(), paid)
+
+        # A job left Running by a worker presumed dead is reclaimed, but the dividend is not paid twice
+        DividendJob.objects.filter(id=self.job.id).update(
+            status='Running', started_at=timezone.now() - datetime.timedelta(days=1)
+        )
+        self.assertEqual(dividend_job_runner.run(self.job.id).status, 'Completed')
+        self.assertEqual(self.profits(), paid)
+
+    def test_running_job_is_not_claimed_twice(self):
+        DividendJob.objects.filter(id=self.job.id).update(status='Running', started_at=timezone.now())
+
+        job = dividend_job_runner.run(self.job.id)
+
+        self.assertEqual((job.status, job.credited_users), ('Running', 0))
+        self.assertEqual(self.profits(), [Decimal('0.00'), Decimal('0.00')])
+
+    def test_rows_of_another_run_are_never_paid(self):
+        DividendJob.objects.filter(id=self.job.id).update(
+            status='Running', started_at=timezone.now() - datetime.timedelta(days=1), run_token='0' * 32
+        )
+        write_chunk = dividend_job_runner._write_chunk
+
+        def write_chunk_alongside_slow_run(job, rows, processed):
+            # The run presumed dead is only slow, and writes its rows at the same time
+            DividendDetailedHolding.objects.create(
+                dividend=self.dividend, user=self.holders[0], username='holder1', stock_symbol='TCH',
+                price=Decimal('100.00'), quantity=60, transaction_fee=Decimal('60.00'),
+                total_buying_price=Decimal('6000.00'), weighted_value=Decimal('2745.21'),
+                dividend_eligible='Yes', trade_time=timezone.now(), paid_dividend=Decimal('600.00'),
+                run_token='0' * 32,
+            )
+            return write_chunk(job, rows, processed)
+
+        with mock.patch.object(dividend_job_runner, '_write_chunk', side_effect=write_chunk_alongside_slow_run):
+            job = dividend_job_runner.run(self.job.id)
+
+        self.assertEqual(job.status, 'Completed')
+        self.assertEqual(self.profits(), [Decimal('600.00'), Decimal('400.00')])
+        self.assertEqual(
+            set(DividendDetailedHolding.objects.filter(dividend=self.dividend).values_list('run_token', flat=True)),
+            {job.run_token},
+        )
+
+    def test_failed_rerun_keeps_the_rows_the_dividend_was_paid_from(self):
+        dividend_job_runner.run(self.job.id)
+        DividendJob.objects.filter(id=self.job.id).update(
+            status='Running', started_at=timezone.now() - datetime.timedelta(days=1)
+        )
+
+        with mock.patch('stocks.dividend_jobs.iter_net_buy_lots', side_effect=RuntimeError('boom')):
+            job = dividend_job_runner.run(self.job.id)
+
+        self.assertEqual(job.status, 'Failed')
+        self.assertEqual(DividendDetailedHolding.objects.filter(dividend=self.dividend).count(), 2)
+        self.assertEqual(self.profits(), [Decimal('600.00'), Decimal('400.00')])
+
+
+class TradeRollupTests(MarketTestCase):
+    """summarize_trades over compacted rollups must match the raw Trade table at every edge."""
+
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.make_aware(datetime.datetime(2025, 3, 10))
+        buy, sell = Orders.objects.bulk_create([
+            Orders(user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Buy', price=Decimal('101.00'), quantity=0, status='Fully Completed'),
+            Orders(user=self.seller, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Sell', price=Decimal('101.00'), quantity=0, status='Fully Completed'),
+        ])
+        trades = []
+        # Hours from midnight of self.day, on and around hour, day and watermark boundaries
+        for n, hours in enumerate([-0.5, 0, 9.25, 10, 10, 23.99, 24, 37.75, 48, 56.5, 57.1]):
+            when = self.at(hours)
+            price = Decimal('100.00') + n
+            trades.append(Trade(user=self.buyer, stock=self.stock, order=buy, quantity=n + 1, price=price,
+                                transaction_fee=Decimal('1.00'), trade_time=when))
+            trades.append(Trade(user=self.seller, stock=self.stock, order=sell, quantity=n + 1, price=price,
+                                transaction_fee=Decimal('1.00'), trade_time=when))
+        Trade.objects.bulk_create(trades)
+
+    def at(self, hours):
+        return self.day + datetime.timedelta(hours=hours)
+
+    @staticmethod
+    def expected(start, end):
+        totals = {}
+        for trade in Trade.objects.filter(trade_time__gte=start, trade_time__lte=end).select_related('order'):
+            bucket = totals.setdefault(trade.order.action, {'count': 0, 'quantity': 0, 'value': Decimal('0.00')})
+            bucket['count'] += 1
+            bucket['quantity'] += trade.quantity
+            bucket['value'] += trade.quantity * trade.price
+        return totals
+
+    def assertSummaryMatches(self, start, end):
+        summary = {
+            action: {key: bucket[key] for key in ('count', 'quantity', 'value')}
+            for action, bucket in summarize_trades(start, end).items()
+        }
+        self.assertEqual(summary, self.expected(start, end), f"{start} -> {end}")
+
+    def test_rollups_and_raw_edges_add_up_to_the_trade_table(self):
+        ranges = [
+            (self.at(0), self.at(48)),        # whole days, both ends on a trade
+            (self.at(-1), self.at(60)),       # past the watermark
+            (self.at(9.25), self.at(10)),     # inside one day, ends on hour boundaries
+            (self.at(9.5), self.at(37.75)),   # partial hours at both edges
+            (self.at(23.99), self.at(24)),    # across midnight
+            (self.at(56), self.at(57)),       # the hour the watermark falls in
+        ]
+        for start, end in ranges:
+            self.assertSummaryMatches(start, end)
+
+        compact(until=self.at(57.5))
+        self.assertTrue(TradeRollup.objects.filter(granularity='day').exists())
+        for start, end in ranges:
+            self.assertSummaryMatches(start, end)
+
+    def test_compacted_hours_are_read_from_the_rollups(self):
+        compact(until=self.at(57.5))
+        # Rows removed from compacted hours are still counted; the edges are read raw
+        Trade.objects.filter(trade_time=self.at(24)).delete()
+
+        summary = summarize_trades(self.at(0), self.at(48))
+
+        self.assertEqual(summary['Buy']['count'], 8)
+        self.assertEqual(self.expected(self.at(0), self.at(48))['Buy']['count'], 7)
+
+
+class CandleTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        start = timezone.make_aware(datetime.datetime(2025, 3, 10, 9, 0, 10))
+        # (seconds after 09:00:10, price, quantity); the last falls in the next 5m bar
+        ticks = [(0, '100', 5), (20, '104', 1), (40, '98', 2), (180, '101', 3), (300, '99', 4)]
+        self.ticks = [
+            (self.stock.id, start + datetime.timedelta(seconds=seconds), Decimal(price), quantity)
+            for seconds, price, quantity in ticks
+        ]
+
+    def bar(self, resolution, hour, minute):
+        return Candle.objects.values_list('open', 'high', 'low', 'close', 'volume', 'trade_count').get(
+            stock=self.stock, resolution=resolution,
+            start=timezone.make_aware(datetime.datetime(2025, 3, 10, hour, minute)),
+        )
+
+    def snapshot(self):
+        return set(Candle.objects.values_list(
+            'resolution', 'start', 'open', 'high', 'low', 'close', 'volume', 'trade_count'
+        ))
+
+    def test_record_trades_merges_into_existing_bars(self):
+        candles.record_trades(self.ticks[:2])
+        candles.record_trades(self.ticks[2:])
+
+        self.assertEqual(self.bar('1m', 9, 0), (Decimal('100'), Decimal('104'), Decimal('98'), Decimal('98'), 8, 3))
+        self.assertEqual(self.bar('1m', 9, 3), (Decimal('101'),) * 4 + (3, 1))
+        self.assertEqual(self.bar('5m', 9, 0), (Decimal('100'), Decimal('104'), Decimal('98'), Decimal('101'), 11, 4))
+        self.assertEqual(self.bar('5m', 9, 5), (Decimal('99'),) * 4 + (4, 1))
+        self.assertEqual(self.bar('1h', 9, 0), (Decimal('100'), Decimal('104'), Decimal('98'), Decimal('99'), 15, 5))
+        self.assertEqual(self.bar('1d', 0, 0), self.bar('1h', 9, 0))
+
+    def test_backfill_rebuilds_the_recorded_candles(self):
+        buy, sell = Orders.objects.bulk_create([
+            Orders(user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Buy', price=Decimal('104.00'), quantity=0, status='Fully Completed'),
+            Orders(user=self.seller, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Sell', price=Decimal('98.00'), quantity=0, status='Fully Completed'),
+        ])
+        # Both sides of each execution, as settlement writes them; candles count the buyer's side
+        Trade.objects.bulk_create([
+            Trade(user=user, stock=self.stock, order=order, quantity=quantity, price=price, trade_time=trade_time)
+            for _, trade_time, price, quantity in self.ticks
+            for user, order in ((self.buyer, buy), (self.seller, sell))
+        ])
+        candles.record_trades(self.ticks)
+        recorded = self.snapshot()
+        Candle.objects.filter(resolution='1m').update(volume=0)  # drifted
+
+        written = candles.backfill(stock_ids=[self.stock.id])
+
+        self.assertEqual(written, len(recorded))
+        self.assertEqual(self.snapshot(), recorded)
+
+
+
+class ClosingPriceTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Orders.objects.create(
+            user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+            action='Buy', price=Decimal('110.00'), quantity=0, status='Fully Completed',
+        )
+
+    def trade(self, day, hour, minute, price):
+        return Trade.objects.create(
+            user=self.buyer, stock=self.stock, order=self.order, quantity=1, price=Decimal(price),
+            trade_time=timezone.make_aware(datetime.datetime(2025, 3, day, hour, minute)),
+        )
+
+    def closes(self):
+        return dict(DailyClosingPrice.objects.filter(stock=self.stock).values_list('date', 'closing_price'))
+
+    def update(self):
+        call_command('update_closing_prices', start='2025-03-10', end='2025-03-12', chunk_days=1, stdout=io.StringIO())
+
+    def test_close_is_the_days_last_trade(self):
+        self.trade(10, 15, 0, '103.00')
+        self.trade(10, 9, 30, '101.00')  # inserted later, traded earlier
+        self.trade(11, 23, 59, '99.00')
+        self.trade(11, 23, 59, '98.50')  # same instant: the later row closes the day
+
+        self.update()
+
+        self.assertEqual(self.closes(), {
+            datetime.date(2025, 3, 10): Decimal('103.00'),
+            datetime.date(2025, 3, 11): Decimal('98.50'),
+        })
+
+    def test_rerunning_upserts_in_place(self):
+        self.trade(10, 15, 0, '103.00')
+        self.update()
+        self.update()
+        self.assertEqual(DailyClosingPrice.objects.count(), 1)
+
+        self.trade(10, 16, 0, '104.00')
+        self.update()
+
+        self.assertEqual(self.closes(), {datetime.date(2025, 3, 10): Decimal('104.00')})
+
+
+class OrderExpiryTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        orders = Orders.objects.bulk_create([
+            Orders(user=self.seller, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                   action='Sell', price=Decimal('101.00') + n, quantity=10, status=status)
+            for n, status in enumerate(['Pending', 'Partially Completed', 'Fully Completed',
+                                        'Pending', 'Cancelled', 'Pending', 'Pending'])
+        ])
+        self.open_ids = [order.id for order in orders if order.status in ('Pending', 'Partially Completed')]
+
+    def test_open_orders_are_cancelled_in_chunks_with_an_audit_row_each(self):
+        with mock.patch.object(market_data, 'publish_book') as publish_book, \
+                CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            cancelled = expire_open_orders(chunk_size=2)
+
+        self.assertEqual(cancelled, 5)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "stocks_orders"')]
+        self.assertEqual(len(updates), 3)
+        expired = Orders.objects.filter(id__in=self.open_ids).values_list('status', flat=True)
+        self.assertEqual(set(expired), {'Cancelled'})
+        self.assertEqual(Orders.objects.filter(status='Fully Completed').count(), 1)
+        audit = TransactionAuditTrail.objects.filter(event_type='OrderStatusChanged').order_by('order_id')
+        self.assertEqual([row.order_id for row in audit], self.open_ids)
+        self.assertEqual(audit[1].details, {
+            'reason': 'end_of_day', 'previous_status': 'Partially Completed', 'new_status': 'Cancelled',
+            'action': 'Sell', 'order_type': 'Limit', 'remaining_quantity': 10, 'price': '102.00',
+        })
+        # No book is resident: the depth is still marked, without a quote
+        publish_book.assert_called_with(self.stock.id, 'TCH', None)
+
+    def test_cancel_pending_orders_pushes_the_depth_before_exiting(self):
+        with mock.patch.object(market_data, 'flush') as flush, self.captureOnCommitCallbacks(execute=True):
+            call_command('cancel_pending_orders', force=True, stdout=io.StringIO())
+
+        flush.assert_called_once_with()
+        self.assertFalse(Orders.objects.filter(status__in=['Pending', 'Partially Completed']).exists())
+
+
+@override_settings(CALL_AUCTION={'enabled': False})
+class RecrossTests(MarketTestCase):
+
+    def test_crossed_book_trades_as_if_orders_arrived_one_by_one(self):
+        # Queued while matching was paused: rows written without matching, in arrival order
+        sell_low, sell_high, buy, bid = [
+            Orders.objects.bulk_create([Orders(
+                user=user, stock=self.stock, stock_symbol='TCH', order_type='Limit',
+                action=action, price=Decimal(price), quantity=quantity,
+            )])[0]
+            for user, action, price, quantity in [
+                (self.seller, 'Sell', '101.00', 10),
+                (self.seller, 'Sell', '103.00', 20),
+                (self.buyer, 'Buy', '104.00', 25),
+                (self.buyer, 'Buy', '100.00', 5),
+            ]
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Orders.recross_book(self.stock.id)
+
+        # The buy takes the asks resting before it, at their prices
+        self.assertEqual(
+            list(Trade.objects.filter(order=buy).order_by('id').values_list('price', 'quantity')),
+            [(Decimal('101.00'), 10), (Decimal('103.00'), 15)],
+        )
+        rows = {order_id: rest for order_id, *rest in Orders.objects.values_list('id', 'status', 'quantity')}
+        self.assertEqual(rows[sell_low.id], ['Fully Completed', 0])
+        self.assertEqual(rows[sell_high.id], ['Partially Completed', 5])
+        self.assertEqual(rows[buy.id], ['Fully Completed', 0])
+        self.assertEqual(rows[bid.id], ['Pending', 5])
+        book = order_books.get(self.stock.id)
+        self.assertEqual((book.best_bid(), book.best_ask()), (Decimal('100.00'), Decimal('103.00')))
+
+
+class CallAuctionTests(MarketTestCase):
+
+    def test_uncrossing_price_maximizes_volume(self):
+        bids = [(Decimal('105'), 100), (Decimal('103'), 50), (None, 20)]
+        asks = [(Decimal('100'), 60), (Decimal('102'), 80), (Decimal('104'), 40)]
+
+        # 140 shares trade at both 102 and 103 with the same imbalance; 102 is closer to the reference
+        result = uncrossing_price(bids, asks, Decimal('101'))
+
+        self.assertEqual((result.price, result.volume, result.imbalance), (Decimal('102'), 140, 30))
+        self.assertIsNone(uncrossing_price([(Decimal('99'), 10)], [(Decimal('100'), 10)], Decimal('100')))
+
+    def test_auction_executes_everything_at_the_uncrossing_price(self):
+        with mock.patch.object(call_auction, 'is_collecting', return_value=True):
+            big_bid = self.place(self.buyer, 'Limit', 'Buy', 60, Decimal('103.00'))
+            low_bid = self.place(self.buyer, 'Limit', 'Buy', 40, Decimal('101.00'))
+            low_ask = self.place(self.seller, 'Limit', 'Sell', 50, Decimal('100.00'))
+            high_ask = self.place(self.seller, 'Limit', 'Sell', 30, Decimal('102.00'))
+        self.assertFalse(Trade.objects.exists())
+
+        run = Orders.run_call_auction(self.stock.id, 'open', localdate())
+
+        self.assertEqual((run.price, run.volume, run.imbalance, run.fill_count), (Decimal('102.00'), 60, -20, 2))
+        self.assertEqual(set(Trade.objects.values_list('price', flat=True)), {Decimal('102.00')})
+        for order in (big_bid, low_bid, low_ask, high_ask):
+            order.refresh_from_db()
+        self.assertEqual(big_bid.status, 'Fully Completed')
+        self.assertEqual((low_bid.status, low_bid.quantity), ('Pending', 40))
+        self.assertEqual(low_ask.status, 'Fully Completed')
+        self.assertEqual((high_ask.status, high_ask.quantity), ('Partially Completed', 20))
+
+        # A second run of the same session is a no-op
+        self.assertEqual(Orders.run_call_auction(self.stock.id, 'open', localdate()).id, run.id)
+        self.assertEqual(AuctionRun.objects.count(), 1)
+        self.assertEqual(Trade.objects.count(), 4)
+
+
+@override_settings(CALL_AUCTION={'enabled': False}, MARKET_DATA={'enabled': False})
+class MarketDataSnapshotTests(MarketTestCase):
+
+    def test_snapshot_quote_is_the_top_of_its_depth(self):
+        self.place(self.buyer, 'Limit', 'Buy', 10, Decimal('99.00'))
+        self.place(self.buyer, 'Limit', 'Buy', 5, Decimal('99.00'))
+        self.place(self.buyer, 'Limit', 'Buy', 20, Decimal('98.00'))
+        self.place(self.seller, 'Limit', 'Sell', 30, Decimal('101.00'))
+        order_books.invalidate()  # Subscribers are mostly served by processes that never matched the stock
+
+        [snapshot] = _snapshots.func({'TCH': self.stock.id})
+
+        self.assertEqual(
+            (snapshot['bid'], snapshot['bid_size'], snapshot['ask'], snapshot['ask_size']),
+            ('99.00', 15, '101.00', 30),
+        )
+        self.assertEqual(snapshot['depth']['bids'][0], {'price': '99.00', 'quantity': 15, 'orders': 2})
+
+
+@override_settings(CALL_AUCTION={'enabled': False}, MARKET_DATA={'enabled': True, 'depth_levels': 10})
+class DepthSequencingTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sent = []
+        # Pushes happen only when the test flushes, and land in self.sent
+        for patcher in (
+            mock.patch.object(market_data, '_ensure_started'),
+            mock.patch.object(market_data, '_send', lambda layer, stock_id, message: self.sent.append(message)),
+            mock.patch('stocks.market_data.get_channel_layer', return_value=object()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        market_data.flush()
+        self.sent.clear()
+
+    def depth(self):
+        response = self.client.get(f'/api/stocks/stocks/{self.stock.id}/depth/')
+        self.assertEqual(response.status_code, 200)
+        return {key: response.data[key] for key in ('seq', 'bids', 'asks')}
+
+    def deltas(self):
+        market_data.flush()
+        deltas = [message for message in self.sent if message['type'] == 'depth']
+        self.sent.clear()
+        return deltas
+
+    def test_deltas_follow_the_snapshot_in_sequence(self):
+        self.assertEqual(self.depth(), {'seq': 0, 'bids': [], 'asks': []})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place(self.seller, 'Limit', 'Sell', 10, Decimal('101.00'))
+            self.place(self.seller, 'Limit', 'Sell', 5, Decimal('101.00'))
+            bid = self.place(self.buyer, 'Limit', 'Buy', 20, Decimal('99.00'))
+        # The GET only reads: the change waits for the publisher
+        self.assertEqual(self.depth()['seq'], 0)
+        self.assertFalse(self.sent)
+
+        self.assertEqual(self.deltas(), [{
+            'type': 'depth', 'ticker': 'TCH', 'seq': 1,
+            'bids': [{'price': '99.00', 'quantity': 20, 'orders': 1}],
+            'asks': [{'price': '101.00', 'quantity': 15, 'orders': 2}],
+        }])
+        self.assertEqual(self.depth(), {
+            'seq': 1,
+            'bids': [{'price': '99.00', 'quantity': 20, 'orders': 1}],
+            'asks': [{'price': '101.00', 'quantity': 15, 'orders': 2}],
+        })
+
+        # Cancelled in a process that never loaded the book
+        order_books.invalidate()
+        bid.status = 'Cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            bid.save()
+
+        self.assertEqual(self.deltas(), [{
+            'type': 'depth', 'ticker': 'TCH', 'seq': 2,
+            'bids': [{'price': '99.00', 'quantity': 0, 'orders': 0}], 'asks': [],
+        }])
+        self.assertEqual(self.deltas(), [])
+        self.assertEqual(self.depth()['seq'], 2)
+
+
+class ListPaginationTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()  # Anonymous request throttle
+        start = timezone.make_aware(datetime.datetime(2025, 3, 10, 9, 0))
+        self.orders = Orders.objects.bulk_create([
+            Orders(user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit', action='Buy',
+                   price=Decimal('90.00'), quantity=10, created_at=start + datetime.timedelta(minutes=n))
+            for n in range(5)
+        ])
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_cursor_pages_newest_first_without_shifting(self):
+        first = self.get('/api/stocks/orders/?page_size=2')
+        # A new order arriving between pages lands before the cursor, not on the next page
+        Orders.objects.bulk_create([Orders(
+            user=self.buyer, stock=self.stock, stock_symbol='TCH', order_type='Limit', action='Buy',
+            price=Decimal('90.00'), quantity=10, created_at=timezone.make_aware(datetime.datetime(2025, 3, 10, 10, 0)),
+        )])
+        second = self.get(first['next'])
+        third = self.get(second['next'])
+
+        pages = [[order['id'] for order in page['results']] for page in (first, second, third)]
+        ids = [order.id for order in self.orders]
+        self.assertEqual(pages, [[ids[4], ids[3]], [ids[2], ids[1]], [ids[0]]])
+        self.assertIsNone(third['next'])
+
+    def test_lists_stay_unpaginated_unless_asked(self):
+        self.assertEqual(len(self.get('/api/stocks/orders/')), 5)
+
+    def test_fields_selects_and_serializes_only_those_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            page = self.get('/api/stocks/orders/?page_size=10&fields=id,status')
+
+        self.assertEqual(page['results'][0], {'id': self.orders[-1].id, 'status': 'Pending'})
+        [select] = [q['sql'] for q in queries.captured_queries if 'FROM "stocks_orders"' in q['sql']]
+        self.assertNotIn('"stocks_orders"."price"', select)
+        self.assertEqual(self.client.get('/api/stocks/orders/?fields=id,nope').status_code, 400)
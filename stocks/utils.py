@@ -1,6 +1,6 @@
 # utils.py
 from django.utils.timezone import localtime
-from regulations.models import WorkingHours  # Import from the regulations app
+from regulations.cache import regulation_cache  # Import from the regulations app
 
 def is_within_working_hours(current_time):
     """
@@ -9,8 +9,8 @@ def is_within_working_hours(current_time):
     current_day = current_time.strftime('%A')  # e.g., 'Monday'
     current_hour = current_time.time()
 
-    try:
-        working_hours = WorkingHours.objects.get(day_of_week=current_day)
-        return working_hours.start_time <= current_hour <= working_hours.end_time
-    except WorkingHours.DoesNotExist:
+    working_hours = regulation_cache.working_hours(current_day)
+    if working_hours is None:
         return False  # If working hours are not defined for the day, consider it as outside working hours
+    start_time, end_time = working_hours
+    return start_time <= current_hour <= end_time
@@ -1,14 +1,20 @@
-from django.db.models import F, Sum, DecimalField, FloatField, ExpressionWrapper
+from django.db.models import F, Sum, DecimalField, ExpressionWrapper
 from collections import defaultdict
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+import csv
 import datetime  # <-- Use standard library datetime
+import io
+import json
 import logging
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.forms import ValidationError
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from django.db.models import Sum, F, Q, DecimalField, ExpressionWrapper, Avg
+from django.db.models import Sum, F, Q, DecimalField, ExpressionWrapper
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.timezone import make_aware, now, localtime, localdate
 
 from rest_framework import viewsets, status, generics
@@ -17,15 +23,24 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied
 
+from ethio_stock_simulation.pagination import KeysetPagination, list_response
+from ethio_stock_simulation.projection import ProjectionMixin
 from stocks import permissions, serializers
+from stocks.candles import RESOLUTIONS
 from stocks.dividend_calculation import distribute_dividend
+from stocks.holdings import HoldingsInconsistencyError, days_stayed, iter_net_buy_lots
+from stocks.market_data import market_data
+from stocks.market_summary import market_summary
+from stocks.rollups import summarize_trades
 from stocks.models_audit import TransactionAuditTrail
 from stocks.permissions import IsRegulator, IsRegulatorUser, IsTrader
 
 from .models import (
+    Candle,
     Disclosure, 
     DividendDetailedHolding, 
     DividendDistribution, 
@@ -34,11 +49,16 @@ from .models import (
     Stocks, 
     Orders, 
     Trade, 
-    Dividend
+    Dividend,
+    DividendJob,
+    Position
 )
 from .serializers import (
+    CandleSerializer,
     DirectStockPurchaseSerializer,
     DisclosureSerializer,
+    DividendDeclarationSerializer,
+    DividendJobSerializer,
     DividendDetailedHoldingSerializer,
     DividendDistributionSerializer,
     RegulatorDividendSerializer,
@@ -59,6 +79,7 @@ from .serializers import (
 
 from .models_suspicious import SuspiciousActivity
 from .serializers import SuspiciousActivitySerializer
+from .surveillance import surveillance_pipeline
 from regulations.models import StockSuspension
 
 logger = logging.getLogger(__name__)
@@ -92,17 +113,108 @@ class StocksViewSet(viewsets.ModelViewSet):
     queryset = Stocks.objects.select_related('company').all()
     serializer_class = StocksSerializer
 
-class OrdersViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def candles(self, request, pk=None):
+        """
+        GET /stocks/<id>/candles/?resolution=1h&start=2025-01-01&end=2025-01-31T12:00&limit=500
+        OHLCV bars in ascending time. resolution is one of 1m, 5m, 1h, 1d
+        (default 1d); start/end are ISO dates or datetimes and bound the bar
+        start times. Without start, the latest `limit` bars are returned.
+        """
+        params = request.query_params
+        resolution = params.get('resolution', '1d')
+        if resolution not in RESOLUTIONS:
+            return Response({"error": f"'resolution' must be one of {', '.join(RESOLUTIONS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(params.get('limit', 500))
+            if not 0 < limit <= 5000:
+                raise ValueError
+            start = self._parse_candle_time(params.get('start'))
+            end = self._parse_candle_time(params.get('end'))
+        except ValueError:
+            return Response({"error": "Invalid 'start', 'end' or 'limit' (1-5000) parameter."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        candles = Candle.objects.filter(stock_id=pk, resolution=resolution)
+        if start:
+            candles = candles.filter(start__gte=start)
+        if end:
+            candles = candles.filter(start__lte=end)
+        if start:
+            candles = list(candles.order_by('start')[:limit])
+        else:
+            candles = list(candles.order_by('-start')[:limit])[::-1]
+        return Response(CandleSerializer(candles, many=True).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def depth(self, request, pk=None):
+        """
+        GET /stocks/<id>/depth/?levels=10
+        Aggregated price levels (price, quantity, order count), best first, as
+        of depth delta `seq` of the ws/market/ stream: apply the deltas
+        numbered after it to keep the book in sync. levels defaults to, and is
+        capped at, MARKET_DATA['depth_levels'].
+        """
+        stock = self.get_object()
+        max_levels = market_data.depth_levels()
+        try:
+            levels = int(request.query_params.get('levels', max_levels))
+            if not 0 < levels <= max_levels:
+                raise ValueError
+        except ValueError:
+            return Response({"error": f"'levels' must be between 1 and {max_levels}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        snapshot = market_data.depth_snapshot(stock.id, stock.ticker_symbol, levels)
+        return Response({'ticker': stock.ticker_symbol, **snapshot}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _parse_candle_time(value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+        if timezone.is_naive(parsed):
+            parsed = make_aware(parsed, timezone.get_current_timezone())
+        return parsed
+
+class OrdersViewSet(ProjectionMixin, viewsets.ModelViewSet):
+    """
+    Lists take `?fields=a,b` and, with `?page_size=N` or `?cursor=`, are
+    paginated newest first (see KeysetPagination).
+    """
     queryset = Orders.objects.all()
     serializer_class = OrdersSerializer
+    pagination_class = KeysetPagination
+    cursor_ordering = '-created_at'
 
     def create(self, request, *args, **kwargs):
         """
         Create a new order and automatically execute matching orders.
+
+        With MATCHING_SEQUENCER enabled the order is acknowledged as soon as it
+        is stored and matched by the stock's sequencer worker; the fill result
+        is then available from GET /orders/<id>/.
         """
-        serializer = self.get_serializer(data=request.data)
+        sequenced = getattr(settings, 'MATCHING_SEQUENCER', {}).get('enabled', False)
+        serializer = self.get_serializer(
+            data=request.data,
+            context={**self.get_serializer_context(), 'defer_matching': sequenced}
+        )
         serializer.is_valid(raise_exception=True)
         order = serializer.save()  # Automatically triggers matching logic
+        if sequenced:
+            return Response(
+                {
+                    "message": "Order accepted and queued for matching.",
+                    "order": serializer.data
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
         return Response(
             {
                 "message": "Order created and matching executed successfully.",
@@ -124,9 +236,15 @@ class TraderOrdersView(APIView):
         serializer = OrdersSerializer(orders, many=True)
         return Response(serializer.data)
 
-class TradeViewSet(viewsets.ModelViewSet):
+class TradeViewSet(ProjectionMixin, viewsets.ModelViewSet):
+    """
+    Lists take `?fields=a,b` and, with `?page_size=N` or `?cursor=`, are
+    paginated newest first (see KeysetPagination).
+    """
     queryset = Trade.objects.all()
     serializer_class = TradeSerializer
+    pagination_class = KeysetPagination
+    cursor_ordering = '-trade_time'
 
 
 class UserOrdersView(APIView):
@@ -135,8 +253,7 @@ class UserOrdersView(APIView):
     def get(self, request):
         # Fetch orders belonging to the logged-in user
         orders = Orders.objects.filter(user=request.user)
-        serializer = OrdersSerializer(orders, many=True)
-        return Response(serializer.data)
+        return list_response(request, orders, OrdersSerializer, ordering='-created_at')
 
 class UserTradesView(APIView):
     permission_classes = [IsAuthenticated]
@@ -144,8 +261,7 @@ class UserTradesView(APIView):
     def get(self, request):
         # Fetch trades belonging to the logged-in user
         trades = Trade.objects.filter(user=request.user)
-        serializer = TradeSerializer(trades, many=True)
-        return Response(serializer.data)
+        return list_response(request, trades, TradeSerializer, ordering='-trade_time')
 
 # class DividendViewSet(viewsets.ModelViewSet):
 #     queryset = Dividend.objects.all()
@@ -166,6 +282,35 @@ class DividendViewSet(viewsets.ModelViewSet):
         dividend = serializer.save()
         # serializer.save() will do all the ratio logic & set status to Disbursed
         return Response(self.get_serializer(dividend).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='declare')
+    def declare(self, request):
+        """
+        POST /dividends/declare/
+        Server-side declaration: only company, budget_year and total_dividend_amount
+        (optionally stock_id and current_price) are posted; holdings are computed
+        and paid out in the background. Poll the returned job for progress.
+        """
+        serializer = DividendDeclarationSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        dividend = serializer.save()
+        return Response(
+            {
+                "message": "Dividend declared; holdings are being computed.",
+                "dividend": DividendSerializer(dividend).data,
+                "job": DividendJobSerializer(serializer.job).data,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9]+)')
+    def job_status(self, request, job_id=None):
+        """
+        GET /dividends/jobs/<job_id>/
+        Progress of a server-side dividend declaration.
+        """
+        job = get_object_or_404(DividendJob, id=job_id)
+        return Response(DividendJobSerializer(job).data, status=status.HTTP_200_OK)
     
     
 class DirectStockPurchaseView(APIView):
@@ -366,17 +511,20 @@ class UserTradesWithOrderInfoView(APIView):
         return Response(serializer.data, status=200)
     
 # for audit trail
-class TransactionAuditTrailViewSet(viewsets.ReadOnlyModelViewSet):
+class TransactionAuditTrailViewSet(ProjectionMixin, viewsets.ReadOnlyModelViewSet):
     """
-    A simple ViewSet for viewing transaction audit trails.
+    A simple ViewSet for viewing transaction audit trails. Paginated pages
+    go by id, which follows the (nullable) timestamp.
     """
     queryset = TransactionAuditTrail.objects.all().order_by('-timestamp')
     serializer_class = TransactionAuditTrailSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-id'
     
     
 #susupicious activity 
-class SuspiciousActivityViewSet(viewsets.ModelViewSet):
+class SuspiciousActivityViewSet(ProjectionMixin, viewsets.ModelViewSet):
     """
     ViewSet for listing/creating/updating suspicious activities.
     Access restricted to 'regulator' role only.
@@ -384,6 +532,8 @@ class SuspiciousActivityViewSet(viewsets.ModelViewSet):
     queryset = SuspiciousActivity.objects.all().order_by('-flagged_at')
     serializer_class = SuspiciousActivityDetailSerializer
     permission_classes = [IsRegulatorUser]  # Only 'regulator' role can access
+    pagination_class = KeysetPagination
+    cursor_ordering = '-flagged_at'
 
     @action(detail=True, methods=['post'], url_path='suspend-trader')
     def suspend_trader(self, request, pk=None):
@@ -423,6 +573,14 @@ class SuspiciousActivityViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    @action(detail=False, methods=['get'], url_path='backlog')
+    def backlog(self, request):
+        """
+        GET /suspicious-activities/backlog/
+        How many settled trades are still waiting for surveillance, and for how long.
+        """
+        return Response(surveillance_pipeline.backlog(), status=status.HTTP_200_OK)
+
 class DistributeDividendView(APIView):
     """
     POST /api/stocks/dividends/<dividend_id>/distribute/
@@ -454,13 +612,15 @@ class DistributeDividendView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class DividendDistributionViewSet(viewsets.ReadOnlyModelViewSet):
+class DividendDistributionViewSet(ProjectionMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing Dividend Distributions.
     """
     queryset = DividendDistribution.objects.all().order_by('-created_at')
     serializer_class = DividendDistributionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = '-created_at'
     
     def get_queryset(self):
         """
@@ -507,8 +667,18 @@ class StockNetHoldingsView(APIView):
     API View to retrieve net BUY holdings for a given stock_id, after FIFO
     subtraction of SELL trades. Returns only the leftover 'Buy' trades with
     correct quantities, plus weighted_value and dividend_eligible calculations.
+
+    Without paging parameters the full list is returned as before. With
+    `?page_size=N` (users per page) and/or `?after_user_id=ID` the response is
+    streamed as {"results": [...], "next_after_user_id": ID or null}, emitting
+    each user's lots as soon as they are finalized; pass next_after_user_id
+    back as after_user_id to fetch the next page. `?stream=true` streams the
+    whole stock in that format.
     """
     permission_classes = [IsAuthenticated]  # Ensure only authenticated users can access
+    default_page_size = 500
+    max_page_size = 5000
+    chunk_size = 2000
 
     def get(self, request, stock_id):
         # 1. Validate the Stock
@@ -517,221 +687,238 @@ class StockNetHoldingsView(APIView):
         except Stocks.DoesNotExist:
             return Response({"error": "Stock not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # 2. Query all trades for this stock, sorted by trade_time ascending
-        trades = Trade.objects.filter(stock=stock).select_related('user', 'stock', 'order').order_by('trade_time')
-
-        # 3. Determine current_price (from query param or database)
+        # 2. Determine current_price (from query param or database)
         current_price_param = request.query_params.get('current_price', None)
         if current_price_param:
             try:
                 current_price = Decimal(current_price_param)
                 if current_price <= 0:
                     raise ValueError
-            except (ValueError, TypeError):
+            except (ValueError, TypeError, InvalidOperation):
                 return Response({"error": "Invalid 'current_price' parameter. It must be a positive number."},
                                 status=status.HTTP_400_BAD_REQUEST)
         else:
             current_price = stock.current_price  # from DB
 
-        # 4. FIFO processing: Track each user's "Buy" trades and subtract "Sells"
-        user_buy_trades_map = defaultdict(list)  # Maps user_id to list of buy trades
-
-        for tr in trades:
-            user_id = tr.user.id
-            action = tr.order.action.lower()
-
-            if action == 'buy':
-                # Append a buy trade with 'remaining_quantity' initialized
-                user_buy_trades_map[user_id].append({
-                    "id": tr.id,
-                    "user_id": user_id,
-                    "username": tr.user.username,
-                    "stock_symbol": tr.stock.ticker_symbol,
-                    "order_type": tr.order.order_type,
-                    "price": tr.price,
-                    "quantity": tr.quantity,
-                    "transaction_fee": tr.transaction_fee,
-                    "trade_time": tr.trade_time,
-                    "remaining_quantity": tr.quantity,  # Initialize remaining_quantity
-                })
-            elif action == 'sell':
-                # Process sell trades by reducing from earliest buy trades (FIFO)
-                sell_qty = tr.quantity
-
-                if not user_buy_trades_map[user_id]:
-                    # User has no buy trades but is trying to sell
-                    return Response(
-                        {"error": f"User {user_id} has sell trades but no corresponding buy trades."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                buy_trades = user_buy_trades_map[user_id]
-                for buy_tr in buy_trades:
-                    if buy_tr["remaining_quantity"] <= 0:
-                        continue  # Skip fully sold buy trades
-
-                    if buy_tr["remaining_quantity"] >= sell_qty:
-                        buy_tr["remaining_quantity"] -= sell_qty
-                        sell_qty = 0
-                        break  # All sell quantity accounted for
-                    else:
-                        sell_qty -= buy_tr["remaining_quantity"]
-                        buy_tr["remaining_quantity"] = 0
-
-                if sell_qty > 0:
-                    # User sold more shares than bought
-                    return Response(
-                        {"error": f"User {user_id} sold more shares than bought. Data inconsistency."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-        # 5. Build final list of "Buy" trades with remaining_quantity > 0
-        results = []
-        for user_id, buy_trades in user_buy_trades_map.items():
-            for buy_tr in buy_trades:
-                remaining_qty = buy_tr["remaining_quantity"]
-                if remaining_qty > 0:
-                    trade_date = buy_tr["trade_time"]
-                    days_stayed = self.calculate_days_stayed(trade_date)
-
-                    weighted_value = (Decimal(days_stayed) / Decimal(365)) * Decimal(remaining_qty) * current_price
-                    weighted_value = weighted_value.quantize(Decimal('0.01'))  # Round to 2 decimal places
-
-                    dividend_eligible = "Yes" if days_stayed >= 10 else "No"
-
-                    total_buying_price = buy_tr["price"] * Decimal(remaining_qty)
-
-                    results.append({
-                        "id": buy_tr["id"],
-                        "user_id": buy_tr["user_id"],
-                        "username": buy_tr["username"],
-                        "stock_symbol": buy_tr["stock_symbol"],
-                        "order_type": buy_tr["order_type"],
-                        "price": f"{buy_tr['price']:.2f}",
-                        "quantity": remaining_qty,
-                        "transaction_fee": f"{buy_tr['transaction_fee']:.2f}",
-                        "trade_time": buy_tr["trade_time"],
-                        "total_buying_price": f"{total_buying_price:.2f}",
-                        "weighted_value": f"{weighted_value:.2f}",
-                        "dividend_eligible": dividend_eligible,
-                    })
-
-        # 6. Serialize and return
-        serializer = TradeWithOrderInfoOutputSerializer(results, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    def calculate_days_stayed(self, trade_date):
-        """
-        Calculate the number of days from trade_date to June 30 of the current financial year,
-        including both the start date and the end date. Logs the result for debugging.
-        """
-        # Ensure trade_date is timezone-aware
-        if timezone.is_naive(trade_date):
-            trade_date = make_aware(trade_date, timezone.get_current_timezone())
-
-        # Define end of financial year based on trade_date
-        year = trade_date.year
-        month = trade_date.month
+        # 3. Paging parameters
+        params = request.query_params
+        paged = 'page_size' in params or 'after_user_id' in params
+        try:
+            after_user_id = int(params['after_user_id']) if 'after_user_id' in params else None
+            page_size = int(params.get('page_size', self.default_page_size)) if paged else None
+            if page_size is not None and not 0 < page_size <= self.max_page_size:
+                raise ValueError
+        except (ValueError, TypeError):
+            return Response(
+                {"error": f"'after_user_id' must be an integer and 'page_size' between 1 and {self.max_page_size}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if month >= 7:
-            fy_end = datetime.datetime(year + 1, 6, 30, tzinfo=datetime.timezone.utc)
-        else:
-            fy_end = datetime.datetime(year, 6, 30, tzinfo=datetime.timezone.utc)
+        lots = iter_net_buy_lots(stock, current_price, after_user_id=after_user_id, chunk_size=self.chunk_size)
 
-        # Calculate difference in days and include both start and end dates
-        delta = fy_end - trade_date.astimezone(datetime.timezone.utc)
-        days_stayed = delta.days + 1  # Add 1 to include both dates
+        if paged or params.get('stream', '').lower() in ('1', 'true', 'yes'):
+            response = StreamingHttpResponse(
+                self._stream_page(lots, page_size), content_type='application/json'
+            )
+            response['Cache-Control'] = 'no-store'
+            return response
 
-        # Clamp the value between 0 and 365 (financial year limit)
-        days_stayed = max(0, min(days_stayed, 365))
+        # 4. Unpaged: the whole list in one response
+        try:
+            results = [self._format_lot(lot) for lot in lots]
+        except HoldingsInconsistencyError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results, status=status.HTTP_200_OK)
 
-        # Log the result
-        print(f"Trade Date: {trade_date}, FY End Date: {fy_end}, Days Stayed: {days_stayed}")
+    def _stream_page(self, lots, page_size):
+        """
+        Yields the JSON envelope piece by piece. A data inconsistency found
+        after the response has started is reported in an "error" key.
+        """
+        yield '{"results": ['
+        users_seen = 0
+        last_user_id = None
+        next_after_user_id = None
+        first = True
+        try:
+            for lot in lots:
+                if lot['user_id'] != last_user_id:
+                    if page_size is not None and users_seen == page_size:
+                        next_after_user_id = last_user_id
+                        break
+                    users_seen += 1
+                    last_user_id = lot['user_id']
+                yield ('' if first else ', ') + json.dumps(self._format_lot(lot), cls=DjangoJSONEncoder)
+                first = False
+        except HoldingsInconsistencyError as e:
+            logger.warning(f"Net holdings stream stopped: {e}")
+            yield '], "next_after_user_id": null, "error": ' + json.dumps(str(e)) + '}'
+            return
+        finally:
+            lots.close()
+        yield '], "next_after_user_id": ' + json.dumps(next_after_user_id) + '}'
+
+    @staticmethod
+    def _format_lot(lot):
+        return TradeWithOrderInfoOutputSerializer({
+            **lot,
+            "price": f"{lot['price']:.2f}",
+            "transaction_fee": f"{lot['transaction_fee']:.2f}",
+            "total_buying_price": f"{lot['total_buying_price']:.2f}",
+            "weighted_value": f"{lot['weighted_value']:.2f}",
+        }).data
 
-        return days_stayed
+    def calculate_days_stayed(self, trade_date):
+        """
+        Calculate the number of days from trade_date to June 30 of the current financial year,
+        including both the start date and the end date.
+        """
+        return days_stayed(trade_date)
 
     
 class UserBalancesView(APIView):
     """
     API endpoint to retrieve each user's current balance and holdings.
     Accessible only to admin users.
+
+    Answered in a constant number of queries: the users, one grouped query of
+    their buy/sell totals and one of their positions. `?page_size=N` and
+    `?after_user_id=ID` page through users by id, returning
+    {"results": [...], "next_after_user_id": ID or null}; `?export=csv`
+    streams every user as CSV (regulators only).
     """
     #permission_classes = [IsAuthenticated, IsAdminUser]  # Ensure only authenticated admin users can access
+    default_page_size = 500
+    max_page_size = 5000
+    export_chunk_size = 1000
 
     def get(self, request, format=None):
-        # Annotate users with total_buy and total_sell
-        users = User.objects.annotate(
-            total_buy=Sum(
-                ExpressionWrapper(
-                    F('trades__quantity') * F('trades__price') + F('trades__transaction_fee'),
-                    output_field=DecimalField(max_digits=20, decimal_places=2)
-                ),
-                filter=Q(trades__order__action='Buy')  # Corrected lookup
-            ),
-            total_sell=Sum(
-                ExpressionWrapper(
-                    F('trades__quantity') * F('trades__price') - F('trades__transaction_fee'),
-                    output_field=DecimalField(max_digits=20, decimal_places=2)
+        params = request.query_params
+        if params.get('export') == 'csv':
+            if not IsRegulatorUser().has_permission(request, self):
+                return Response({"error": "Only regulators can export user balances."},
+                                status=status.HTTP_403_FORBIDDEN)
+            response = StreamingHttpResponse(self._stream_csv(), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="user_balances.csv"'
+            return response
+
+        if 'page_size' not in params and 'after_user_id' not in params:
+            return Response(self._balance_rows(User.objects.only('id', 'username').order_by('id')), status=200)
+
+        try:
+            after_user_id = int(params.get('after_user_id', 0))
+            page_size = int(params.get('page_size', self.default_page_size))
+            if not 0 < page_size <= self.max_page_size:
+                raise ValueError
+        except (ValueError, TypeError):
+            return Response(
+                {"error": f"'after_user_id' must be an integer and 'page_size' between 1 and {self.max_page_size}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        users = list(self._users_after(after_user_id, page_size + 1))
+        has_more = len(users) > page_size
+        users = users[:page_size]
+        return Response({
+            "results": self._balance_rows(users, user_ids=[u.id for u in users]),
+            "next_after_user_id": users[-1].id if has_more else None,
+        }, status=200)
+
+    @staticmethod
+    def _users_after(after_user_id, limit):
+        return User.objects.only('id', 'username').filter(id__gt=after_user_id).order_by('id')[:limit]
+
+    def _balance_rows(self, users, user_ids=None):
+        """
+        Serialized balance rows for `users`. Trade totals and holdings are
+        fetched for `user_ids` only, or for everyone when it is None.
+        """
+        trades = Trade.objects.all()
+        positions = Position.objects.filter(quantity__gt=0)
+        if user_ids is not None:
+            trades = trades.filter(user_id__in=user_ids)
+            positions = positions.filter(user_id__in=user_ids)
+
+        # Buy/sell totals for every user in one grouped query
+        totals = {
+            row['user_id']: row
+            for row in trades.values('user_id').annotate(
+                total_buy=Sum(
+                    ExpressionWrapper(
+                        F('quantity') * F('price') + F('transaction_fee'),
+                        output_field=DecimalField(max_digits=20, decimal_places=2)
+                    ),
+                    filter=Q(order__action='Buy')
                 ),
-                filter=Q(trades__order__action='Sell')  # Corrected lookup
+                total_sell=Sum(
+                    ExpressionWrapper(
+                        F('quantity') * F('price') - F('transaction_fee'),
+                        output_field=DecimalField(max_digits=20, decimal_places=2)
+                    ),
+                    filter=Q(order__action='Sell')
+                )
             )
-        ).all()
+        }
 
-        response_data = []
+        holdings_by_user = defaultdict(list)
+        for user_id, stock_id, stock_symbol, quantity in positions.values_list(
+            'user_id', 'stock_id', 'stock__ticker_symbol', 'quantity'
+        ).order_by('user_id', 'stock_id'):
+            holdings_by_user[user_id].append({
+                'stock_id': stock_id,
+                'stock_symbol': stock_symbol,
+                'quantity': quantity
+            })
 
+        response_data = []
         for user in users:
-            total_buy = user.total_buy if user.total_buy else Decimal('0.00')
-            total_sell = user.total_sell if user.total_sell else Decimal('0.00')
+            user_totals = totals.get(user.id, {})
+            total_buy = user_totals.get('total_buy') or Decimal('0.00')
+            total_sell = user_totals.get('total_sell') or Decimal('0.00')
 
             # Access account_balance and profit_balance via UserProfile
             if hasattr(user, 'profile'):
                 account_balance = user.profile.account_balance
-                profit_balance = user.profile.profit_balance
             else:
                 account_balance = Decimal('0.00')
-                profit_balance = Decimal('0.00')
 
             # Calculate net balance
             net_balance = account_balance - total_buy + total_sell
 
-            # Calculate holdings per stock
-            holdings_queryset = Trade.objects.filter(user_id=user.id).values(
-                'stock_id',
-                'stock__ticker_symbol'
-            ).annotate(
-                total_buys=Sum(
-                    'quantity',
-                    filter=Q(order__action='Buy')
-                ),
-                total_sells=Sum(
-                    'quantity',
-                    filter=Q(order__action='Sell')
-                )
-            ).annotate(
-                net_quantity=F('total_buys') - F('total_sells')
-            ).filter(net_quantity__gt=0)
-
-            holdings_list = [
-                {
-                    'stock_id': holding['stock_id'],
-                    'stock_symbol': holding['stock__ticker_symbol'],
-                    'quantity': holding['net_quantity']
-                }
-                for holding in holdings_queryset
-            ]
-
-            user_data = {
+            response_data.append({
                 'user_id': user.id,
                 'username': user.username,
                 'net_balance': net_balance,
-                'holdings': holdings_list
-            }
-
-            # Serialize the data
-            serialized_user = UserBalanceSerializer(user_data)
-            response_data.append(serialized_user.data)
+                'holdings': holdings_by_user.get(user.id, [])
+            })
 
-        return Response(response_data, status=200)
+        return UserBalanceSerializer(response_data, many=True).data
+
+    def _stream_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return value
+
+        writer.writerow(['user_id', 'username', 'net_balance', 'holdings'])
+        yield flush()
+        after_user_id = 0
+        while True:
+            users = list(self._users_after(after_user_id, self.export_chunk_size))
+            if not users:
+                return
+            for row in self._balance_rows(users, user_ids=[u.id for u in users]):
+                writer.writerow([
+                    row['user_id'],
+                    row['username'],
+                    row['net_balance'],
+                    ';'.join(f"{h['stock_symbol']}:{h['quantity']}" for h in row['holdings']),
+                ])
+            yield flush()
+            after_user_id = users[-1].id
     
 class DividendDetailedHoldingViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -811,142 +998,23 @@ class FinalExtendedDashboardView(APIView):
             "timestamp": timezone.now().isoformat(),
         }
 
-        # Common data: more aggregator reports
-        common_data = self.get_common_data(role)
-        dashboard_data["common_data"] = common_data
+        # Market-wide sections come from one precomputed document per role
+        summary = market_summary.get(role)
+        dashboard_data["common_data"] = summary["common_data"]
 
         # Role-based expansions
         if role == 'trader':
             trader_data = self.get_trader_data(user)
             dashboard_data["trader_data"] = trader_data
         elif role == 'company_admin':
-            admin_data = self.get_company_admin_data(user)
+            admin_data = self.get_company_admin_data(user, summary["company_sales"])
             dashboard_data["company_admin_data"] = admin_data
         elif role == 'regulator':
-            regulator_data = self.get_regulator_data()
+            regulator_data = self.get_regulator_data(summary["regulator_data"])
             dashboard_data["regulator_data"] = regulator_data
 
         return Response(dashboard_data, status=200)
 
-    # ------------------ Common Data & Reports -------------------
-    def get_common_data(self, role):
-        """
-        Returns system-wide or market-level summary.
-        - top_selling_stocks
-        - highest_dividend_paid_stocks
-        - highest_dividend_ratio_companies
-        - total_companies, total_stocks
-        - highest_profit_traders (for a quick highlight of top earners)
-        - total_transaction_fees_etb (only for regulators)
-        """
-        top_selling = self._get_top_selling_stocks(limit=5)
-        top_dividends = self._get_highest_dividend_paid_stocks(limit=5)
-        highest_dividend_ratio = self._get_highest_dividend_ratio_companies(limit=5)
-        total_companies = ListedCompany.objects.count()
-        total_stocks = Stocks.objects.count()
-        highest_profit_traders = self._get_highest_profit_traders(limit=5)
-
-        common_data = {
-            "top_selling_stocks": top_selling,
-            "highest_dividend_paid_stocks": top_dividends,
-            "highest_dividend_ratio_companies": highest_dividend_ratio,
-            "total_companies": total_companies,
-            "total_stocks": total_stocks,
-            "highest_profit_traders": highest_profit_traders,
-        }
-
-        if role == 'regulator':
-            # Sum up all transaction fees in the system
-            total_fees = Trade.objects.aggregate(sum_fees=Sum('transaction_fee'))['sum_fees'] or Decimal('0.00')
-            common_data["total_transaction_fees_etb"] = str(total_fees)
-
-        return common_data
-
-    def _get_top_selling_stocks(self, limit=5):
-        trades = (
-            Trade.objects.filter(order__action='Sell')
-            .values('stock_id')
-            .annotate(total_sold=Sum('quantity'))
-            .order_by('-total_sold')[:limit]
-        )
-        results = []
-        for t in trades:
-            sid = t['stock_id']
-            sold_qty = t['total_sold'] or 0
-            try:
-                s = Stocks.objects.select_related('company').get(id=sid)
-                results.append({
-                    "ticker_symbol": s.ticker_symbol,
-                    "company_name": s.company.company_name,
-                    "total_sold": sold_qty
-                })
-            except Stocks.DoesNotExist:
-                pass
-        return results
-
-    def _get_highest_dividend_paid_stocks(self, limit=5):
-        divs = (
-            Dividend.objects.select_related('company')
-            .order_by('-total_dividend_amount')[:limit]
-        )
-        results = []
-        for d in divs:
-            results.append({
-                "company_name": d.company.company_name,
-                "budget_year": d.budget_year,
-                "total_dividend_amount_etb": str(d.total_dividend_amount),
-            })
-        return results
-
-    def _get_highest_dividend_ratio_companies(self, limit=5):
-        """
-        Example: Dividend ratio = SUM of dividends / SUM of total_shares.
-        Adjust as needed for your real business logic.
-        """
-        # Annotate companies with total dividend & total shares
-        companies = (
-            ListedCompany.objects
-            .annotate(
-                total_dividend=Sum('dividends__total_dividend_amount'),
-                total_shares_published=Sum('stocks__total_shares'),
-                dividend_ratio=ExpressionWrapper(
-                    Sum('dividends__total_dividend_amount') / Sum('stocks__total_shares'),
-                    output_field=FloatField()
-                )
-            )
-            .filter(
-                total_dividend__isnull=False,
-                total_shares_published__gt=0
-            )
-            .order_by('-dividend_ratio')[:limit]
-        )
-
-        results = []
-        for company in companies:
-            results.append({
-                "company_name": company.company_name,
-                "dividend_ratio": round(company.dividend_ratio, 2) if company.dividend_ratio else 0.00,
-                "total_dividend_amount_etb": str(company.total_dividend or Decimal('0.00')),
-            })
-        return results
-
-    def _get_highest_profit_traders(self, limit=5):
-        """
-        Example aggregator: top users by 'profit_balance'.
-        """
-        # If your user model has a 'profit_balance' field:
-        top_users = (
-            User.objects.exclude(profit_balance=None)
-            .order_by('-profit_balance')[:limit]
-        )
-        results = []
-        for u in top_users:
-            results.append({
-                "username": u.username,
-                "profit_balance_etb": str(u.profit_balance)
-            })
-        return results
-
     # ------------------ Trader Data -------------------
     def get_trader_data(self, user):
         total_orders = Orders.objects.filter(user=user).count()
@@ -977,38 +1045,23 @@ class FinalExtendedDashboardView(APIView):
         }
 
     def _get_user_stock_holdings(self, user):
-        buys = (
-            Trade.objects.filter(user=user, order__action='Buy')
-            .values('stock_id')
-            .annotate(total_buys=Sum('quantity'))
-        )
-        sells = (
-            Trade.objects.filter(user=user, order__action='Sell')
-            .values('stock_id')
-            .annotate(total_sells=Sum('quantity'))
+        positions = (
+            Position.objects.filter(user=user, quantity__gt=0)
+            .select_related('stock__company')
+            .order_by('stock_id')
         )
-        buy_map = {b['stock_id']: b['total_buys'] for b in buys}
-        sell_map = {s['stock_id']: s['total_sells'] for s in sells}
-
-        all_ids = set(list(buy_map.keys()) + list(sell_map.keys()))
-        results = []
-        for sid in all_ids:
-            net_qty = buy_map.get(sid, 0) - sell_map.get(sid, 0)
-            if net_qty > 0:
-                try:
-                    stock_obj = Stocks.objects.select_related('company').get(id=sid)
-                    results.append({
-                        "stock_id": stock_obj.id,
-                        "ticker_symbol": stock_obj.ticker_symbol,
-                        "company_name": stock_obj.company.company_name,
-                        "quantity": net_qty
-                    })
-                except Stocks.DoesNotExist:
-                    pass
-        return results
+        return [
+            {
+                "stock_id": position.stock.id,
+                "ticker_symbol": position.stock.ticker_symbol,
+                "company_name": position.stock.company.company_name,
+                "quantity": position.quantity
+            }
+            for position in positions
+        ]
 
     # ------------------ Company Admin Data -------------------
-    def get_company_admin_data(self, user):
+    def get_company_admin_data(self, user, company_sales):
         """
         Summaries relevant to the company admin's own company,
         e.g., total published stocks, average selling price, etc.
@@ -1016,8 +1069,6 @@ class FinalExtendedDashboardView(APIView):
         if not hasattr(user, 'company_id'):
             return {"error": "No company linked to this admin."}
 
-        from django.db.models import Sum
-
         try:
             comp = ListedCompany.objects.get(id=user.company_id)
         except ListedCompany.DoesNotExist:
@@ -1026,40 +1077,31 @@ class FinalExtendedDashboardView(APIView):
         # Total stocks for that company
         total_stocks_count = Stocks.objects.filter(company=comp).count()
 
-        # Average selling price
-        sells = Trade.objects.filter(stock__company=comp, order__action='Sell')
-        total_sold = sells.aggregate(q=Sum('quantity'))['q'] or 0
-        total_price_qty = sells.aggregate(spq=Sum(F('quantity') * F('price')))['spq'] or 0
-        avg_price = Decimal('0.00')
-        if total_sold > 0:
-            avg_price = Decimal(total_price_qty) / Decimal(total_sold)
+        # Average selling price (precomputed per company)
+        sales = company_sales.get(str(comp.id), {})
 
         return {
             "company_name": comp.company_name,
             "company_sector": comp.sector,
             "total_stocks_published": total_stocks_count,
-            "avg_selling_price_etb": str(avg_price.quantize(Decimal('0.01'))) if total_sold else "0.00",
+            "avg_selling_price_etb": sales.get("avg_selling_price_etb", "0.00"),
         }
 
     # ------------------ Regulator Data -------------------
-    def get_regulator_data(self):
+    def get_regulator_data(self, precomputed):
         """
         e.g., system-wide stats, suspicious activities, top profit traders, etc.
+        The pending suspicious count is read live so reviews show up at once.
         """
-        total_users = User.objects.all().count()
-        total_orders = Orders.objects.all().count()
-        total_trades = Trade.objects.all().count()
-        suspicious_count = SuspiciousActivity.objects.filter(reviewed=False).count()
-
-        top_profit_traders = self._get_highest_profit_traders(limit=5)
-
         return {
-            "total_users": total_users,
-            "total_orders": total_orders,
-            "total_trades": total_trades,
-            "pending_suspicious_activities": suspicious_count,
-            "highest_profit_traders": top_profit_traders,
+            "total_users": precomputed["total_users"],
+            "total_orders": precomputed["total_orders"],
+            "total_trades": precomputed["total_trades"],
+            "pending_suspicious_activities": SuspiciousActivity.objects.filter(reviewed=False).count(),
+            "highest_profit_traders": precomputed["highest_profit_traders"],
         }
+
+
 class ImportantReportView(APIView):
     """
     Returns summarized trade/order data within a specified date range,
@@ -1079,14 +1121,14 @@ class ImportantReportView(APIView):
         # If no date range is provided, you can default to some range or raise an error
         try:
             if start_date_str:
-                start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+                start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d")
                 start_date = timezone.make_aware(start_date, timezone.get_current_timezone())
             else:
                 # default or error
                 start_date = timezone.now() - timezone.timedelta(days=30)  # e.g. last 30 days
 
             if end_date_str:
-                end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+                end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d")
                 end_date = timezone.make_aware(end_date, timezone.get_current_timezone())
             else:
                 end_date = timezone.now()
@@ -1096,59 +1138,21 @@ class ImportantReportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 3. Filter trades based on date range
-        #    (We'll assume you want to filter by Trade.trade_time)
-        trades_qs = Trade.objects.filter(
-            trade_time__gte=start_date,
-            trade_time__lte=end_date
-        )
-
-        # 4. Optionally filter by stock or company
-        if stock_id:
-            trades_qs = trades_qs.filter(stock_id=stock_id)
-
-        if company_id:
-            # Must filter trades whose stock belongs to that company
-            trades_qs = trades_qs.filter(stock__company_id=company_id)
-
-        # 5. Aggregate or gather stats
-        #    Example: total trades, total quantity, sum of transaction_fee, sum of trade value
-        #    trade_value = quantity * price
-        trades_annotated = trades_qs.annotate(
-            trade_value=ExpressionWrapper(
-                F('quantity') * F('price'),
-                output_field=DecimalField(max_digits=20, decimal_places=2)
-            )
-        )
-
-        total_trades = trades_annotated.count()
-        agg_result = trades_annotated.aggregate(
-            total_quantity=Sum('quantity'),
-            total_fees=Sum('transaction_fee'),
-            total_value=Sum('trade_value'),
-            avg_price=Avg('price')
-        )
-
-        total_quantity = agg_result['total_quantity'] or 0
-        total_fees = agg_result['total_fees'] or Decimal('0.00')
-        total_value = agg_result['total_value'] or Decimal('0.00')
-        avg_price = agg_result['avg_price'] or Decimal('0.00')
-
-        # 6. (Optional) Example: You might also want to break down
-        #    stats by Buy vs Sell or group by each Stock, etc.
-
-        # Example grouping by action:
-        buys = trades_annotated.filter(order__action='Buy')
-        sells = trades_annotated.filter(order__action='Sell')
-
-        buy_agg = buys.aggregate(
-            buy_qty=Sum('quantity'),
-            buy_value=Sum('trade_value')
-        )
-        sell_agg = sells.aggregate(
-            sell_qty=Sum('quantity'),
-            sell_value=Sum('trade_value')
-        )
+        # 3-6. Totals over the date range, optionally for one stock or company.
+        #      Compacted hours/days come from TradeRollup; only the partial
+        #      edges and trades past the rollup watermark are read raw.
+        totals = summarize_trades(start_date, end_date, stock_id=stock_id, company_id=company_id)
+        empty = {'count': 0, 'quantity': 0, 'fees': Decimal('0.00'), 'value': Decimal('0.00'), 'price_sum': Decimal('0.00')}
+        buy_totals = totals.get('Buy', empty)
+        sell_totals = totals.get('Sell', empty)
+
+        total_trades = sum(t['count'] for t in totals.values())
+        total_quantity = sum(t['quantity'] for t in totals.values())
+        total_fees = sum((t['fees'] for t in totals.values()), Decimal('0.00'))
+        total_value = sum((t['value'] for t in totals.values()), Decimal('0.00'))
+        avg_price = Decimal('0.00')
+        if total_trades:
+            avg_price = sum((t['price_sum'] for t in totals.values()), Decimal('0.00')) / total_trades
 
         # 7. Build the response data
         data = {
@@ -1162,12 +1166,12 @@ class ImportantReportView(APIView):
             "total_value": str(total_value),
             "average_price": str(avg_price.quantize(Decimal('0.01'))),
             "buy_summary": {
-                "total_buy_quantity": buy_agg['buy_qty'] or 0,
-                "total_buy_value": str(buy_agg['buy_value'] or Decimal('0.00'))
+                "total_buy_quantity": buy_totals['quantity'],
+                "total_buy_value": str(buy_totals['value'])
             },
             "sell_summary": {
-                "total_sell_quantity": sell_agg['sell_qty'] or 0,
-                "total_sell_value": str(sell_agg['sell_value'] or Decimal('0.00'))
+                "total_sell_quantity": sell_totals['quantity'],
+                "total_sell_value": str(sell_totals['value'])
             }
         }
 
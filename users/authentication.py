@@ -1,10 +1,45 @@
 # users/authentication.py
 
+from django.utils.functional import SimpleLazyObject
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 from .models import CustomUser
+from .token_cache import token_versions
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    request.user for a token already validated against the token-version
+    cache: the user row is only read if something beyond its id is used.
+    """
+
+    def __init__(self, user_id):
+        super().__init__(lambda: CustomUser.objects.get(id=user_id))
+        self.__dict__['_user_id'] = user_id
+
+    @property
+    def pk(self):
+        return self.__dict__['_user_id']
+
+    id = pk
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        return True
+
 
 class CustomJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that also rejects tokens issued before the user's
+    latest login (token_version) and tokens of inactive users.
+
+    The version check is answered from the token-version cache, so the user
+    table is read at most once per request: when the cache cannot confirm
+    the token, the row read to check it becomes request.user; otherwise
+    request.user is a LazyUser, loaded only if the view needs it.
+    """
+
     def get_validated_token(self, raw_token):
         try:
             token = super().get_validated_token(raw_token)
@@ -13,13 +48,29 @@ class CustomJWTAuthentication(JWTAuthentication):
 
         user_id = token['user_id']
         token_version = token.get('token_version')
+        self._loaded_user = None
 
-        try:
-            user = CustomUser.objects.get(id=user_id)
-        except CustomUser.DoesNotExist:
-            raise AuthenticationFailed('User not found.')
+        cached = token_versions.get(user_id)
+        if cached is None or cached[0] != token_version:
+            # Unknown here, or possibly stale: the DB decides
+            try:
+                user = CustomUser.objects.get(id=user_id)
+            except CustomUser.DoesNotExist:
+                raise AuthenticationFailed('User not found.')
+            token_versions.set(user.id, user.token_version, user.is_active)
+            cached = (user.token_version, user.is_active)
+            self._loaded_user = user
 
-        if token_version != user.token_version:
+        current_version, is_active = cached
+        if token_version != current_version:
             raise AuthenticationFailed('Token has been invalidated.')
+        if not is_active:
+            raise AuthenticationFailed('User is inactive.')
 
         return token
+
+    def get_user(self, validated_token):
+        user = getattr(self, '_loaded_user', None)
+        if user is not None and user.id == validated_token['user_id']:
+            return user
+        return LazyUser(validated_token['user_id'])
@@ -6,7 +6,8 @@ from django.utils import timezone
 # We'll do an inline import inside the method to avoid circular imports
 # from stocks.models import ListedCompany
 
-from ethio_stock_simulation.utils import generate_otp, send_verification_email
+from ethio_stock_simulation.mail import mail_queue
+from ethio_stock_simulation.utils import generate_otp, verification_email
 
 
 class CustomUser(AbstractUser):
@@ -65,21 +66,13 @@ class CustomUser(AbstractUser):
                     except ListedCompany.DoesNotExist:
                         company_name = None
 
-                # Send verification email with role, and if 'company_admin' also pass company_name
-                email_sent = send_verification_email(
-                    to_email=self.email,
-                    username=self.username,
-                    otp=otp,
-                    role=self.role,
-                    company_name=company_name
-                )
-
-                if email_sent:
-                    print(f"OTP sent to {self.email}")
-                else:
-                    print("Failed to send OTP.")
-
                 super().save(update_fields=['otp_code', 'otp_sent_at'])
+
+                # Send verification email with role, and if 'company_admin' also pass company_name.
+                # Queued for background delivery once the user row is committed.
+                mail_queue.enqueue_on_commit(
+                    self.email, *verification_email(self.username, otp, self.role, company_name)
+                )
         else:
             # Existing user updates
             super().save(*args, **kwargs)
@@ -5,11 +5,12 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.password_validation import validate_password
 from django.conf import settings
 
+from ethio_stock_simulation.projection import ProjectableSerializerMixin
 from users.utils import verify_captcha
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProjectableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -89,6 +90,8 @@ class UserSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         request = self.context.get('request')
 
+        if 'kyc_document' not in self.fields:  # Left out by a `fields=` projection
+            return representation
         if instance.kyc_document:
             if request:
                 representation['kyc_document'] = request.build_absolute_uri(instance.kyc_document.url)
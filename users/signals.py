@@ -0,0 +1,24 @@
+# users/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .token_cache import token_versions
+
+
+@receiver(post_save, sender=CustomUser)
+def refresh_token_version(sender, instance, update_fields=None, **kwargs):
+    # Only when the save wrote the fields, so a stale instance saved with
+    # other update_fields cannot put an old version back into the cache
+    if update_fields is not None and not {'token_version', 'is_active'} & set(update_fields):
+        return
+    user_id, token_version, is_active = instance.id, instance.token_version, instance.is_active
+    transaction.on_commit(lambda: token_versions.set(user_id, token_version, is_active))
+
+
+@receiver(post_delete, sender=CustomUser)
+def forget_token_version(sender, instance, **kwargs):
+    user_id = instance.id
+    transaction.on_commit(lambda: token_versions.invalidate(user_id))
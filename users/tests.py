@@ -1,3 +1,94 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from ethio_stock_simulation.mail import MailDeliveryError, MailQueue
+
+from .models import CustomUser
+from .token_cache import token_versions
+
+
+class TokenVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()  # Login throttle
+        token_versions.invalidate()
+        self.user = CustomUser.objects.create_user(
+            username='regulator', email='regulator@example.com', password='s3cret-pass', role='regulator',
+        )
+        CustomUser.objects.filter(id=self.user.id).update(kyc_verified=True, is_approved=True)
+        self.client = APIClient()
+
+    def login(self):
+        # The new token_version reaches the cache once the login commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/users/login/', {'username': 'regulator', 'password': 's3cret-pass'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['access_token']
+
+    def get_users(self, token):
+        return self.client.get('/api/users/list/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_token_rejected_after_relogin(self):
+        first = self.login()
+        self.assertEqual(self.get_users(first).status_code, 200)
+
+        second = self.login()
+
+        self.assertEqual(self.get_users(first).status_code, 401)
+        self.assertEqual(self.get_users(second).status_code, 200)
+
+    def test_token_rejected_after_deactivation(self):
+        token = self.login()
+        self.assertEqual(self.get_users(token).status_code, 200)
+
+        self.user.refresh_from_db()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        self.assertEqual(self.get_users(token).status_code, 401)
+
+
+class FlakyTransport:
+    """Fails the first `failures` sends with `error`, then delivers."""
+
+    def __init__(self, failures, error):
+        self.failures = failures
+        self.error = error
+        self.attempts = 0
+        self.outbox = []
+
+    def send(self, to_email, subject, body):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise self.error
+        self.outbox.append(to_email)
+
+
+@override_settings(MAIL_QUEUE={'workers': 2, 'max_attempts': 3, 'backoff_seconds': 0.01})
+class MailQueueTests(SimpleTestCase):
+
+    def deliver(self, transport):
+        queue = MailQueue()
+        queue._transport = transport
+        queue.enqueue('trader@example.com', 'Your OTP', '123456')
+        self.assertTrue(queue.drain(timeout=5))
+        return transport
+
+    def test_failed_send_is_retried_until_delivered(self):
+        transport = self.deliver(FlakyTransport(2, MailDeliveryError('503')))
+
+        self.assertEqual((transport.attempts, transport.outbox), (3, ['trader@example.com']))
+
+    def test_retries_stop_at_max_attempts(self):
+        transport = self.deliver(FlakyTransport(5, MailDeliveryError('503')))
+
+        self.assertEqual((transport.attempts, transport.outbox), (3, []))
+
+    def test_non_retryable_failure_is_dropped_at_once(self):
+        transport = self.deliver(FlakyTransport(1, MailDeliveryError('400', retryable=False)))
+
+        self.assertEqual((transport.attempts, transport.outbox), (1, []))
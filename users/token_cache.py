@@ -0,0 +1,105 @@
+# users/token_cache.py
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'users:token_version:'
+
+
+class TokenVersionCache:
+    """
+    What JWT validation needs to know about a user, without reading the user
+    row: user_id -> (token_version, is_active).
+
+    Lookups go to a process-local LRU (up to `max_entries` users, each
+    trusted for `local_ttl_seconds`), then, with TOKEN_VERSION_CACHE['shared']
+    enabled, to the Django cache, and only then to the DB (done by the
+    caller, which stores the result with set()). Saving a user's
+    token_version or is_active, as the login view does, writes the new values
+    to both levels (see users/signals.py); other workers see them once their
+    local entry expires. The shared level is only safe on a backend every
+    worker reads (Redis/Memcached): on the default per-process LocMemCache a
+    re-login would reach no other worker before `shared_ttl_seconds`, so it
+    is left off there. A token whose version
+    does not match the cached one is always re-checked against the DB before
+    it is rejected, so fresh tokens are never refused because of the cache.
+    Writes that bypass model signals, such as queryset.update(), need an
+    explicit invalidate().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> ((token_version, is_active), expires_at)
+
+    @staticmethod
+    def _config():
+        config = getattr(settings, 'TOKEN_VERSION_CACHE', {})
+        return (
+            config.get('max_entries', 10000),
+            config.get('local_ttl_seconds', 5),
+            config.get('shared_ttl_seconds', 3600),
+        )
+
+    @staticmethod
+    def _shared():
+        if not getattr(settings, 'TOKEN_VERSION_CACHE', {}).get('shared', False):
+            return False
+        # Even when enabled, a per-process backend would hold stale versions for shared_ttl_seconds
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+    def get(self, user_id):
+        """Cached (token_version, is_active) of a user, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    return value
+                del self._entries[user_id]
+
+        if not self._shared():
+            return None
+        value = cache.get(f'{KEY_PREFIX}{user_id}')
+        if value is not None:
+            value = tuple(value)
+            self._remember(user_id, value)
+        return value
+
+    def set(self, user_id, token_version, is_active):
+        _, _, shared_ttl = self._config()
+        value = (token_version, is_active)
+        if self._shared():
+            cache.set(f'{KEY_PREFIX}{user_id}', value, shared_ttl)
+        self._remember(user_id, value)
+
+    def invalidate(self, user_id=None):
+        """Forget a user (or every user held in this process)."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                return
+            self._entries.pop(user_id, None)
+        if self._shared():
+            cache.delete(f'{KEY_PREFIX}{user_id}')
+
+    def _remember(self, user_id, value):
+        max_entries, local_ttl, _ = self._config()
+        with self._lock:
+            self._entries[user_id] = (value, time.monotonic() + local_ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+
+token_versions = TokenVersionCache()
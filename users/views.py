@@ -17,12 +17,14 @@ from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.contrib.auth.hashers import make_password
 
+from ethio_stock_simulation.mail import mail_queue
+from ethio_stock_simulation.pagination import list_response
 from ethio_stock_simulation.utils import (
+    account_deactivated_email,
     generate_otp,
-    send_verification_email,
-    send_kyc_approved_email,
-    send_kyc_rejected_email,
-    send_account_kyc_verified_email,
+    kyc_approved_email,
+    kyc_rejected_email,
+    verification_email,
 )
 from users.models import CustomUser
 from users.throttles import LoginThrottle  # Suppose you have a custom throttle class
@@ -116,10 +118,11 @@ class CustomTokenObtainPairView(TokenObtainPairView):
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
-            # Increment token_version to invalidate previous tokens
+            # Increment token_version to invalidate previous tokens; saving it
+            # also publishes the new version to the token-version cache
             user = serializer.user
             user.token_version += 1
-            user.save()
+            user.save(update_fields=['token_version'])
 
             # Generate new tokens with updated token_version
             refresh = RefreshToken.for_user(user)
@@ -151,14 +154,14 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 @permission_classes([IsAuthenticated])
 def list_users(request):
     """
-    API endpoint to list all users (accessible by regulators only).
+    API endpoint to list all users (accessible by regulators only). Takes
+    `?fields=a,b`, and `?page_size=N` / `?cursor=` to page by id.
     """
     if request.user.role != 'regulator':
         return Response({"detail": "Not authorized."}, status=status.HTTP_403_FORBIDDEN)
 
     users = CustomUser.objects.all()
-    serializer = UserSerializer(users, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return list_response(request, users, UserSerializer, ordering='id')
 
 
 @api_view(['POST'])
@@ -187,25 +190,16 @@ def update_kyc_status(request, user_id):
         user.is_approved = True
         user.save()
 
-        # Send KYC approval email
-        # Option 1: direct call to the "send_kyc_approved_email"
-        email_sent = send_kyc_approved_email(user.email, user.username)
-        if email_sent:
-            logger.info(f"KYC Approved email sent to {user.email}")
-        else:
-            logger.warning(f"Failed to send KYC Approved email to {user.email}")
+        # Send KYC approval email (in the background)
+        mail_queue.enqueue_on_commit(user.email, *kyc_approved_email(user.username))
 
     elif action == 'reject':
         user.kyc_verified = False
         user.is_approved = False
         user.save()
 
-        # Send KYC rejection email
-        email_sent = send_kyc_rejected_email(user.email, user.username)
-        if email_sent:
-            logger.info(f"KYC Rejected email sent to {user.email}")
-        else:
-            logger.warning(f"Failed to send KYC Rejected email to {user.email}")
+        # Send KYC rejection email (in the background)
+        mail_queue.enqueue_on_commit(user.email, *kyc_rejected_email(user.username))
     else:
         return Response({"detail": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -247,8 +241,7 @@ class ListUsersView(APIView):
             return Response({"detail": "Not authorized."}, status=status.HTTP_403_FORBIDDEN)
 
         users = CustomUser.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        return list_response(request, users, UserSerializer, ordering='id')
 
 
 class VerifyOTPView(APIView):
@@ -330,7 +323,9 @@ class ResendOTPView(APIView):
                 except ListedCompany.DoesNotExist:
                     company_name = None
 
-            send_verification_email(user.email, user.username, otp, role=user.role, company_name=company_name)
+            mail_queue.enqueue_on_commit(
+                user.email, *verification_email(user.username, otp, user.role, company_name)
+            )
             return Response({"detail": "A new OTP has been sent to your email."}, status=status.HTTP_200_OK)
 
         except User.DoesNotExist:
@@ -358,23 +353,8 @@ def deactivate_user(request, user_id):
     user.is_approved = False
     user.save()
 
-    # Send email notification about deactivation (optional)
-    email_subject = "Account Deactivated"
-    email_message = f"""
-    Dear {user.username},
-
-    Your account has been deactivated by an administrator. 
-    You will no longer be able to log in to the system.
-
-    If you believe this is a mistake, please contact support.
-    """
-    email = EmailMessage(
-        subject=email_subject,
-        body=email_message,
-        from_email='noreply@yourapp.com',  # Replace with your actual sender email
-        to=[user.email],
-    )
-    email.send()
+    # Send email notification about deactivation (in the background)
+    mail_queue.enqueue_on_commit(user.email, *account_deactivated_email(user.username))
 
     return Response(
         {"message": f"User {user.username} has been deactivated."},